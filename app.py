@@ -1,7 +1,17 @@
+import asyncio
+import logging
+
 # import uvicorn
 # from scripts.config import ModuleConfig
 from mangum import Mangum
 from main import app as fastapi_app
+from scripts.config import ModuleConfig
+from scripts.core.services.permissions import permission_engine
+from scripts.core.services.revocations import revocation_list
+from scripts.core.services.sessions import session_activity
+from scripts.db.pg.sessions import session_util
+
+logger = logging.getLogger(__name__)
 
 # if __name__ == "__main__":
 #     # uvicorn.run(
@@ -10,4 +20,49 @@ from main import app as fastapi_app
 #     #     port=ModuleConfig.PORT,
 #     #     reload=ModuleConfig.RELOAD_ASGI,
 #     # )
-handler = Mangum(fastapi_app)
+
+# Every invocation runs on this loop (Mangum uses the current event loop), so the connection
+# opened during the init phase stays usable by later invocations of the same environment.
+loop = asyncio.new_event_loop()
+asyncio.set_event_loop(loop)
+
+
+def init():
+    """
+    Work done once per execution environment, during the Lambda init phase:
+    compile the OpenAPI schema and the middleware stack, build the database engine,
+    open one pooled connection, verify the schema version, load the token revocation list and compile
+    the role permissions.
+    """
+    fastapi_app.openapi()
+    fastapi_app.middleware_stack = fastapi_app.build_middleware_stack()
+    try:
+        loop.run_until_complete(session_util.warm_up())
+    except Exception as e:
+        logger.warning("Database warm up failed, connecting on the first request instead: %s", e)
+        return
+    loop.run_until_complete(session_util.check_schema_version())
+    loop.run_until_complete(revocation_list.sync())
+    loop.run_until_complete(permission_engine.sync())
+
+
+if ModuleConfig.LAMBDA_INIT_WARM_UP:
+    init()
+
+# The ASGI lifespan would run startup and shutdown around every invocation; init() covers startup.
+asgi_handler = Mangum(fastapi_app, lifespan="off")
+
+
+def handler(event, context):
+    """
+    Lambda entrypoint.
+    Scheduled (EventBridge) invocations drain the email outbox, everything else is served by the API.
+    """
+    if event.get("source") == "aws.events":
+        from scripts.core.services.email.dispatcher import email_dispatcher
+        processed = loop.run_until_complete(email_dispatcher.drain())
+        return {"status": "success", "processed": processed}
+    response = asgi_handler(event, context)
+    # No background loop between invocations; session activity is written once the flush interval passed
+    loop.run_until_complete(session_activity.flush_if_due())
+    return response
@@ -1,10 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from scripts.core.routes import all_routers
+from scripts.core.routes.jwks import jwks_router
 
 
-from scripts.config import ModuleConfig
+from scripts.config import ModuleConfig, EmailConfig
+from scripts.core.services.permissions import permission_engine
+from scripts.core.services.revocations import revocation_list
+from scripts.core.services.sessions import session_activity
+from scripts.db.pg.sessions import session_util
+from scripts.exceptions import UserManagementException
+from scripts.utils.responses import ORJSONResponse
+from scripts.utils.password import password_pool
 
 app = FastAPI(
     title="User Management API",
@@ -14,6 +22,7 @@ app = FastAPI(
         "name": "Hemanth Kumar Pasham",
         "email": "hemanthkumarpasham9502@gmail.com",
     },
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json",
@@ -34,6 +43,8 @@ app = FastAPI(
 )
 
 app.include_router(all_routers, prefix="/user_mngmt")
+# Served at the well-known location, outside the API prefix
+app.include_router(jwks_router)
 
 app.add_middleware(
     CORSMiddleware,
@@ -43,6 +54,46 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+@app.exception_handler(UserManagementException)
+async def user_management_exception_handler(request: Request, exc: UserManagementException):
+    """
+    Convert user management exceptions into JSON error responses carrying the exception status code.
+    """
+    return ORJSONResponse(
+        status_code=exc.status_code,
+        content={"status": "failed", "message": str(exc)},
+        headers=exc.headers,
+    )
+
+@app.on_event("startup")
+async def startup():
+    """
+    Verify the database schema version and start the background workers of this process.
+    """
+    await session_util.check_schema_version()
+    revocation_list.start()
+    permission_engine.start()
+    session_activity.start()
+    if EmailConfig.EMAIL_DISPATCHER_ENABLED:
+        # The email stack (smtplib, Jinja) is only imported by processes running the dispatcher
+        from scripts.core.services.email.dispatcher import email_dispatcher
+        email_dispatcher.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stop the background workers and release the worker pools owned by this process.
+    """
+    await revocation_list.stop()
+    await permission_engine.stop()
+    await session_activity.stop()
+    if EmailConfig.EMAIL_DISPATCHER_ENABLED:
+        from scripts.core.services.email.dispatcher import email_dispatcher
+        from scripts.core.services.email.email import smtp_pool
+        await email_dispatcher.stop()
+        smtp_pool.close_all()
+    password_pool.shutdown()
+
 @app.get("/health", tags=["Health Check"])
 async def health_check():
     """
@@ -0,0 +1,80 @@
+"""
+Import time profile of the Lambda entrypoint, i.e. the cost of every cold start.
+
+Usage:
+    python -m scripts.benchmarks.import_time --module app --repeat 5 --top 25 --max-ms 1500
+
+Imports the module in fresh interpreters with `-X importtime`, reports the median total import
+time and the slowest modules by cumulative time, and fails when the total exceeds --max-ms or
+when a module listed in --forbid got imported. Set LAMBDA_INIT_WARM_UP=false to profile the
+imports alone, without the init phase work of app.py.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+# Modules that are only needed off the request path and must stay lazily imported
+FORBIDDEN_MODULES = "jinja2,smtplib,alembic"
+
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def profile(module: str) -> dict[str, tuple[int, int]]:
+    """
+    Import the module in a fresh interpreter.
+
+    :param module: The module to import.
+    :return: Self and cumulative microseconds of every imported module, keyed by name.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            timings[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time of the service entrypoint.")
+    parser.add_argument("--module", default="app", help="Module to import.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters.")
+    parser.add_argument("--top", type=int, default=25, help="Number of slowest modules to list.")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail above this median total import time.")
+    parser.add_argument("--forbid", default=FORBIDDEN_MODULES,
+                        help="Comma separated top level modules that must not be imported.")
+    args = parser.parse_args()
+
+    runs = [profile(args.module) for _ in range(args.repeat)]
+    total_ms = statistics.median(run[args.module][1] for run in runs) / 1000
+    cumulative = {
+        name: statistics.median(run[name][1] for run in runs if name in run) / 1000
+        for name in runs[-1]
+    }
+
+    print(f"import {args.module}: {total_ms:.0f} ms (median of {args.repeat}), {len(runs[-1])} modules")
+    print(f"{'module':<60} {'cumulative ms':>14}")
+    for name, ms in sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<60} {ms:>14.1f}")
+
+    failures = []
+    for forbidden in filter(None, (name.strip() for name in args.forbid.split(","))):
+        if any(name == forbidden or name.startswith(f"{forbidden}.") for name in runs[-1]):
+            failures.append(f"{forbidden} is imported by {args.module}")
+    if args.max_ms is not None and total_ms > args.max_ms:
+        failures.append(f"import time {total_ms:.0f} ms exceeds {args.max_ms:.0f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
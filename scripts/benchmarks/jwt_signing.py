@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of access token signing and verification throughput per JWT algorithm.
+
+Usage:
+    python -m scripts.benchmarks.jwt_signing --algorithms HS256,RS256,ES256,EdDSA --duration 1
+
+Signs and verifies a login access token with a throwaway key ring per algorithm, on one core.
+Signing is paid once per login, verification by every service checking the token (this service
+memoizes verified claims, consumers using the JWKS may not), and the token size on every request.
+"""
+import argparse
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from scripts.utils.jwt_keys import HMAC_ALGORITHMS, JWTKeyRing, generate_private_key, private_key_pem
+
+
+def make_key_ring(algorithm: str, keys_dir: str) -> JWTKeyRing:
+    if algorithm in HMAC_ALGORITHMS:
+        return JWTKeyRing(algorithm, secret_key=uuid.uuid4().hex * 2)
+    directory = Path(keys_dir) / algorithm
+    directory.mkdir()
+    (directory / "bench.pem").write_bytes(private_key_pem(generate_private_key(algorithm)))
+    return JWTKeyRing(algorithm, keys_dir=str(directory))
+
+
+def rate(func, duration: float) -> float:
+    """
+    Call func for roughly `duration` seconds.
+
+    :return: Calls per second.
+    """
+    func()
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < duration:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JWT sign/verify throughput per algorithm.")
+    parser.add_argument("--algorithms", default="HS256,RS256,ES256,EdDSA", help="Comma separated algorithms.")
+    parser.add_argument("--duration", type=float, default=1.0, help="Seconds per measurement.")
+    args = parser.parse_args()
+
+    claims = {
+        "user_id": str(uuid.uuid4()),
+        "email": "benchmark.user@example.com",
+        "purpose": "access",
+        "jti": uuid.uuid4().hex,
+        "iat": int(time.time()),
+        "exp": int(time.time()) + 3600,
+    }
+    print(f"{'algorithm':<10} {'sign/s':>10} {'verify/s':>10} {'token bytes':>12}")
+    with tempfile.TemporaryDirectory() as keys_dir:
+        for algorithm in [value.strip() for value in args.algorithms.split(",") if value.strip()]:
+            key_ring = make_key_ring(algorithm, keys_dir)
+            token = key_ring.encode(claims)
+            sign = rate(lambda: key_ring.encode(claims), args.duration)
+            verify = rate(lambda: key_ring.decode(token), args.duration)
+            print(f"{algorithm:<10} {sign:>10.0f} {verify:>10.0f} {len(token):>12}")
+
+
+if __name__ == "__main__":
+    main()
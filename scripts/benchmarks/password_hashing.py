@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of password hashing throughput on the current host.
+
+Usage:
+    python -m scripts.benchmarks.password_hashing --bcrypt-rounds 10,11,12,13 --argon2 65536:3:4,19456:2:1
+
+Reports single core hashes/sec and the latency of a single hash for every setting, which is
+what a login costs on one password hashing worker.
+"""
+import argparse
+import time
+
+from scripts.config import PasswordConfig
+from scripts.utils.password import build_crypt_context
+
+
+def benchmark(context, duration: float) -> dict:
+    """
+    Hash a fixed password with the given context for roughly `duration` seconds.
+
+    :param context: The passlib CryptContext to benchmark.
+    :param duration: Minimum wall clock time to spend hashing.
+    :return: Number of hashes, hashes per second and milliseconds per hash.
+    """
+    context.hash("warm-up-password")
+    count = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < duration:
+        context.hash("benchmark-password")
+        count += 1
+        elapsed = time.perf_counter() - start
+    return {
+        "hashes": count,
+        "hashes_per_sec": count / elapsed,
+        "ms_per_hash": elapsed / count * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark password hashing settings on this host.")
+    parser.add_argument("--bcrypt-rounds", default=f"10,11,{PasswordConfig.PASSWORD_BCRYPT_ROUNDS},13",
+                        help="Comma separated bcrypt work factors.")
+    parser.add_argument("--argon2", default=f"{PasswordConfig.PASSWORD_ARGON2_MEMORY_COST}:"
+                                            f"{PasswordConfig.PASSWORD_ARGON2_TIME_COST}:"
+                                            f"{PasswordConfig.PASSWORD_ARGON2_PARALLELISM},19456:2:1",
+                        help="Comma separated argon2 memory_cost(KiB):time_cost:parallelism settings. Empty to skip.")
+    parser.add_argument("--duration", type=float, default=2.0, help="Seconds to spend on each setting.")
+    args = parser.parse_args()
+
+    settings = []
+    for rounds in sorted({int(value) for value in args.bcrypt_rounds.split(",") if value.strip()}):
+        settings.append((f"bcrypt rounds={rounds}", build_crypt_context(
+            schemes=["bcrypt"], bcrypt_rounds=rounds,
+            argon2_memory_cost=PasswordConfig.PASSWORD_ARGON2_MEMORY_COST,
+            argon2_time_cost=PasswordConfig.PASSWORD_ARGON2_TIME_COST,
+            argon2_parallelism=PasswordConfig.PASSWORD_ARGON2_PARALLELISM,
+        )))
+    for value in [value for value in args.argon2.split(",") if value.strip()]:
+        memory_cost, time_cost, parallelism = (int(part) for part in value.split(":"))
+        settings.append((f"argon2 m={memory_cost} t={time_cost} p={parallelism}", build_crypt_context(
+            schemes=["argon2"], bcrypt_rounds=PasswordConfig.PASSWORD_BCRYPT_ROUNDS,
+            argon2_memory_cost=memory_cost, argon2_time_cost=time_cost, argon2_parallelism=parallelism,
+        )))
+
+    print(f"{'setting':<32} {'hashes/sec':>12} {'ms/hash':>10}")
+    for name, context in settings:
+        result = benchmark(context, duration=args.duration)
+        print(f"{name:<32} {result['hashes_per_sec']:>12.2f} {result['ms_per_hash']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Micro-benchmark of the cost of serializing user responses.
+
+Usage:
+    python -m scripts.benchmarks.serialization --users 1 --users 50 --iterations 2000
+
+Builds in-memory Users/UserMetadata rows (no database) and compares, per response:
+
+    jsonable_encoder   the previous path: jsonable_encoder over the ORM rows, then json.dumps
+    mapper+json        RowMapper dictionaries, jsonable_encoder and json.dumps (FastAPI without a response model)
+    mapper+orjson      RowMapper dictionaries rendered by ORJSONResponse
+    model+orjson       RowMapper dictionaries validated by the response model, then ORJSONResponse
+    model_dump_json    RowMapper dictionaries validated and dumped by pydantic alone
+"""
+import argparse
+import datetime
+import json
+import time
+import uuid
+
+from fastapi.encoders import jsonable_encoder
+
+from scripts.core.schemas.users import UserListResponse, UserResponse
+from scripts.db.pg.mappers import RowMapper
+from scripts.db.pg.sql_schemas import Users, UserMetadata
+from scripts.utils.responses import ORJSONResponse
+
+
+def make_users(count: int) -> list[Users]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    users = []
+    for index in range(count):
+        user = Users(
+            id=uuid.uuid4(), email=f"user{index}@example.com", first_name=f"First{index}", last_name=f"Last{index}",
+            password="$2b$12$" + "x" * 53, is_active=True, role=uuid.uuid4(), created_at=now, updated_at=now,
+        )
+        user.user_metadata = UserMetadata(
+            id=uuid.uuid4(), user_id=user.id, email_verified=True, phone_number="+10000000000",
+            address="1 Benchmark Street", created_at=now, updated_at=now,
+        )
+        users.append(user)
+    return users
+
+
+def envelope(data) -> dict:
+    return {"status": "success", "message": "User data fetched successfully", "data": data}
+
+
+def strategies(users: list[Users]) -> dict:
+    single = len(users) == 1
+    model = UserResponse if single else UserListResponse
+
+    def mapped():
+        rows = [RowMapper.user(user) for user in users]
+        return rows[0] if single else rows
+
+    def columns(row, skip=()) -> dict:
+        return {key: value for key, value in vars(row).items() if not key.startswith("_") and key not in skip}
+
+    def legacy():
+        # jsonable_encoder walked every loaded attribute of the rows, password and tokens included
+        rows = [{**columns(user), "user_metadata": columns(user.user_metadata, skip=("user",))} for user in users]
+        data = jsonable_encoder(rows[0] if single else rows)
+        return json.dumps(jsonable_encoder(envelope(data))).encode()
+
+    return {
+        "jsonable_encoder": legacy,
+        "mapper+json": lambda: json.dumps(jsonable_encoder(envelope(mapped()))).encode(),
+        "mapper+orjson": lambda: ORJSONResponse(envelope(mapped())).body,
+        "model+orjson": lambda: ORJSONResponse(model.model_validate(envelope(mapped())).model_dump(mode="json")).body,
+        "model_dump_json": lambda: model.model_validate(envelope(mapped())).model_dump_json().encode(),
+    }
+
+
+def benchmark(func, iterations: int) -> float:
+    func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark user response serialization.")
+    parser.add_argument("--users", type=int, action="append", help="Users per response, repeatable.")
+    parser.add_argument("--iterations", type=int, default=2000, help="Responses per strategy.")
+    args = parser.parse_args()
+
+    for count in args.users or [1, 50]:
+        users = make_users(count)
+        print(f"{count} user(s) per response")
+        print(f"  {'strategy':<18} {'us/response':>12} {'bytes':>8}")
+        for name, func in strategies(users).items():
+            micros = benchmark(func, args.iterations)
+            print(f"  {name:<18} {micros:>12.1f} {len(func()):>8}")
+
+
+if __name__ == "__main__":
+    main()
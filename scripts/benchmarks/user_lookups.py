@@ -0,0 +1,75 @@
+"""
+Benchmark of looking up many users one by one versus in one batch, against the configured database.
+
+Usage:
+    USER_CACHE_BACKEND=off python -m scripts.benchmarks.user_lookups --users 1 --users 20 --users 100
+
+Reads the given number of existing users per round and compares, per round:
+
+    single      one get_user_by_id query per user, what consumers calling GET /users/{id} cause
+    loader      the same lookups issued concurrently through a DataLoader, coalesced into one query
+    batch       get_users_by_ids, what POST /users/batch runs
+
+Run with the user cache off to measure the queries; with it on, warm lookups never reach the database.
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select
+
+from scripts.core.db.sql import SQLHandler
+from scripts.db.pg.sessions import get_db
+from scripts.db.pg.sql_schemas import Users
+from scripts.utils.dataloader import DataLoader
+
+
+async def benchmark(sql_handler: SQLHandler, user_ids: list, rounds: int) -> dict:
+    """
+    Run the three lookup strategies.
+
+    :param sql_handler: The SQLHandler of the benchmark session.
+    :param user_ids: The users to look up per round.
+    :param rounds: Number of rounds per strategy.
+    :return: Milliseconds per round of every strategy.
+    """
+    async def single():
+        for user_id in user_ids:
+            await sql_handler.get_user_by_id(user_id)
+
+    async def loader():
+        await DataLoader(sql_handler.get_users_by_ids).load_many(user_ids)
+
+    async def batch():
+        await sql_handler.get_users_by_ids(user_ids)
+
+    results = {}
+    for name, func in (("single", single), ("loader", loader), ("batch", batch)):
+        await func()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await func()
+        results[name] = (time.perf_counter() - start) / rounds * 1000
+    return results
+
+
+async def run(counts: list[int], rounds: int):
+    async for session in get_db():
+        sql_handler = SQLHandler(session=session)
+        available = [row.id for row in await sql_handler.sql_ops.execute_query(select(Users.id).limit(max(counts)))]
+        print(f"{'users':<6} {'single ms':>10} {'loader ms':>10} {'batch ms':>10}")
+        for count in counts:
+            result = await benchmark(sql_handler, user_ids=available[:count], rounds=rounds)
+            print(f"{min(count, len(available)):<6} {result['single']:>10.2f} {result['loader']:>10.2f} {result['batch']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single versus batched user lookups.")
+    parser.add_argument("--users", type=int, action="append", help="Users per round, repeatable.")
+    parser.add_argument("--rounds", type=int, default=50, help="Rounds per strategy.")
+    args = parser.parse_args()
+    asyncio.run(run(counts=args.users or [1, 20, 100], rounds=args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of user insert and update throughput against the configured database.
+
+Usage:
+    python -m scripts.benchmarks.user_writes --rows 5000 --updates 2000
+
+Inserts users with their metadata in bulk, then runs single row updates the way the API does
+(profile update, password reset token set and cleared), each in its own transaction, and removes
+the benchmark users afterwards. Run it before and after a migration to see what every index on
+users and user_metadata costs on the write path.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import text
+
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.sessions import get_db
+from scripts.db.pg.sql_schemas import Users, UserMetadata
+
+EMAIL_DOMAIN = "user-writes.benchmark"
+
+
+async def index_counts(sql_ops: SQLOps) -> dict:
+    rows = await sql_ops.execute_query(text(
+        "SELECT tablename, count(*) FROM pg_indexes WHERE tablename IN ('users', 'user_metadata') GROUP BY tablename"
+    ))
+    return dict(rows)
+
+
+async def benchmark(sql_ops: SQLOps, rows: int, updates: int) -> dict:
+    """
+    Run the insert and update workloads.
+
+    :param sql_ops: The SQLOps of the benchmark session.
+    :param rows: Number of users to insert.
+    :param updates: Number of users to update, each with three single row statements.
+    :return: Rows per second of the inserts and milliseconds per update transaction.
+    """
+    run = uuid.uuid4().hex[:8]
+    users = [{
+        "id": uuid.uuid4(),
+        "email": f"{run}-{index}@{EMAIL_DOMAIN}",
+        "first_name": f"First{index}",
+        "last_name": f"Last{index}",
+        "password": "not-a-real-hash",
+    } for index in range(rows)]
+
+    start = time.perf_counter()
+    await sql_ops.insert_many(users, model=Users, commit=False)
+    await sql_ops.insert_many(
+        ({"user_id": user["id"], "phone_number": "+10000000000", "address": "1 Benchmark Street"} for user in users),
+        model=UserMetadata,
+    )
+    insert_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for user in users[:updates]:
+        await sql_ops.update_query({"first_name": "Updated"}, model=Users, filter_condition={"id": user["id"]})
+        await sql_ops.update_query({"reset_password_token": uuid.uuid4().hex}, model=UserMetadata,
+                                   filter_condition={"user_id": user["id"]})
+        await sql_ops.update_query({"reset_password_token": None}, model=UserMetadata,
+                                   filter_condition={"user_id": user["id"]})
+    update_seconds = time.perf_counter() - start
+
+    await sql_ops.delete_query(Users, Users.email.like(f"{run}-%@{EMAIL_DOMAIN}"))
+    return {
+        "insert_rows_per_sec": rows / insert_seconds,
+        "update_ms": update_seconds / max(min(updates, rows), 1) * 1000,
+    }
+
+
+async def run(rows: int, updates: int, repeat: int):
+    async for session in get_db():
+        sql_ops = SQLOps(session)
+        counts = await index_counts(sql_ops)
+        print(f"indexes: users={counts.get('users', 0)} user_metadata={counts.get('user_metadata', 0)}")
+        print(f"{'run':<6} {'inserts/sec':>12} {'ms/update':>10}")
+        for index in range(repeat):
+            result = await benchmark(sql_ops, rows=rows, updates=updates)
+            print(f"{index + 1:<6} {result['insert_rows_per_sec']:>12.0f} {result['update_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark user insert and update throughput.")
+    parser.add_argument("--rows", type=int, default=5000, help="Users to insert per run.")
+    parser.add_argument("--updates", type=int, default=2000, help="Users to update per run.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs.")
+    args = parser.parse_args()
+    asyncio.run(run(rows=args.rows, updates=args.updates, repeat=args.repeat))
+
+
+if __name__ == "__main__":
+    main()
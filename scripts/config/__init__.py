@@ -1,3 +1,5 @@
+import os
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,10 +17,25 @@ class _ModuleConfig(BaseSettings):
     """
     HOST: str = "0.0.0.0"
     PORT: int = 8000
-    RELOAD_ASGI: bool = True
+    RELOAD_ASGI: bool = False
+    SERVER_WORKERS: int = 0  # 0 sizes the workers to the available cores
+    SERVER_KEEP_ALIVE_SECONDS: int = 5
+    SERVER_BACKLOG: int = 2048
+    SERVER_TIMEOUT_SECONDS: int = 60
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30
+    SERVER_MAX_REQUESTS: int = 0  # recycle a worker after this many requests, 0 never
+    LAMBDA_INIT_WARM_UP: bool = True
     CORS_ORIGINS: list[str] = ['*']
     DOMAIN_URL: str = "http://localhost:8000"
     APP_NAME: str = "Adapt IQ"
+    USER_IMPORT_BATCH_SIZE: int = 500
+    USER_IMPORT_MAX_ERRORS: int = 1000
+    USER_IMPORT_MAX_LINE_LENGTH: int = 65536  # characters per CSV/NDJSON line
+    USER_EXPORT_PAGE_SIZE: int = 10000
+    USER_EXPORT_CHUNK_ROWS: int = 500
+    USER_LIST_DEFAULT_LIMIT: int = 50
+    USER_LIST_MAX_LIMIT: int = 200
+    USER_BATCH_MAX_KEYS: int = 100  # ids or emails per batch lookup
 
     @model_validator(mode="before")
     def validate(cls, values: dict[str, Any]) -> dict[str, Any]:
@@ -33,6 +50,8 @@ class _ModuleConfig(BaseSettings):
         """
         if "RELOAD_ASGI" in values:
             values['RELOAD_ASGI'] = values['RELOAD_ASGI'] in ('true', '1')
+        if "LAMBDA_INIT_WARM_UP" in values and isinstance(values["LAMBDA_INIT_WARM_UP"], str):
+            values["LAMBDA_INIT_WARM_UP"] = values["LAMBDA_INIT_WARM_UP"].lower() in ('true', '1')
         if "CORS_ORIGINS" in values:
             if isinstance(values["CORS_ORIGINS"], str):
                 values["CORS_ORIGINS"] = values["CORS_ORIGINS"].strip().split(",")
@@ -48,9 +67,24 @@ class _JWTConfig(BaseSettings):
     Configuration settings for JWT.
     This class is used to load environment variables related to JWT.
     """
-    JWT_SECRET_KEY: str
+    JWT_SECRET_KEY: str = ""
     JWT_ALGORITHM: str = "HS256"
-    JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 60  # default to 1 hour
+    JWT_KEYS_DIR: str = "keys"  # <kid>.pem signing keys of the asymmetric algorithms
+    JWT_ACTIVE_KID: str = ""  # Defaults to the last kid in name order
+    JWT_JWKS_MAX_AGE_SECONDS: int = 300
+    JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 15  # short lived, renewed with the refresh token
+    JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 30  # lifetime of a login session, not extended by refreshes
+    JWT_RESET_PASSWORD_TOKEN_EXPIRE_MINUTES: int = 60
+    JWT_VERIFY_EMAIL_TOKEN_EXPIRE_MINUTES: int = 1440
+    JWT_CLAIMS_CACHE_SIZE: int = 10000
+    JWT_REVOCATION_SYNC_SECONDS: float = 5
+    # Requests wait for a sync once the revocation list is older, e.g. on Lambda without a background loop
+    JWT_REVOCATION_MAX_STALENESS_SECONDS: float = 30
+    # Re-read window of the sync, covers revocations committed after rows with a later created_at
+    JWT_REVOCATION_SYNC_OVERLAP_SECONDS: float = 60
+    # last_seen_at of the sessions is buffered in memory and written in one statement per interval
+    SESSION_LAST_SEEN_FLUSH_SECONDS: float = 30
+    SESSION_LAST_SEEN_MAX_PENDING: int = 10000  # flush early once this many sessions are pending
 
     @model_validator(mode="before")
     def validate(cls, values: dict[str, Any]) -> dict[str, Any]:
@@ -63,17 +97,54 @@ class _JWTConfig(BaseSettings):
         Returns:
             Self: The validated JWT configuration instance.
         """
-        if "JWT_SECRET_KEY" not in values or not values["JWT_SECRET_KEY"]:
+        algorithm = values.get("JWT_ALGORITHM") or "HS256"
+        if algorithm not in ("HS256", "HS384", "HS512", "RS256", "RS384", "RS512", "ES256", "ES384", "EdDSA"):
+            raise ValueError("JWT_ALGORITHM must be one of HS256/384/512, RS256/384/512, ES256/384, EdDSA")
+        if algorithm.startswith("HS") and not values.get("JWT_SECRET_KEY"):
             raise ValueError("JWT_SECRET_KEY must be provided")
         return values
 
+SQL_POOL_PRESETS: dict[str, dict[str, Any]] = {
+    # One connection per frozen container; pings guard against sockets dropped while frozen.
+    "lambda": {
+        "SQL_POOL_SIZE": 1,
+        "SQL_MAX_OVERFLOW": 0,
+        "SQL_POOL_RECYCLE": 270,
+        "SQL_POOL_PRE_PING": True,
+        "SQL_POOL_TIMEOUT": 10,
+    },
+    # Long lived workers; recycling replaces per checkout pings for stale connection handling.
+    "server": {
+        "SQL_POOL_SIZE": 10,
+        "SQL_MAX_OVERFLOW": 10,
+        "SQL_POOL_RECYCLE": 1800,
+        "SQL_POOL_PRE_PING": False,
+        "SQL_POOL_TIMEOUT": 5,
+    },
+}
+
+
 class _SQLConfig(BaseSettings):
     """
     Configuration settings for SQL.
     This class is used to load environment variables related to SQL database connection.
+    Pool settings not provided explicitly are taken from the SQL_POOL_PRESET.
     """
     SQL_URL: str
     SQL_DATABASE: str = "user_management_db"
+    SQL_ASYNC_ENABLED: bool = True
+    SQL_ASYNC_DRIVER: str = "postgresql+asyncpg"
+    SQL_POOL_PRESET: str = "server"
+    SQL_POOL_SIZE: int
+    SQL_MAX_OVERFLOW: int
+    SQL_POOL_RECYCLE: int
+    SQL_POOL_PRE_PING: bool
+    SQL_POOL_TIMEOUT: float
+    SQL_CONNECT_TIMEOUT: int = 10
+    SQL_SLOW_CHECKOUT_MS: float = 100
+    SQL_BULK_CHUNK_SIZE: int = 1000
+    SQL_STREAM_YIELD_PER: int = 1000
+    SQL_SCHEMA_CHECK: str = "warn"  # off, warn or fail when the database is not at the migration head
 
     @model_validator(mode="before")
     def validate(cls, values: dict[str, Any]) -> dict[str, Any]:
@@ -89,6 +160,21 @@ class _SQLConfig(BaseSettings):
         if "SQL_URL" not in values or not values["SQL_URL"]:
             raise ValueError("SQL_URL must be provided")
         values["SQL_URL"] = values["SQL_URL"].strip().rstrip('/')
+        if "SQL_ASYNC_ENABLED" in values and isinstance(values["SQL_ASYNC_ENABLED"], str):
+            values["SQL_ASYNC_ENABLED"] = values["SQL_ASYNC_ENABLED"].lower() in ('true', '1')
+        preset = str(values.get("SQL_POOL_PRESET") or "server").strip().lower()
+        if preset not in SQL_POOL_PRESETS:
+            raise ValueError(f"SQL_POOL_PRESET must be one of {', '.join(SQL_POOL_PRESETS)}")
+        values["SQL_POOL_PRESET"] = preset
+        for key, default in SQL_POOL_PRESETS[preset].items():
+            if values.get(key) in (None, ""):
+                values[key] = default
+        if isinstance(values["SQL_POOL_PRE_PING"], str):
+            values["SQL_POOL_PRE_PING"] = values["SQL_POOL_PRE_PING"].lower() in ('true', '1')
+        if "SQL_SCHEMA_CHECK" in values:
+            values["SQL_SCHEMA_CHECK"] = str(values["SQL_SCHEMA_CHECK"]).strip().lower()
+            if values["SQL_SCHEMA_CHECK"] not in ("off", "warn", "fail"):
+                raise ValueError("SQL_SCHEMA_CHECK must be one of off, warn, fail")
         return values
 
 class _EmailConfig(BaseSettings):
@@ -102,6 +188,20 @@ class _EmailConfig(BaseSettings):
     SMTP_PASSWORD: str
     EMAIL_FROM: str
     ALLOW_SSL: bool = True
+    SMTP_STARTTLS: bool = True
+    SMTP_TIMEOUT: float = 10
+    SMTP_POOL_SIZE: int = 2
+    SMTP_NOOP_AFTER_SECONDS: float = 30
+    SMTP_MAX_IDLE_SECONDS: float = 240
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
+    EMAIL_OUTBOX_BACKOFF_SECONDS: float = 30
+    EMAIL_OUTBOX_MAX_BACKOFF_SECONDS: float = 3600
+    EMAIL_OUTBOX_LEASE_SECONDS: float = 300  # A claimed batch is due again after this, must exceed its delivery
+    EMAIL_DISPATCHER_ENABLED: bool = False  # Drain the outbox from a background task of the API process
+    EMAIL_DISPATCHER_INTERVAL_SECONDS: float = 5
+    EMAIL_TEMPLATE_AUTO_RELOAD: bool = False  # Dev mode: pick up template edits without a restart
 
     @model_validator(mode="before")
     def validate(cls, values: dict[str, Any]) -> dict[str, Any]:
@@ -118,12 +218,104 @@ class _EmailConfig(BaseSettings):
             raise ValueError("SMTP_SERVER must be provided")
         if "ALLOW_SSL" in values and  isinstance(values['ALLOW_SSL'], str):
             values['ALLOW_SSL'] = values['ALLOW_SSL'].lower() in ('true', '1')
+        if "SMTP_STARTTLS" in values and isinstance(values['SMTP_STARTTLS'], str):
+            values['SMTP_STARTTLS'] = values['SMTP_STARTTLS'].lower() in ('true', '1')
+        if "EMAIL_DISPATCHER_ENABLED" in values and isinstance(values['EMAIL_DISPATCHER_ENABLED'], str):
+            values['EMAIL_DISPATCHER_ENABLED'] = values['EMAIL_DISPATCHER_ENABLED'].lower() in ('true', '1')
+        if "EMAIL_TEMPLATE_AUTO_RELOAD" in values and isinstance(values['EMAIL_TEMPLATE_AUTO_RELOAD'], str):
+            values['EMAIL_TEMPLATE_AUTO_RELOAD'] = values['EMAIL_TEMPLATE_AUTO_RELOAD'].lower() in ('true', '1')
+        return values
+
+class _PasswordConfig(BaseSettings):
+    """
+    Configuration settings for password hashing.
+    This class is used to load environment variables related to the password hashing worker pool.
+    """
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 1
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    # The first scheme hashes new passwords, the remaining ones are only verified and migrated on login.
+    PASSWORD_SCHEMES: list[str] = ["bcrypt"]
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_ARGON2_MEMORY_COST: int = 65536  # KiB
+    PASSWORD_ARGON2_TIME_COST: int = 3
+    PASSWORD_ARGON2_PARALLELISM: int = 4
+    PASSWORD_REHASH_ON_LOGIN: bool = True
+
+    @model_validator(mode="before")
+    def validate(cls, values: dict[str, Any]) -> dict[str, Any]:
+        """
+        Validate the password hashing configuration settings.
+
+        Args:
+            values (Any): The values to validate.
+        Returns:
+            Self: The validated password configuration instance.
+        """
+        if "PASSWORD_SCHEMES" in values and isinstance(values["PASSWORD_SCHEMES"], str):
+            values["PASSWORD_SCHEMES"] = [
+                scheme.strip().lower() for scheme in values["PASSWORD_SCHEMES"].split(",") if scheme.strip()
+            ]
+        if "PASSWORD_SCHEMES" in values:
+            unsupported = set(values["PASSWORD_SCHEMES"]) - {"bcrypt", "argon2"}
+            if unsupported or not values["PASSWORD_SCHEMES"]:
+                raise ValueError("PASSWORD_SCHEMES must be a non empty list of 'bcrypt' and/or 'argon2'")
+        if "PASSWORD_REHASH_ON_LOGIN" in values and isinstance(values["PASSWORD_REHASH_ON_LOGIN"], str):
+            values["PASSWORD_REHASH_ON_LOGIN"] = values["PASSWORD_REHASH_ON_LOGIN"].lower() in ('true', '1')
+        if "PASSWORD_HASH_EXECUTOR" in values:
+            values["PASSWORD_HASH_EXECUTOR"] = values["PASSWORD_HASH_EXECUTOR"].strip().lower()
+            if values["PASSWORD_HASH_EXECUTOR"] not in ("thread", "process"):
+                raise ValueError("PASSWORD_HASH_EXECUTOR must be either 'thread' or 'process'")
+        return values
+
+
+class _CacheConfig(BaseSettings):
+    """
+    Configuration settings for the user profile cache.
+    memory keeps an LRU per process, redis shares the cache between processes and instances,
+    off reads every profile from the database.
+    """
+    USER_CACHE_BACKEND: str = "memory"
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60
+    USER_CACHE_REDIS_URL: str = ""
+    USER_CACHE_KEY_PREFIX: str = "user_mngmt:"
+
+    @model_validator(mode="before")
+    def validate(cls, values: dict[str, Any]) -> dict[str, Any]:
+        """
+        Validate the cache configuration settings.
+
+        Args:
+            values (Any): The values to validate.
+        Returns:
+            Self: The validated cache configuration instance.
+        """
+        if "USER_CACHE_BACKEND" in values:
+            values["USER_CACHE_BACKEND"] = str(values["USER_CACHE_BACKEND"]).strip().lower()
+            if values["USER_CACHE_BACKEND"] not in ("off", "memory", "redis"):
+                raise ValueError("USER_CACHE_BACKEND must be one of off, memory, redis")
+            if values["USER_CACHE_BACKEND"] == "redis" and not values.get("USER_CACHE_REDIS_URL"):
+                raise ValueError("USER_CACHE_REDIS_URL must be provided for the redis cache backend")
         return values
 
 
+class _PermissionConfig(BaseSettings):
+    """
+    Configuration settings for the role permission engine.
+    """
+    PERMISSION_SYNC_SECONDS: float = 10
+    # Requests wait for a sync once the compiled roles are older, e.g. on Lambda without a background loop
+    PERMISSION_MAX_STALENESS_SECONDS: float = 60
+
+
 ModuleConfig = _ModuleConfig()
 JWTConfig = _JWTConfig()
 SQLConfig = _SQLConfig()
 EmailConfig = _EmailConfig()
+PasswordConfig = _PasswordConfig()
+CacheConfig = _CacheConfig()
+PermissionConfig = _PermissionConfig()
 
-__all__ = ["ModuleConfig", "JWTConfig", "SQLConfig", "EmailConfig"]
+__all__ = ["ModuleConfig", "JWTConfig", "SQLConfig", "EmailConfig", "PasswordConfig", "CacheConfig",
+           "PermissionConfig"]
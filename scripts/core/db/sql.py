@@ -1,6 +1,11 @@
+import datetime
+
+from scripts.core.db.user_cache import user_cache
 from scripts.db.pg.queries import SQLQueries
+from scripts.db.pg.mappers import RowMapper
 from scripts.db.pg.ops import SQLOps
 from scripts.db.pg.sql_schemas import Users, UserMetadata
+from scripts.exceptions import PreconditionFailedException
 
 
 class SQLHandler:
@@ -23,68 +28,384 @@ class SQLHandler:
         result = await self.sql_ops.execute_query(query=query, first_result=True)
         return result
 
-    def insert_new_user(self, user_data: dict):
+    async def register_user(self, user_data: dict, user_metadata: dict):
+        """
+        Insert a new user together with its metadata in a single transaction.
+        Duplicate emails are rejected by the unique index and raise IntegrityError.
+
+        :param user_data: A dictionary containing user data.
+        :param user_metadata: A dictionary containing user metadata.
+        :return: The inserted user.
+        """
+        async with self.sql_ops.unit_of_work():
+            user = self.sql_ops.add(user_data, model=Users)
+            self.sql_ops.add({**user_metadata, "user": user}, model=UserMetadata)
+        return user
+
+    async def insert_new_user(self, user_data: dict):
         """
         Insert a new user into the database.
 
         :param user_data: A dictionary containing user data.
         :return: The result of the insert operation.
         """
-        return self.sql_ops.insert_one(user_data, model=Users)
+        return await self.sql_ops.insert_one(user_data, model=Users)
 
-    def insert_user_metadata(self, user_metadata: dict):
+    async def insert_user_metadata(self, user_metadata: dict):
         """
         Insert user metadata into the database.
 
         :param user_metadata: A dictionary containing user metadata.
         :return: The result of the insert operation.
         """
-        return self.sql_ops.insert_one(user_metadata, model=UserMetadata)
+        return await self.sql_ops.insert_one(user_metadata, model=UserMetadata)
 
-    def update_user(self, user_data: dict, filter_condition):
+    async def update_user(self, user_data: dict, filter_condition):
         """
-        Update user data in the database.
+        Update user data in the database and invalidate the cached profiles of the updated users.
 
         :param user_data: A dictionary containing user data to update.
         :param filter_condition: The condition to filter which user to update.
-        :return: The result of the update operation.
+        :return: The ids of the updated users.
         """
-        return self.sql_ops.update_query(data=user_data, model=Users, filter_condition=filter_condition)
+        rows = await self.sql_ops.update_query(data=user_data, model=Users, filter_condition=filter_condition,
+                                               returning=(Users.id,))
+        for row in rows:
+            await user_cache.invalidate(user_id=row.id)
+        return rows
 
-    def update_user_metadata(self, user_metadata: dict, filter_condition):
+    async def update_user_metadata(self, user_metadata: dict, filter_condition, commit: bool = True):
         """
-        Update user metadata in the database.
+        Update user metadata in the database and invalidate the cached profiles of the updated users.
 
         :param user_metadata: A dictionary containing user metadata to update.
         :param filter_condition: The condition to filter which user metadata to update.
-        :return: The result of the update operation.
+        :param commit: If False, the update is committed together with the next committing operation.
+        :return: The user ids of the updated metadata.
         """
-        return self.sql_ops.update_query(data=user_metadata, model=UserMetadata, filter_condition=filter_condition)
+        rows = await self.sql_ops.update_query(data=user_metadata, model=UserMetadata,
+                                               filter_condition=filter_condition, commit=commit,
+                                               returning=(UserMetadata.user_id,))
+        for row in rows:
+            await user_cache.invalidate(user_id=row.user_id)
+        return rows
 
-    async def get_user_metadata(self, reset_token: str):
+    async def enqueue_email(self, template: str, to_email: str, payload: dict, commit: bool = True):
         """
-        Get the user metadata from the database.
+        Add an email to the outbox, to be delivered by the email dispatcher.
 
-        :params filter_conditions: The condition to filter which user metadata to update.
-        :return: The result of the operation.
+        :param template: The name of the email handler rendering the message.
+        :param to_email: The recipient.
+        :param payload: The arguments for rendering the message.
+        :param commit: If False, the insert is committed together with the next committing operation.
+        :return: The result of the insert operation.
         """
-        query = SQLQueries.get_user_metadata_by_reset_token(reset_token)
-        result = await self.sql_ops.execute_query(query=query)
-        return result
+        query = SQLQueries.enqueue_email(template=template, to_email=to_email, payload=payload)
+        return await self.sql_ops.execute_statement(query, commit=commit)
+
+    async def revoke_tokens(self, user_id, expires_at: datetime.datetime, jti: str = None,
+                            revoked_before: datetime.datetime = None):
+        """
+        Revoke one access token, or every access token of a user issued up to revoked_before.
+
+        :param user_id: The id of the user owning the tokens.
+        :param expires_at: When every revoked token has expired.
+        :param jti: The id of the single token to revoke.
+        :param revoked_before: Revoke the tokens of the user issued up to this time.
+        :return: The result of the insert operation.
+        """
+        query = SQLQueries.revoke_tokens(user_id=user_id, expires_at=expires_at, jti=jti,
+                                         revoked_before=revoked_before)
+        return await self.sql_ops.execute_statement(query)
+
+    async def create_session(self, session_id, user_id, token_hash: str, expires_at: datetime.datetime):
+        """
+        Open a login session.
+
+        :param session_id: The id of the session.
+        :param user_id: The id of the user.
+        :param token_hash: The SHA-256 of the first refresh token.
+        :param expires_at: When the session ends.
+        :return: The result of the insert operation.
+        """
+        query = SQLQueries.create_session(session_id=session_id, user_id=user_id, token_hash=token_hash,
+                                          expires_at=expires_at)
+        return await self.sql_ops.execute_statement(query)
+
+    async def rotate_session(self, session_id, generation: int, token_hash: str, new_token_hash: str):
+        """
+        Replace the refresh token of a session, if the presented one is its current token.
+
+        :param session_id: The id of the session.
+        :param generation: The generation of the presented refresh token.
+        :param token_hash: The SHA-256 of the presented refresh token.
+        :param new_token_hash: The SHA-256 of the new refresh token.
+        :return: The user_id, email, role and expires_at of the session, None if it was not rotated.
+        """
+        query = SQLQueries.rotate_session(session_id=session_id, generation=generation, token_hash=token_hash,
+                                          new_token_hash=new_token_hash)
+        result = await self.sql_ops.execute_statement(query, commit=False)
+        row = result.first()
+        await self.sql_ops.commit()
+        return row
+
+    async def get_session(self, session_id):
+        """
+        Get the state of a session.
+
+        :param session_id: The id of the session.
+        :return: The row of user_id, generation, revoked_at and expires_at, None if it does not exist.
+        """
+        query = SQLQueries.get_session(session_id=session_id)
+        return await self.sql_ops.execute_query(query=query, first_result=True)
+
+    async def revoke_sessions(self, user_id=None, session_id=None):
+        """
+        Revoke one session, or every live session of a user.
+
+        :param user_id: The id of the user whose sessions to revoke.
+        :param session_id: The id of the single session to revoke.
+        :return: The ids of the revoked sessions.
+        """
+        return await self._write_returning(SQLQueries.revoke_sessions(user_id=user_id, session_id=session_id))
+
+    async def _write_returning(self, query) -> list:
+        result = await self.sql_ops.execute_statement(query, commit=False)
+        rows = result.all()
+        await self.sql_ops.commit()
+        return rows
+
+    async def list_roles(self) -> list[dict]:
+        """
+        Get every role.
+
+        :return: The roles as dictionaries.
+        """
+        result = await self.sql_ops.execute_query(query=SQLQueries.list_roles())
+        return [dict(row._mapping) for row in result]
+
+    async def get_role(self, role_id) -> dict | None:
+        """
+        Get a role.
+
+        :param role_id: The id of the role.
+        :return: The role as a dictionary, None if it does not exist.
+        """
+        result = await self.sql_ops.execute_query(query=SQLQueries.get_role(role_id=role_id), first_result=True)
+        return dict(result._mapping) if result else None
+
+    async def create_role(self, role_data: dict) -> dict:
+        """
+        Insert a role. Duplicate names are rejected by the unique index and raise IntegrityError.
+
+        :param role_data: The name, description, is_active and permissions of the role.
+        :return: The created role as a dictionary.
+        """
+        rows = await self._write_returning(SQLQueries.create_role(role_data=role_data))
+        return dict(rows[0]._mapping)
+
+    async def update_role(self, role_id, role_data: dict) -> dict | None:
+        """
+        Update the fields given of a role.
 
-    async def get_user_by_id(self, user_id: str):
+        :param role_id: The id of the role.
+        :param role_data: The fields to update.
+        :return: The updated role as a dictionary, None if it does not exist.
+        """
+        rows = await self._write_returning(SQLQueries.update_role(role_id=role_id, role_data=role_data))
+        return dict(rows[0]._mapping) if rows else None
+
+    async def upsert_role(self, name: str, permissions: dict, description: str = None) -> dict:
+        """
+        Create a role, or replace the permissions of the role with that name.
+
+        :param name: The name of the role.
+        :param permissions: The permissions JSON of the role.
+        :param description: The description of a created role.
+        :return: The role as a dictionary.
+        """
+        rows = await self._write_returning(SQLQueries.upsert_role(name=name, permissions=permissions,
+                                                                  description=description))
+        return dict(rows[0]._mapping)
+
+    async def delete_role(self, role_id) -> bool:
+        """
+        Delete a role; its users are left without a role.
+
+        :param role_id: The id of the role.
+        :return: True if the role existed.
+        """
+        return bool(await self._write_returning(SQLQueries.delete_role(role_id=role_id)))
+
+    async def reset_password(self, user_id, token_hash: str, password: str, revoked_before: datetime.datetime,
+                             expires_at: datetime.datetime) -> bool:
+        """
+        Consume the reset token of a user, set the new password and revoke every session and access token
+        of the user in a single transaction. Nothing is written unless the token is valid.
+
+        :param user_id: The id of the user from the claims of the token.
+        :param token_hash: The SHA-256 of the presented reset token.
+        :param password: The hash of the new password.
+        :param revoked_before: Revoke the access tokens of the user issued up to this time.
+        :param expires_at: When every revoked access token has expired.
+        :return: True if the token was valid and the password changed.
+        """
+        async with self.sql_ops.unit_of_work():
+            consumed = (await self.sql_ops.execute_statement(
+                SQLQueries.consume_reset_token(user_id=user_id, token_hash=token_hash), commit=False)).all()
+            if consumed:
+                await self.sql_ops.update_query(data={"password": password}, model=Users,
+                                                filter_condition={"id": user_id}, commit=False)
+                await self.sql_ops.execute_statement(SQLQueries.revoke_sessions(user_id=user_id), commit=False)
+                await self.sql_ops.execute_statement(
+                    SQLQueries.revoke_tokens(user_id=user_id, expires_at=expires_at, revoked_before=revoked_before),
+                    commit=False)
+        if consumed:
+            await user_cache.invalidate(user_id=user_id)
+        return bool(consumed)
+
+    async def get_user_tokens(self, user_id):
+        """
+        Get the stored verification and reset token hashes of a user.
+
+        :param user_id: The id of the user.
+        :return: The row of token hashes, None if the user has no metadata.
+        """
+        query = SQLQueries.get_user_tokens(user_id=user_id)
+        return await self.sql_ops.execute_query(query=query, first_result=True)
+
+    async def get_user_by_id(self, user_id: str) -> dict | None:
+        """
+        Get a user with its metadata, from the user cache when possible.
+
+        :param user_id: The id of the user.
+        :return: The user as a dictionary without password or tokens, None if it does not exist.
+        """
+        user = await user_cache.get_by_id(user_id)
+        if user is not None:
+            return user
         query = SQLQueries.get_user_by_id(user_id=user_id)
-        result = await self.sql_ops.execute_query(query=query, json_result=True, first_result=True)
-        return result
+        result = await self.sql_ops.execute_query(query=query, first_result=True)
+        if not result:
+            return None
+        user = RowMapper.user(result[0])
+        await user_cache.set(user)
+        return user
 
-    async def get_user_metadata_by_verification_token(self, verification_token: str):
+    async def get_user_by_email(self, email: str) -> dict | None:
         """
-        Get user metadata by verification token.
+        Get a user with its metadata by email, from the user cache when possible.
+        Use check_user_exists_by_mail where the password hash is needed.
 
-        :param verification_token: The token used for email verification.
-        :return: The user metadata if found, otherwise None.
+        :param email: The email of the user.
+        :return: The user as a dictionary without password or tokens, None if it does not exist.
         """
-        query = SQLQueries.get_user_metadata_by_verification_token(verification_token)
+        user = await user_cache.get_by_email(email)
+        if user is not None:
+            return user
+        query = SQLQueries.check_user_with_email(email)
         result = await self.sql_ops.execute_query(query=query, first_result=True)
-        return result
+        if not result:
+            return None
+        user = RowMapper.user(result[0])
+        await user_cache.set(user)
+        return user
+
+    async def get_users_by_ids(self, user_ids: list) -> dict:
+        """
+        Get many users with their metadata, from the user cache when possible and with one query
+        for all the others.
+
+        :param user_ids: The ids of the users.
+        :return: The users found, as dictionaries without password or tokens, by id.
+        """
+        users = await user_cache.get_many_by_id(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if missing:
+            for row in await self.sql_ops.execute_query(query=SQLQueries.get_users_by_ids(missing)):
+                user = RowMapper.user(row[0])
+                users[user["id"]] = user
+                await user_cache.set(user)
+        return users
+
+    async def get_users_by_emails(self, emails: list[str]) -> dict:
+        """
+        Get many users with their metadata by email, from the user cache when possible and with one
+        query for all the others.
+
+        :param emails: The emails of the users.
+        :return: The users found, as dictionaries without password or tokens, by email.
+        """
+        users = await user_cache.get_many_by_email(emails)
+        missing = [email for email in emails if email not in users]
+        if missing:
+            for row in await self.sql_ops.execute_query(query=SQLQueries.get_users_by_emails(missing)):
+                user = RowMapper.user(row[0])
+                users[user["email"]] = user
+                await user_cache.set(user)
+        return users
+
+    async def get_user_version(self, user_id, use_cache: bool = True) -> dict | None:
+        """
+        Get the version of a user, i.e. the updated_at of the user and of its metadata, from the
+        cached profile when there is one, else with a query that reads only those two columns.
 
+        :param user_id: The id of the user.
+        :param use_cache: False to always read the current version from the database.
+        :return: A dictionary of id, updated_at and metadata_updated_at, None if the user does not exist.
+        """
+        user = await user_cache.get_by_id(user_id) if use_cache else None
+        if user is not None:
+            metadata = user["user_metadata"] or {}
+            return {"id": user["id"], "updated_at": user["updated_at"],
+                    "metadata_updated_at": metadata.get("updated_at")}
+        query = SQLQueries.get_user_version(user_id=user_id)
+        result = await self.sql_ops.execute_query(query=query, first_result=True)
+        return dict(result._mapping) if result else None
+
+    async def update_user_profile(self, user_id, user_data: dict, user_metadata: dict,
+                                  expected_version: dict | None = None) -> dict:
+        """
+        Update a user and its metadata in one transaction, optionally as a compare-and-set on its version.
+        With expected_version each row is only updated while its updated_at is unchanged, so after a
+        concurrent write the update matches no row and the transaction is rolled back, without locking
+        the rows up front. Both updated_at are bumped, so the version always changes.
+
+        :param user_id: The id of the user.
+        :param user_data: The user columns to update.
+        :param user_metadata: The user metadata columns to update.
+        :param expected_version: The version, as returned by get_user_version, the update is based on.
+        :return: The new version of the user.
+        """
+        now = datetime.datetime.utcnow()
+        user_filter = {"id": user_id}
+        metadata_filter = {"user_id": user_id}
+        if expected_version is not None:
+            user_filter["updated_at"] = expected_version["updated_at"]
+            if expected_version["metadata_updated_at"] is not None:
+                metadata_filter["updated_at"] = expected_version["metadata_updated_at"]
+        async with self.sql_ops.unit_of_work():
+            users = await self.sql_ops.update_query(data={**user_data, "updated_at": now}, model=Users,
+                                                    filter_condition=user_filter, commit=False,
+                                                    returning=(Users.updated_at,))
+            metadata = await self.sql_ops.update_query(data={**user_metadata, "updated_at": now}, model=UserMetadata,
+                                                       filter_condition=metadata_filter, commit=False,
+                                                       returning=(UserMetadata.updated_at,))
+            if not users or (len(metadata_filter) > 1 and not metadata):
+                raise PreconditionFailedException("User was modified by another request.")
+        await user_cache.invalidate(user_id=user_id)
+        return {"id": user_id, "updated_at": users[0].updated_at,
+                "metadata_updated_at": metadata[0].updated_at if metadata else None}
+
+    async def list_users(self, filters, after: tuple | None, limit: int) -> list[dict]:
+        """
+        Get one keyset page of users.
+
+        :param filters: The UserListQuery filters.
+        :param after: The (created_at, id) of the last user of the previous page.
+        :param limit: The number of users to return.
+        :return: The users as dictionaries, without password or tokens.
+        """
+        query = SQLQueries.list_users(filters=filters, after=after, limit=limit)
+        result = await self.sql_ops.execute_query(query=query)
+        return [dict(row._mapping) for row in result]
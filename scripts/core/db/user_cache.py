@@ -0,0 +1,219 @@
+import datetime
+import logging
+import uuid
+
+import orjson
+
+from scripts.config import CacheConfig
+from scripts.utils.cache import CacheStats, MemoryCacheBackend, RedisCacheBackend
+from scripts.utils.metrics import metrics_registry
+from scripts.utils.responses import orjson_default
+
+logger = logging.getLogger(__name__)
+
+# Never cached: the entries are served as API responses
+SENSITIVE_FIELDS = frozenset({"password", "email_verification_token", "reset_password_token",
+                              "reset_password_expires_at"})
+UUID_FIELDS = ("id", "role")
+DATETIME_FIELDS = ("created_at", "updated_at")
+
+
+class UserCache:
+    """
+    Read-through cache of the user profiles built by RowMapper.user, keyed by user id, with a
+    secondary email -> id index. Entries are stored as orjson bytes, so a cached profile can not be
+    mutated by its readers and the same entries work for the memory and the redis backend.
+
+    Writes invalidate the entries after their statement ran; a read racing with a write may still
+    store the previous profile, which then lives at most USER_CACHE_TTL_SECONDS.
+    Backend failures are logged and counted, the lookup then falls back to the database.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+        self.ttl = CacheConfig.USER_CACHE_TTL_SECONDS
+        self.prefix = CacheConfig.USER_CACHE_KEY_PREFIX
+        self.backend = None
+        if CacheConfig.USER_CACHE_BACKEND == "memory":
+            self.backend = MemoryCacheBackend(max_entries=CacheConfig.USER_CACHE_MAX_ENTRIES, stats=self.stats)
+        elif CacheConfig.USER_CACHE_BACKEND == "redis":
+            self.backend = RedisCacheBackend(url=CacheConfig.USER_CACHE_REDIS_URL, stats=self.stats)
+        metrics_registry.register_gauge("user_cache", self.status)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _id_key(self, user_id) -> str:
+        return f"{self.prefix}user:{user_id}"
+
+    def _email_key(self, email: str) -> str:
+        return f"{self.prefix}user_email:{email}"
+
+    @staticmethod
+    def _encode(user: dict) -> bytes:
+        leaked = SENSITIVE_FIELDS.intersection(user).union(SENSITIVE_FIELDS.intersection(user.get("user_metadata") or {}))
+        if leaked:
+            raise ValueError(f"Refusing to cache sensitive user fields: {', '.join(sorted(leaked))}")
+        return orjson.dumps(user, default=orjson_default)
+
+    @staticmethod
+    def _decode(value: bytes) -> dict:
+        user = orjson.loads(value)
+        for field in UUID_FIELDS:
+            if user.get(field):
+                user[field] = uuid.UUID(user[field])
+        for field in DATETIME_FIELDS:
+            if user.get(field):
+                user[field] = datetime.datetime.fromisoformat(user[field])
+        metadata = user.get("user_metadata") or {}
+        for field in ("locked_until", *DATETIME_FIELDS):
+            if metadata.get(field):
+                metadata[field] = datetime.datetime.fromisoformat(metadata[field])
+        return user
+
+    async def _get(self, key: str) -> bytes | None:
+        try:
+            return await self.backend.get(key)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning("User cache read failed: %s", e)
+            return None
+
+    async def _get_many(self, keys: list[str]) -> list[bytes | None]:
+        try:
+            return await self.backend.get_many(keys)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning("User cache read failed: %s", e)
+            return [None] * len(keys)
+
+    async def get_many_by_id(self, user_ids: list) -> dict:
+        """
+        Get the cached profiles of many users in one backend round trip.
+
+        :param user_ids: The ids of the users.
+        :return: The profiles found, by user id.
+        """
+        if not self.enabled or not user_ids:
+            return {}
+        users = {}
+        for user_id, value in zip(user_ids, await self._get_many([self._id_key(user_id) for user_id in user_ids])):
+            if value is None:
+                self.stats.misses += 1
+            else:
+                self.stats.hits += 1
+                users[user_id] = self._decode(value)
+        return users
+
+    async def get_many_by_email(self, emails: list[str]) -> dict:
+        """
+        Get the cached profiles of many users through the email index, in two backend round trips.
+
+        :param emails: The emails of the users.
+        :return: The profiles found, by email.
+        """
+        if not self.enabled or not emails:
+            return {}
+        indexed = await self._get_many([self._email_key(email) for email in emails])
+        pairs = [(email, user_id.decode()) for email, user_id in zip(emails, indexed) if user_id is not None]
+        values = await self._get_many([self._id_key(user_id) for _, user_id in pairs])
+        users = {}
+        for email, value in zip((email for email, _ in pairs), values):
+            user = self._decode(value) if value is not None else None
+            if user is not None and user["email"] == email:
+                users[email] = user
+        self.stats.hits += len(users)
+        self.stats.misses += len(emails) - len(users)
+        return users
+
+    async def get_by_id(self, user_id) -> dict | None:
+        """
+        Get a cached profile.
+
+        :param user_id: The id of the user.
+        :return: The profile, None on a miss.
+        """
+        if not self.enabled:
+            return None
+        value = await self._get(self._id_key(user_id))
+        if value is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return self._decode(value)
+
+    async def get_by_email(self, email: str) -> dict | None:
+        """
+        Get a cached profile through the email index.
+        The index is only trusted when the profile it points to still has that email.
+
+        :param email: The email of the user.
+        :return: The profile, None on a miss.
+        """
+        if not self.enabled:
+            return None
+        user_id = await self._get(self._email_key(email))
+        value = await self._get(self._id_key(user_id.decode())) if user_id is not None else None
+        user = self._decode(value) if value is not None else None
+        if user is None or user["email"] != email:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return user
+
+    async def set(self, user: dict):
+        """
+        Cache a profile and index it by email.
+
+        :param user: The profile as built by RowMapper.user; password and token fields are rejected.
+        """
+        if not self.enabled:
+            return
+        value = self._encode(user)
+        try:
+            await self.backend.set(self._id_key(user["id"]), value, self.ttl)
+            await self.backend.set(self._email_key(user["email"]), str(user["id"]).encode(), self.ttl)
+            self.stats.sets += 1
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning("User cache write failed: %s", e)
+
+    async def invalidate(self, user_id=None, email: str = None):
+        """
+        Drop the cached profile of a user, found by id or by email, and its email index entry.
+
+        :param user_id: The id of the user.
+        :param email: The email of the user, when the id is not known.
+        """
+        if not self.enabled:
+            return
+        keys = []
+        if email is not None:
+            keys.append(self._email_key(email))
+            indexed_id = await self._get(self._email_key(email))
+            if user_id is None and indexed_id is not None:
+                user_id = indexed_id.decode()
+        if user_id is not None:
+            keys.append(self._id_key(user_id))
+            value = await self._get(self._id_key(user_id))
+            if value is not None:
+                keys.append(self._email_key(orjson.loads(value)["email"]))
+        if not keys:
+            return
+        try:
+            await self.backend.delete(*keys)
+            self.stats.invalidations += 1
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning("User cache invalidation failed: %s", e)
+
+    def status(self) -> dict:
+        return {
+            "backend": self.backend.name if self.enabled else "off",
+            "entries": self.backend.size() if self.enabled else 0,
+            **self.stats.snapshot(),
+        }
+
+
+user_cache = UserCache()
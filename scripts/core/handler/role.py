@@ -0,0 +1,119 @@
+from sqlalchemy.exc import IntegrityError
+
+from scripts.core.db.sql import SQLHandler
+from scripts.core.schemas.roles import CreateRole, UpdateRole
+from scripts.core.services.permissions import ALL_PERMISSIONS, permission_engine
+from scripts.db.pg.sql_schemas import Roles
+from scripts.exceptions import NotFoundException, UserManagementException
+
+
+class RoleHandler:
+    """
+    RoleHandler class to manage roles and their permissions.
+    Every write is applied to the permission engine of this process right away; the other
+    processes recompile the role with their next sync, as its updated_at changed.
+    """
+
+    def __init__(self, session):
+        self.sql_handler = SQLHandler(session=session)
+
+    async def list_roles(self):
+        return {
+            "status": "success",
+            "message": "Roles fetched successfully",
+            "data": await self.sql_handler.list_roles(),
+        }
+
+    async def get_role(self, role_id):
+        role = await self.sql_handler.get_role(role_id=role_id)
+        if not role:
+            raise NotFoundException("Role does not exist.")
+        return {
+            "status": "success",
+            "message": "Role fetched successfully",
+            "data": role,
+        }
+
+    def _duplicate_name(self, error: IntegrityError):
+        if self.sql_handler.sql_ops.is_unique_violation(error, model=Roles, column="name"):
+            return UserManagementException("Role with this name already exists.")
+        return error
+
+    async def create_role(self, role_data: CreateRole):
+        """
+        Create a role.
+
+        :param role_data: The name, description, is_active and permissions of the role.
+        :return: The created role.
+        """
+        try:
+            role = await self.sql_handler.create_role(role_data=role_data.model_dump())
+        except IntegrityError as e:
+            raise self._duplicate_name(e)
+        permission_engine.apply(role["id"], role["updated_at"], role["is_active"], role["permissions"])
+        return {
+            "status": "success",
+            "message": "Role created successfully",
+            "data": role,
+        }
+
+    async def update_role(self, role_id, role_data: UpdateRole):
+        """
+        Update the fields sent of a role.
+
+        :param role_id: The id of the role.
+        :param role_data: The fields to update.
+        :return: The updated role.
+        """
+        try:
+            role = await self.sql_handler.update_role(role_id=role_id,
+                                                      role_data=role_data.model_dump(exclude_unset=True))
+        except IntegrityError as e:
+            raise self._duplicate_name(e)
+        if not role:
+            raise NotFoundException("Role does not exist.")
+        permission_engine.apply(role["id"], role["updated_at"], role["is_active"], role["permissions"])
+        return {
+            "status": "success",
+            "message": "Role updated successfully",
+            "data": role,
+        }
+
+    async def delete_role(self, role_id):
+        """
+        Delete a role; its users are left without a role, and thus without permissions.
+
+        :param role_id: The id of the role.
+        :return: Confirmation message.
+        """
+        if not await self.sql_handler.delete_role(role_id=role_id):
+            raise NotFoundException("Role does not exist.")
+        permission_engine.remove(role_id)
+        return {
+            "status": "success",
+            "message": "Role deleted successfully",
+        }
+
+    @staticmethod
+    def list_permissions():
+        """
+        List every permission of the catalog.
+        """
+        return {
+            "status": "success",
+            "message": "Permissions fetched successfully",
+            "data": sorted(ALL_PERMISSIONS),
+        }
+
+    @staticmethod
+    async def list_granted_permissions(role_id):
+        """
+        List the permissions granted by a role, as compiled by the permission engine.
+
+        :param role_id: The id of the role, None for no role.
+        """
+        return {
+            "status": "success",
+            "message": "Permissions fetched successfully",
+            "data": sorted(await permission_engine.resolve(role_id)),
+        }
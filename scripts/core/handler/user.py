@@ -1,13 +1,31 @@
-import asyncio
 import datetime
+import hmac
+import logging
+import uuid
 
 from scripts.core.db.sql import SQLHandler
-from scripts.core.services.email import verify_email, reset_password
-from scripts.core.schemas.users import RegisterUser, LoginUser, PasswordReset, UpdateUserData
-from scripts.exceptions import UserManagementException
-from scripts.utils.jwt import JWTUtil
+from scripts.core.schemas.users import (RegisterUser, LoginUser, PasswordReset, UpdateUserData, UserListQuery,
+                                        UserBatchRequest)
+from scripts.config import EmailConfig, JWTConfig, ModuleConfig, PasswordConfig
+from scripts.core.services.permissions import permission_engine
+from scripts.core.services.revocations import revocation_list
+from scripts.db.pg.sessions import get_db
+from scripts.db.pg.sql_schemas import Users
+from scripts.exceptions import (ForbiddenException, NotFoundException, PreconditionFailedException,
+                                UnauthorizedException, UserManagementException)
+from scripts.utils.dataloader import DataLoader
+from scripts.utils.etag import ETagUtil
+from scripts.utils.jwt import JWTUtil, RESET_PASSWORD_PURPOSE, VERIFY_EMAIL_PURPOSE
+from scripts.utils.pagination import CursorUtil
 from scripts.utils.password import PasswordHashingUtil
-from fastapi import Response
+from fastapi import BackgroundTasks, Response
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# Fields only a role granting users:write may change, on any user including oneself
+PRIVILEGED_USER_FIELDS = ("role", "is_active")
+PRIVILEGED_METADATA_FIELDS = ("locked_until",)
 
 
 class UserHandler:
@@ -19,6 +37,10 @@ class UserHandler:
 
     def __init__(self, session):
         self.sql_handler = SQLHandler(session=session)
+        # One handler per request, so the loaders coalesce and memoize the lookups of one request
+        self.user_loader = DataLoader(self.sql_handler.get_users_by_ids, max_batch_size=ModuleConfig.USER_BATCH_MAX_KEYS)
+        self.email_loader = DataLoader(self.sql_handler.get_users_by_emails,
+                                       max_batch_size=ModuleConfig.USER_BATCH_MAX_KEYS)
 
     async def register_user(self, register_data: RegisterUser):
         """
@@ -27,51 +49,144 @@ class UserHandler:
         :param register_data: Data required for user registration.
         :return: Confirmation message or user details.
         """
-        if await self.sql_handler.check_user_exists_by_mail(register_data.email):
-            raise UserManagementException("User with this email already exists.")
-        register_data.password = PasswordHashingUtil.hash_password(register_data.password)
-        user = self.sql_handler.insert_new_user(register_data.model_dump(exclude={"phone_number", "address"}))
-        self.sql_handler.insert_user_metadata({
-            "phone_number": register_data.phone_number,
-            "address": register_data.address,
-            "user_id": user.id,
-        })
+        register_data.password = await PasswordHashingUtil.hash_password_async(register_data.password)
+        try:
+            await self.sql_handler.register_user(
+                user_data=register_data.model_dump(exclude={"phone_number", "address"}),
+                user_metadata={
+                    "phone_number": register_data.phone_number,
+                    "address": register_data.address,
+                },
+            )
+        except IntegrityError as e:
+            if self.sql_handler.sql_ops.is_unique_violation(e, model=Users, column="email"):
+                raise UserManagementException("User with this email already exists.")
+            raise
         return {
             "status": "success",
             "message": "User registered successfully.",
         }
 
-    async def login_user(self, response: Response, login_data: LoginUser):
+    async def login_user(self, response: Response, login_data: LoginUser, background_tasks: BackgroundTasks):
         """
-        Log in a user with the provided login data.
+        Log in a user with the provided login data, opening a session: the response carries a short lived
+        access token and the refresh token of the session, which renews it without the password.
+        Hashes made with an outdated scheme or work factor are upgraded after the response is sent.
 
         :param login_data: Data required for user login.
         :param response: fastapi response
+        :param background_tasks: fastapi background tasks used for the rehash
         :return: Confirmation message or user details.
         """
+        # Login needs the password hash, so it always reads the user from the database, never from the user cache
         user = await self.sql_handler.check_user_exists_by_mail(login_data.email)
         if not user:
             raise UserManagementException("User with this email does not exist.")
+        user = user[0]
 
-        if not PasswordHashingUtil.verify_password(login_data.password, user.password):
+        if not await PasswordHashingUtil.verify_password_async(user.password, login_data.password):
             raise UserManagementException("Invalid password.")
-        # Here you would typically generate a token and set it in the response headers
-        access_token = JWTUtil.create_access_token({
+        if PasswordConfig.PASSWORD_REHASH_ON_LOGIN and PasswordHashingUtil.needs_update(user.password):
+            background_tasks.add_task(self.rehash_password, user.id, user.password, login_data.password)
+        session_id = uuid.uuid4()
+        refresh_token = JWTUtil.new_refresh_token(session_id, generation=0)
+        await self.sql_handler.create_session(
+            session_id=session_id, user_id=user.id, token_hash=JWTUtil.token_hash(refresh_token),
+            expires_at=datetime.datetime.now(datetime.timezone.utc)
+                       + datetime.timedelta(days=JWTConfig.JWT_REFRESH_TOKEN_EXPIRE_DAYS),
+        )
+        access_token = JWTUtil.issue_access_token(user_id=user.id, email=user.email, session_id=session_id,
+                                                  role=user.role)
+        self.set_token_cookies(response, access_token=access_token, refresh_token=refresh_token)
+        return {
+            "status": "success",
+            "message": "User logged in successfully.",
             "user_id": user.id,
-            "email": user.email,
-        })
+        }
+
+    @staticmethod
+    def set_token_cookies(response: Response, access_token: str, refresh_token: str):
         response.set_cookie(
             key="access_token",
             value=access_token,
             httponly=True,
             secure=True,  # Set to True if using HTTPS
         )
+        response.set_cookie(
+            key="refresh_token",
+            value=refresh_token,
+            max_age=JWTConfig.JWT_REFRESH_TOKEN_EXPIRE_DAYS * 86400,
+            httponly=True,
+            secure=True,
+            samesite="strict",
+        )
+
+    async def refresh_session(self, response: Response, refresh_token: str):
+        """
+        Issue a new access token for the session of a refresh token, and rotate the refresh token.
+        Costs a hash and one conditional update; the password is never checked. The presented token
+        is only accepted while it is the current token of the session, so each refresh token works once.
+        Presenting a token of an earlier generation means it was copied: the session is revoked together
+        with the access tokens of the user, and the user has to log in again.
+
+        :param response: fastapi response, receives the new access and refresh token cookies.
+        :param refresh_token: The refresh token of the session.
+        :return: Confirmation message.
+        """
+        session_id, generation = JWTUtil.parse_refresh_token(refresh_token)
+        new_refresh_token = JWTUtil.new_refresh_token(session_id, generation=generation + 1)
+        session = await self.sql_handler.rotate_session(
+            session_id=session_id, generation=generation, token_hash=JWTUtil.token_hash(refresh_token),
+            new_token_hash=JWTUtil.token_hash(new_refresh_token),
+        )
+        if session is None:
+            state = await self.sql_handler.get_session(session_id=session_id)
+            if state is not None and state.revoked_at is None and generation < state.generation:
+                logger.warning("Reuse of a rotated refresh token of session %s, revoking it", session_id)
+                await self.sql_handler.revoke_sessions(session_id=session_id)
+                now = datetime.datetime.now(datetime.timezone.utc)
+                await self.revoke_tokens(user_id=state.user_id, revoked_before=now,
+                                         expires_at=now + datetime.timedelta(minutes=JWTConfig.JWT_ACCESS_TOKEN_EXPIRE_MINUTES))
+            raise UnauthorizedException("Invalid or expired refresh token.")
+        access_token = JWTUtil.issue_access_token(user_id=session.user_id, email=session.email, session_id=session_id,
+                                                  role=session.role)
+        self.set_token_cookies(response, access_token=access_token, refresh_token=new_refresh_token)
         return {
             "status": "success",
-            "message": "User logged in successfully.",
-            "user_id": user.id,
+            "message": "Session refreshed successfully.",
         }
 
+    @staticmethod
+    async def rehash_password(user_id, stored_password: str, password: str):
+        """
+        Rehash a verified password with the current scheme and cost parameters.
+        Runs outside the request with its own session; the update only applies while the stored
+        hash is unchanged so a concurrent password reset is never overwritten.
+
+        :param user_id: The id of the user.
+        :param stored_password: The outdated hash the password was verified against.
+        :param password: The verified plain text password.
+        """
+        try:
+            new_password = await PasswordHashingUtil.hash_password_async(password)
+            async for session in get_db():
+                await SQLHandler(session=session).update_user(
+                    {"password": new_password},
+                    filter_condition={"id": user_id, "password": stored_password},
+                )
+        except Exception as e:
+            logger.warning("Password rehash for user %s failed: %s", user_id, e)
+
+    @staticmethod
+    def notify_email_dispatcher():
+        """
+        Wake up the email dispatcher of this process, if it runs one. Elsewhere the outbox is drained
+        out of band, and the email stack is never imported on the request path.
+        """
+        if EmailConfig.EMAIL_DISPATCHER_ENABLED:
+            from scripts.core.services.email.dispatcher import email_dispatcher
+            email_dispatcher.notify()
+
     async def request_reset_password(self, reset_data: dict):
         """
         Reset a user's password with the provided reset data.
@@ -79,22 +194,25 @@ class UserHandler:
         :param reset_data: Data required for password reset.
         :return: Confirmation message or user details.
         """
-        user = await self.sql_handler.check_user_exists_by_mail(reset_data['email'])
+        user = await self.sql_handler.get_user_by_email(reset_data['email'])
         if not user:
             raise UserManagementException("User with this email does not exist.")
         reset_token = JWTUtil.request_reset_password_token(
-            {"user_id": user.id, "email": user.email}
+            {"user_id": str(user["id"]), "email": user["email"]}
+        )
+        # The token and its email are committed together; the outbox dispatcher delivers the email.
+        # Only the hash of the token is stored.
+        await self.sql_handler.update_user_metadata({
+            "reset_password_token": JWTUtil.token_hash(reset_token),
+            "reset_password_expires_at": datetime.datetime.now(datetime.timezone.utc)
+                                         + datetime.timedelta(minutes=JWTConfig.JWT_RESET_PASSWORD_TOKEN_EXPIRE_MINUTES),
+        }, filter_condition={"user_id": user["id"]}, commit=False)
+        await self.sql_handler.enqueue_email(
+            template="reset_password",
+            to_email=user["email"],
+            payload={"reset_token": reset_token},
         )
-        # Here you would typically send the reset token to the user's email
-        self.sql_handler.update_user_metadata({
-            "reset_token": reset_token,
-            "reset_token_expiry": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
-        }, filter_condition={"user_id": user.id
-                             })
-        asyncio.create_task(reset_password.ResetPassword(
-            reset_token = reset_token,
-            to_email=user.email,
-        ))
+        self.notify_email_dispatcher()
         return {
             "status": "success",
             "message": "Password reset requested. Check your email for the reset link.",
@@ -102,11 +220,21 @@ class UserHandler:
 
     async def verify_reset_password(self, reset_token: str):
         """
-        Verify the request reset details
+        Tell whether a reset token is still usable, e.g. before the reset form is shown.
+        An advisory pre-check only: the token is not consumed here, reset_password checks it again
+        and consumes it together with the password change.
+        Signature, expiry and purpose of the token are checked first, without touching the database;
+        the user's stored token hash is then read by the user id of the claims.
+
         :param reset_token: Reset token from email
         """
-        user_metadata = await self.sql_handler.get_user_metadata(reset_token=reset_token)
-        if not user_metadata:
+        claims = JWTUtil.decode_purpose_token(reset_token, purpose=RESET_PASSWORD_PURPOSE)
+        tokens = await self.sql_handler.get_user_tokens(user_id=claims["user_id"])
+        if (
+            not tokens or not tokens.reset_password_token
+            or not hmac.compare_digest(tokens.reset_password_token, JWTUtil.token_hash(reset_token))
+            or tokens.reset_password_expires_at <= datetime.datetime.now(datetime.timezone.utc)
+        ):
             raise UserManagementException("Password Reset Expired. Please try again afresh")
         return {
             "status": "success",
@@ -115,36 +243,90 @@ class UserHandler:
 
     async def reset_password(self, reset_password_payload: PasswordReset):
         """
-        Reset the password for the user
-        :param reset_password_payload: Reset password payload with email and password
+        Reset the password of the user of a reset token.
+        Signature, expiry and purpose of the token are checked in memory; the password then only changes
+        if the stored hash of the token still matches and has not expired. The same transaction consumes
+        the token, so a reset link works once, and revokes every session and access token of the user,
+        so nothing is revoked for an invalid token.
+
+        :param reset_password_payload: Reset password payload with the reset token and the new password
         """
-        reset_password_payload.password = PasswordHashingUtil.hash_password(reset_password_payload.password)
-        self.sql_handler.update_user({
-            "password": reset_password_payload.password
-        }, filter_condition={"email": reset_password_payload.email})
+        claims = JWTUtil.decode_purpose_token(reset_password_payload.reset_token, purpose=RESET_PASSWORD_PURPOSE)
+        password = await PasswordHashingUtil.hash_password_async(reset_password_payload.password)
+        # Sessions opened with the old password end with it
+        now = datetime.datetime.now(datetime.timezone.utc)
+        expires_at = now + datetime.timedelta(minutes=JWTConfig.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+        if not await self.sql_handler.reset_password(user_id=claims["user_id"], password=password,
+                                                     token_hash=JWTUtil.token_hash(reset_password_payload.reset_token),
+                                                     revoked_before=now, expires_at=expires_at):
+            raise UserManagementException("Password Reset Expired. Please try again afresh")
+        revocation_list.add(claims["user_id"], expires_at, revoked_before=now)
         return {
             "status":"success",
             "message": "Password Reset is done successfully, Please login with new password"
         }
+    async def revoke_tokens(self, user_id, expires_at: datetime.datetime, jti: str = None,
+                            revoked_before: datetime.datetime = None):
+        """
+        Revoke access tokens in the database and in the revocation list of this process;
+        the other processes pick the revocation up with their next sync.
+
+        :param user_id: The id of the user owning the tokens.
+        :param expires_at: When every revoked token has expired.
+        :param jti: The id of the single token to revoke.
+        :param revoked_before: Revoke the tokens of the user issued up to this time.
+        """
+        await self.sql_handler.revoke_tokens(user_id=user_id, expires_at=expires_at, jti=jti,
+                                             revoked_before=revoked_before)
+        revocation_list.add(user_id, expires_at, jti=jti, revoked_before=revoked_before)
+
+    async def logout_user(self, response: Response, claims: dict):
+        """
+        Log out by revoking the access token of the request and its session, whose refresh token
+        then no longer works.
+
+        :param response: fastapi response, the token cookies are deleted.
+        :param claims: The claims of the access token.
+        :return: Confirmation message.
+        """
+        if "sid" in claims:
+            await self.sql_handler.revoke_sessions(session_id=claims["sid"])
+        await self.revoke_tokens(
+            user_id=claims["user_id"], jti=claims["jti"],
+            expires_at=datetime.datetime.fromtimestamp(claims["exp"], tz=datetime.timezone.utc),
+        )
+        response.delete_cookie(key="access_token", httponly=True, secure=True)
+        response.delete_cookie(key="refresh_token", httponly=True, secure=True, samesite="strict")
+        return {
+            "status": "success",
+            "message": "User logged out successfully.",
+        }
+
     async def request_email_verify(self, email: str):
         """
         This function email the user to verify
 
         :param email: Email to verify
         """
-        user = await self.sql_handler.check_user_exists_by_mail(email)
+        user = await self.sql_handler.get_user_by_email(email)
         if not user:
             raise UserManagementException("User with this email does not exist.")
-        user = user[0]
-        reset_token = JWTUtil.request_reset_password_token(
-            {"user_id": str(user.id), "email": str(user.email)}
+        verification_token = JWTUtil.generate_email_verification_token(
+            {"user_id": str(user["id"]), "email": user["email"]}
+        )
+        await self.sql_handler.update_user_metadata(
+            {"email_verification_token": JWTUtil.token_hash(verification_token)},
+            filter_condition={"user_id": user["id"]}, commit=False,
         )
-        verify_handler = verify_email.VerifyEmailHandler()
-        asyncio.create_task(verify_handler(
-            to_email=user.email,
-            verification_token=reset_token,
-            user_name=f"{user.first_name} {user.last_name}"
-        ))
+        await self.sql_handler.enqueue_email(
+            template="verify_email",
+            to_email=user["email"],
+            payload={
+                "verification_token": verification_token,
+                "user_name": f"{user['first_name']} {user['last_name']}",
+            },
+        )
+        self.notify_email_dispatcher()
         return {
             "status": "success",
             "message": "An email has been sent to verify your. Please follow the instructions mentioned"
@@ -153,51 +335,171 @@ class UserHandler:
     async def verify_email(self, verification_token: str):
         """
         Verify the email using the verification token.
+        Signature, expiry and purpose of the token are checked first, without touching the database;
+        the update then matches the user by the id of the claims and the stored token hash, so a token
+        is consumed at most once.
 
         :param verification_token: Token to verify the email.
         :return: Confirmation message.
         """
-        user_metadata = await self.sql_handler.get_user_metadata_by_verification_token(verification_token=verification_token)
-        if not user_metadata:
-            raise UserManagementException("Email Verification Expired. Please try again afresh")
-        self.sql_handler.update_user_metadata(
+        claims = JWTUtil.decode_purpose_token(verification_token, purpose=VERIFY_EMAIL_PURPOSE)
+        updated = await self.sql_handler.update_user_metadata(
             {"email_verified": True, "email_verification_token": None},
-            filter_condition={"user_id": user_metadata.user_id}
+            filter_condition={"user_id": claims["user_id"],
+                              "email_verification_token": JWTUtil.token_hash(verification_token)},
         )
+        if not updated:
+            raise UserManagementException("Email Verification Expired. Please try again afresh")
         return {
             "status": "success",
             "message": "Email verified successfully."
         }
 
     async def get_user(self, email:str):
-        user = await self.sql_handler.check_user_exists_by_mail(email=email)
+        user = await self.sql_handler.get_user_by_email(email=email)
         if not user:
             raise UserManagementException("User with this email does not exist.")
-        user = user[0]
         return user
 
-    async def get_user_by_id(self, user_id: str):
-        user = await self.sql_handler.get_user_by_id(user_id=user_id)
+    async def list_users(self, filters: UserListQuery):
+        """
+        List users page by page with keyset pagination.
+        One extra row is fetched to tell whether another page follows.
+
+        :param filters: Filters, search term, page size and cursor.
+        :return: The page of users and the cursor of the next page, None on the last page.
+        """
+        after = CursorUtil.decode(filters.cursor) if filters.cursor else None
+        users = await self.sql_handler.list_users(filters=filters, after=after, limit=filters.limit + 1)
+        next_cursor = None
+        if len(users) > filters.limit:
+            users = users[:filters.limit]
+            next_cursor = CursorUtil.encode(users[-1]["created_at"], users[-1]["id"])
+        return {
+            "status": "success",
+            "message": "Users fetched successfully",
+            "data": users,
+            "next_cursor": next_cursor,
+        }
+
+    async def get_users_batch(self, batch: UserBatchRequest):
+        """
+        Look up many users by ids or by emails, in one query for all the users not in the user cache.
+        Every key gets a result, in the order of the request; unknown keys are reported as not found.
+
+        :param batch: The ids or the emails.
+        :return: The result of every key and the keys not found.
+        """
+        if batch.ids is not None:
+            keys, users = batch.ids, await self.user_loader.load_many(batch.ids)
+        else:
+            keys, users = batch.emails, await self.email_loader.load_many(batch.emails)
+        data = [{"key": str(key), "found": user is not None, "user": user} for key, user in zip(keys, users)]
+        return {
+            "status": "success",
+            "message": "Users fetched successfully",
+            "data": data,
+            "missing": [item["key"] for item in data if not item["found"]],
+        }
+
+    @staticmethod
+    def _set_validators(response: Response, version: dict):
+        response.headers["ETag"] = ETagUtil.etag(version)
+        response.headers["Last-Modified"] = ETagUtil.http_date(ETagUtil.last_modified(version))
+
+    async def get_user_by_id(self, user_id, response: Response = None, if_none_match: str = None,
+                             if_modified_since: str = None):
+        """
+        Get a user with its metadata, answering conditional requests.
+        A conditional request is checked against the user's version alone (from the user cache or an
+        updated_at only query) and answered with 304 Not Modified without loading the profile.
+
+        :param user_id: The id of the user.
+        :param response: fastapi response, receives the ETag and Last-Modified headers.
+        :param if_none_match: The If-None-Match header.
+        :param if_modified_since: The If-Modified-Since header, ignored when If-None-Match is sent.
+        :return: The user, or a 304 response.
+        """
+        if if_none_match or if_modified_since:
+            version = await self.sql_handler.get_user_version(user_id=user_id)
+            if not version:
+                raise NotFoundException("User does not exist.")
+            etag = ETagUtil.etag(version)
+            if if_none_match:
+                not_modified = ETagUtil.matches(if_none_match, etag, weak=True)
+            else:
+                not_modified = not ETagUtil.modified_since(if_modified_since, ETagUtil.last_modified(version))
+            if not_modified:
+                not_modified_response = Response(status_code=304)
+                self._set_validators(not_modified_response, version)
+                return not_modified_response
+        user = await self.user_loader.load(uuid.UUID(str(user_id)))
+        if not user:
+            raise NotFoundException("User does not exist.")
+        if response is not None:
+            self._set_validators(response, {
+                "id": user["id"], "updated_at": user["updated_at"],
+                "metadata_updated_at": (user["user_metadata"] or {}).get("updated_at"),
+            })
         return {
             "status": "success",
             "message":"User data fetched successfully",
             "data":user
         }
 
-    async def update_user_data_by_id(self, user_data: UpdateUserData):
-        user_info = await self.get_user_by_id(user_id=user_data.user_id)
-        if not user_info.get("data"):
-            raise UserManagementException("User with this email does not exist.")
-        self.sql_handler.update_user(user_data=user_data.model_dump(exclude={"user_id", "user_metadata"}),
-                                     filter_condition={"id":user_data.user_id})
-        self.sql_handler.update_user_metadata(
-            user_metadata=user_data.user_metadata.model_dump(),
-            filter_condition={"user_id":user_data.user_id}
+    @staticmethod
+    async def authorize_update(user_data: UpdateUserData, claims: dict):
+        """
+        Check that the authenticated user may apply the update: a role granting users:write may update
+        every field of every user, everyone else only the profile fields of their own user.
+
+        :param user_data: The fields to update, with the user_id of the path.
+        :param claims: The claims of the access token of the request.
+        """
+        if "users:write" in await permission_engine.resolve(claims.get("role")):
+            return
+        if str(user_data.user_id) != str(claims["user_id"]):
+            raise ForbiddenException("Missing permission: users:write.")
+        privileged = [field for field in PRIVILEGED_USER_FIELDS if field in user_data.model_fields_set]
+        privileged += [field for field in PRIVILEGED_METADATA_FIELDS
+                       if field in user_data.user_metadata.model_fields_set]
+        if privileged:
+            raise ForbiddenException(f"Missing permission: users:write, to change {', '.join(privileged)}.")
+
+    async def update_user_data_by_id(self, user_data: UpdateUserData, response: Response = None,
+                                     if_match: str = None, claims: dict = None):
+        """
+        Update the fields sent of a user and its metadata.
+        With If-Match the update only applies while the user is still at the version of that ETag
+        (optimistic concurrency), otherwise it fails with 412 Precondition Failed.
+
+        :param user_data: The fields to update.
+        :param response: fastapi response, receives the ETag and Last-Modified headers of the new version.
+        :param if_match: The If-Match header.
+        :param claims: The claims of the access token of the request, checked with authorize_update.
+        :return: Confirmation message.
+        """
+        if claims is not None:
+            await self.authorize_update(user_data=user_data, claims=claims)
+        version = await self.sql_handler.get_user_version(user_id=user_data.user_id, use_cache=False)
+        if not version:
+            raise NotFoundException("User does not exist.")
+        if if_match and not ETagUtil.matches(if_match, ETagUtil.etag(version), weak=False):
+            raise PreconditionFailedException("User was modified since it was read.")
+        version = await self.sql_handler.update_user_profile(
+            user_id=version["id"],
+            user_data=user_data.model_dump(exclude_unset=True, exclude={"user_id", "user_metadata"}),
+            user_metadata=user_data.user_metadata.model_dump(exclude_unset=True),
+            expected_version=version if if_match else None,
         )
+        if "role" in user_data.model_fields_set:
+            # Access tokens carry the role; the user continues with the new one after a refresh
+            now = datetime.datetime.now(datetime.timezone.utc)
+            await self.revoke_tokens(user_id=version["id"], revoked_before=now,
+                                     expires_at=now + datetime.timedelta(minutes=JWTConfig.JWT_ACCESS_TOKEN_EXPIRE_MINUTES))
+        if response is not None:
+            self._set_validators(response, version)
         return {
             "status":"success",
             "message":"User info updated successfully"
         }
-
-
-
@@ -0,0 +1,133 @@
+"""
+Streaming export of users and their metadata.
+
+Usage:
+    python -m scripts.core.handler.user_export --format csv --gzip --output users.csv.gz
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import io
+import sys
+import zlib
+from contextlib import aclosing
+from typing import AsyncIterator
+
+import orjson
+
+from scripts.config import ModuleConfig
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.queries import SQLQueries, USER_EXPORT_COLUMNS
+from scripts.db.pg.sessions import get_db
+from scripts.exceptions import UserManagementException
+from scripts.utils.responses import orjson_default
+
+
+class UserExportHandler:
+    """
+    Streams every user with its metadata as NDJSON or CSV.
+
+    Users are read in keyset pages of USER_EXPORT_PAGE_SIZE ordered by (created_at, id), each page
+    through a server side cursor, and encoded into chunks of USER_EXPORT_CHUNK_ROWS rows.
+    Only one page cursor and one output chunk are held in memory, so memory use does not grow
+    with the number of users. The export opens its own session because the response body is
+    produced after the request handler returned.
+    """
+
+    media_types = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+    }
+
+    def __init__(self, file_format: str = "ndjson", gzip: bool = False):
+        if file_format not in self.media_types:
+            raise UserManagementException("Unsupported export format. Use csv or ndjson.")
+        self.file_format = file_format
+        self.gzip = gzip
+
+    @property
+    def media_type(self) -> str:
+        return "application/gzip" if self.gzip else self.media_types[self.file_format]
+
+    @property
+    def filename(self) -> str:
+        return f"users.{self.file_format}" + (".gz" if self.gzip else "")
+
+    @staticmethod
+    async def iter_rows(page_size: int = ModuleConfig.USER_EXPORT_PAGE_SIZE) -> AsyncIterator[dict]:
+        """
+        Yield the export rows page by page.
+
+        :param page_size: Number of users per keyset page.
+        """
+        after = None
+        async with aclosing(get_db()) as sessions:
+            async for session in sessions:
+                sql_ops = SQLOps(session)
+                count = page_size
+                while count == page_size:
+                    count = 0
+                    query = SQLQueries.export_users(after=after, limit=page_size)
+                    async for row in sql_ops.stream_query(query):
+                        count += 1
+                        after = (row["created_at"], row["id"])
+                        yield row
+
+    def _encode(self, rows: list[dict], header: bool) -> bytes:
+        if self.file_format == "ndjson":
+            return b"".join(orjson.dumps(row, default=orjson_default, option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow([column.key for column in USER_EXPORT_COLUMNS])
+        for row in rows:
+            writer.writerow([
+                value.isoformat() if isinstance(value, datetime.datetime) else value
+                for value in row.values()
+            ])
+        return buffer.getvalue().encode()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        """
+        Yield the encoded, optionally gzip compressed, export.
+        """
+        compressor = zlib.compressobj(wbits=31) if self.gzip else None
+        rows, header = [], True
+        async for row in self.iter_rows():
+            rows.append(row)
+            if len(rows) >= ModuleConfig.USER_EXPORT_CHUNK_ROWS:
+                chunk = self._encode(rows, header)
+                rows, header = [], False
+                chunk = compressor.compress(chunk) if compressor else chunk
+                if chunk:
+                    yield chunk
+        chunk = self._encode(rows, header) if rows or header else b""
+        if compressor:
+            chunk = compressor.compress(chunk) + compressor.flush()
+        if chunk:
+            yield chunk
+
+
+async def export_to_file(file_format: str, gzip: bool, output: str | None):
+    handler = UserExportHandler(file_format=file_format, gzip=gzip)
+    target = open(output, "wb") if output else sys.stdout.buffer
+    try:
+        async for chunk in handler.stream():
+            target.write(chunk)
+    finally:
+        if output:
+            target.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export all users with their metadata.")
+    parser.add_argument("--format", choices=list(UserExportHandler.media_types), default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="Gzip compress the output.")
+    parser.add_argument("--output", help="Output file, defaults to stdout.")
+    args = parser.parse_args()
+    asyncio.run(export_to_file(file_format=args.format, gzip=args.gzip, output=args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+import asyncio
+import codecs
+import csv
+import json
+import time
+import uuid
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+
+from scripts.config import ModuleConfig, PasswordConfig
+from scripts.core.schemas.users import ImportUser
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.queries import SQLQueries
+from scripts.db.pg.sql_schemas import Users, UserMetadata
+from scripts.exceptions import UserManagementException
+from scripts.utils.password import PasswordHashingUtil
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Split a streamed UTF-8 body into lines without buffering more than one chunk and one line.
+    A line longer than USER_IMPORT_MAX_LINE_LENGTH ends the import, so a body without line breaks
+    can not grow the buffer without bound.
+
+    :param stream: The body chunks, e.g. Request.stream().
+    :return: An async iterator of lines without line endings.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if len(buffer) > ModuleConfig.USER_IMPORT_MAX_LINE_LENGTH:
+            raise UserManagementException(
+                f"Import line longer than {ModuleConfig.USER_IMPORT_MAX_LINE_LENGTH} characters."
+            )
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+class UserImportHandler:
+    """
+    Streams a CSV or NDJSON body of ImportUser rows into the database.
+
+    Rows are validated as they arrive and collected into batches of USER_IMPORT_BATCH_SIZE.
+    Passwords of a batch are hashed in parallel on the password hashing pool while the previous
+    batch is written, and each batch is written in one transaction with multi-row inserts.
+    Memory stays bounded by the batch size and USER_IMPORT_MAX_ERRORS. CSV fields must not
+    contain line breaks.
+    """
+
+    def __init__(self, session):
+        self.sql_ops = SQLOps(session)
+        self.errors = []
+        self.error_count = 0
+        self.received = 0
+        self.imported = 0
+        self.hash_seconds = 0.0
+        self.write_seconds = 0.0
+
+    def _add_error(self, row: int, email: str | None, errors):
+        self.error_count += 1
+        if len(self.errors) < ModuleConfig.USER_IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "email": email, "errors": errors})
+
+    async def _parse(self, lines: AsyncIterator[str], file_format: str) -> AsyncIterator[tuple[int, dict]]:
+        header = None
+        row = 0
+        async for line in lines:
+            if not line.strip():
+                continue
+            if file_format == "csv" and header is None:
+                header = [column.strip() for column in next(csv.reader([line]))]
+                continue
+            row += 1
+            self.received += 1
+            try:
+                if file_format == "csv":
+                    values = next(csv.reader([line]))
+                    if len(values) != len(header):
+                        raise ValueError(f"Expected {len(header)} columns, got {len(values)}")
+                    record = {key: value or None for key, value in zip(header, values)}
+                else:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError("Row must be a JSON object")
+            except (ValueError, csv.Error) as e:
+                self._add_error(row, None, [str(e)])
+                continue
+            yield row, record
+
+    async def _check_roles(self, batch: list[tuple[int, ImportUser]]) -> list[tuple[int, ImportUser]]:
+        """
+        Drop the rows whose role is not an existing role id, with one query per batch, so an unknown
+        role is reported per row instead of failing the foreign key of the whole batch.
+        """
+        roles = {user.role for _, user in batch if user.role is not None}
+        if not roles:
+            return batch
+        role_ids = {}
+        for role in roles:
+            try:
+                role_ids[role] = uuid.UUID(role)
+            except ValueError:
+                continue
+        known = {str(row.id) for row in await self.sql_ops.execute_query(
+            SQLQueries.get_existing_roles(list(role_ids.values())))} if role_ids else set()
+        checked = []
+        for row, user in batch:
+            if user.role is None:
+                checked.append((row, user))
+            elif user.role in role_ids and str(role_ids[user.role]) in known:
+                user.role = str(role_ids[user.role])
+                checked.append((row, user))
+            else:
+                self._add_error(row, user.email, ["Unknown role."])
+        return checked
+
+    async def _hash_batch(self, batch: list[tuple[int, ImportUser]]) -> list[tuple[int, ImportUser]]:
+        """
+        Hash the passwords of a batch, at most PASSWORD_HASH_WORKERS at a time so that the import
+        never crowds the pool queue shared with interactive logins.
+        """
+        start = time.perf_counter()
+        hashed = []
+        step = max(PasswordConfig.PASSWORD_HASH_WORKERS, 1)
+        for index in range(0, len(batch), step):
+            chunk = batch[index:index + step]
+            results = await asyncio.gather(
+                *(PasswordHashingUtil.hash_password_async(user.password) for _, user in chunk),
+                return_exceptions=True,
+            )
+            for (row, user), result in zip(chunk, results):
+                if isinstance(result, Exception):
+                    self._add_error(row, user.email, [str(result)])
+                    continue
+                user.password = result
+                hashed.append((row, user))
+        self.hash_seconds += time.perf_counter() - start
+        return hashed
+
+    async def _write_batch(self, batch: list[tuple[int, ImportUser]]):
+        """
+        Insert the users and their metadata of one batch in a single transaction.
+        Emails that already exist are skipped by the unique index and reported per row; any other
+        database error rolls the batch back and is reported for every row of it.
+        """
+        start = time.perf_counter()
+        # Checked here rather than before hashing, as the session is busy writing the previous batch then
+        batch = await self._check_roles(batch)
+        if not batch:
+            return
+        try:
+            report = await self.sql_ops.insert_many(
+                (user.model_dump(exclude={"phone_number", "address"}) for _, user in batch),
+                model=Users,
+                returning=["id", "email"],
+                on_conflict_do_nothing=True,
+                commit=False,
+            )
+            user_ids = {inserted["email"]: inserted["id"] for inserted in report.returned}
+            await self.sql_ops.insert_many(
+                (
+                    {"user_id": user_ids[user.email], "phone_number": user.phone_number, "address": user.address}
+                    for _, user in batch if user.email in user_ids
+                ),
+                model=UserMetadata,
+            )
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                raise
+            await self.sql_ops.rollback()
+            error = f"Batch rejected by the database: {str(e.orig).splitlines()[0]}"
+            for row, user in batch:
+                self._add_error(row, user.email, [error])
+            self.write_seconds += time.perf_counter() - start
+            return
+        for row, user in batch:
+            if user.email not in user_ids:
+                self._add_error(row, user.email, ["User with this email already exists."])
+        self.imported += len(user_ids)
+        self.write_seconds += time.perf_counter() - start
+
+    async def import_users(self, lines: AsyncIterator[str], file_format: str) -> dict:
+        """
+        Import users from CSV (with a header row) or NDJSON lines.
+
+        :param lines: The lines of the uploaded body.
+        :param file_format: Either csv or ndjson.
+        :return: The summary, throughput and per row errors of the import.
+        """
+        if file_format not in ("csv", "ndjson"):
+            raise UserManagementException("Unsupported import format. Use csv or ndjson.")
+        start = time.perf_counter()
+        batch, seen_emails = [], set()
+        pending_write = None
+
+        async def flush(rows):
+            nonlocal pending_write
+            hashed = await self._hash_batch(rows)
+            if pending_write is not None:
+                await pending_write
+            pending_write = asyncio.create_task(self._write_batch(hashed))
+
+        try:
+            async for row, record in self._parse(lines, file_format):
+                try:
+                    user = ImportUser(**record)
+                except ValidationError as e:
+                    self._add_error(row, record.get("email"), e.errors(include_url=False, include_input=False))
+                    continue
+                if user.email in seen_emails:
+                    self._add_error(row, user.email, ["Duplicate email in the import."])
+                    continue
+                seen_emails.add(user.email)
+                batch.append((row, user))
+                if len(batch) >= ModuleConfig.USER_IMPORT_BATCH_SIZE:
+                    await flush(batch)
+                    batch, seen_emails = [], set()
+            await flush(batch)
+            await pending_write
+        except BaseException:
+            if pending_write is not None:
+                pending_write.cancel()
+            raise
+        elapsed = time.perf_counter() - start
+        return {
+            "status": "success" if not self.error_count else "partial",
+            "message": f"Imported {self.imported} of {self.received} users",
+            "summary": {
+                "received": self.received,
+                "imported": self.imported,
+                "failed": self.error_count,
+                "seconds": round(elapsed, 3),
+                "rows_per_sec": round(self.imported / elapsed, 1) if elapsed else 0.0,
+                "hash_seconds": round(self.hash_seconds, 3),
+                "write_seconds": round(self.write_seconds, 3),
+            },
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+        }
@@ -1,6 +1,11 @@
 from fastapi import APIRouter
+from .metrics import metrics_router
+from .roles import permission_router, role_router
 from .users import user_router
 
 all_routers = APIRouter()
 
 all_routers.include_router(user_router)
+all_routers.include_router(role_router)
+all_routers.include_router(permission_router)
+all_routers.include_router(metrics_router)
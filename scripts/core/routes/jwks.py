@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Response
+
+from scripts.config import JWTConfig
+from scripts.utils.jwt import key_ring
+
+jwks_router = APIRouter(tags=["Keys"])
+
+@jwks_router.get("/.well-known/jwks.json", summary="JSON Web Key Set")
+async def get_jwks():
+    """
+    Endpoint publishing the public keys that verify the tokens of this service, by kid, so other
+    services verify tokens locally. The document is serialized once per process and cacheable by clients.
+    """
+    return Response(
+        content=key_ring.jwks_json,
+        media_type="application/json",
+        headers={"Cache-Control": f"public, max-age={JWTConfig.JWT_JWKS_MAX_AGE_SECONDS}"},
+    )
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+
+from scripts.utils.metrics import metrics_registry
+
+metrics_router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+@metrics_router.get("", summary="Process metrics")
+async def get_metrics():
+    """
+    Endpoint exposing the in-process metrics of this worker,
+    such as SQL pool checked out/idle/overflow counts and checkout wait times.
+    """
+    return metrics_registry.snapshot()
@@ -0,0 +1,69 @@
+import uuid
+
+from fastapi import APIRouter, Depends
+
+from scripts.core.handler.role import RoleHandler
+from scripts.core.schemas.roles import CreateRole, UpdateRole, RoleResponse, RoleListResponse, PermissionListResponse
+from scripts.core.schemas.users import MessageResponse
+from scripts.db.pg.sessions import get_db
+from scripts.utils.access_token_validator import access_token_validator, require_permission
+
+role_router = APIRouter(prefix="/roles", tags=["Roles"])
+permission_router = APIRouter(prefix="/permissions", tags=["Permissions"])
+
+@role_router.get("", summary="List roles", response_model=RoleListResponse,
+                 dependencies=[Depends(require_permission("roles:read"))])
+async def list_roles(session = Depends(get_db)):
+    """
+    Endpoint to list every role with its permissions.
+    """
+    return await RoleHandler(session=session).list_roles()
+
+@role_router.post("", summary="Create a role", response_model=RoleResponse,
+                  dependencies=[Depends(require_permission("roles:write"))])
+async def create_role(role_data: CreateRole, session = Depends(get_db)):
+    """
+    Endpoint to create a role.
+    permissions maps a resource to the actions granted on it, e.g. {"users": ["read", "export"]};
+    "*" grants every action, or every resource when used as the resource.
+    """
+    return await RoleHandler(session=session).create_role(role_data=role_data)
+
+@role_router.get("/{role_id}", summary="Get a role", response_model=RoleResponse,
+                 dependencies=[Depends(require_permission("roles:read"))])
+async def get_role(role_id: uuid.UUID, session = Depends(get_db)):
+    """
+    Endpoint to fetch a role with its permissions.
+    """
+    return await RoleHandler(session=session).get_role(role_id=role_id)
+
+@role_router.put("/{role_id}", summary="Update a role", response_model=RoleResponse,
+                 dependencies=[Depends(require_permission("roles:write"))])
+async def update_role(role_id: uuid.UUID, role_data: UpdateRole, session = Depends(get_db)):
+    """
+    Endpoint to update the fields sent of a role.
+    The new permissions apply at once in this process, and within PERMISSION_SYNC_SECONDS in the others.
+    """
+    return await RoleHandler(session=session).update_role(role_id=role_id, role_data=role_data)
+
+@role_router.delete("/{role_id}", summary="Delete a role", response_model=MessageResponse,
+                    dependencies=[Depends(require_permission("roles:delete"))])
+async def delete_role(role_id: uuid.UUID, session = Depends(get_db)):
+    """
+    Endpoint to delete a role; its users are left without a role.
+    """
+    return await RoleHandler(session=session).delete_role(role_id=role_id)
+
+@permission_router.get("", summary="List permissions", response_model=PermissionListResponse)
+async def list_permissions():
+    """
+    Endpoint to list every permission roles can grant, as resource:action.
+    """
+    return RoleHandler.list_permissions()
+
+@permission_router.get("/me", summary="Get the permissions of the current user", response_model=PermissionListResponse)
+async def get_my_permissions(claims: dict = Depends(access_token_validator)):
+    """
+    Endpoint to list the permissions granted by the role of the access token.
+    """
+    return await RoleHandler.list_granted_permissions(role_id=claims.get("role"))
@@ -1,12 +1,49 @@
-from fastapi import APIRouter, Depends, Response
+import uuid
+from typing import Annotated
 
-from scripts.core.schemas.users import RegisterUser, LoginUser, RequestEmailVerify, PasswordResetRequest, PasswordReset
+from fastapi import APIRouter, BackgroundTasks, Cookie, Depends, Header, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from scripts.core.schemas.users import (RegisterUser, LoginUser, RequestEmailVerify, PasswordResetRequest, PasswordReset,
+                                        UserListQuery, UpdateUserData, MessageResponse, UserResponse, UserListResponse,
+                                        LoginResponse, RefreshTokenRequest, UserBatchRequest, UserBatchResponse)
 from scripts.core.handler.user import UserHandler
+from scripts.core.handler.user_export import UserExportHandler
+from scripts.core.handler.user_import import UserImportHandler, iter_lines
 from scripts.db.pg.sessions import get_db
+from scripts.exceptions import UnauthorizedException
+from scripts.utils.access_token_validator import access_token_validator, require_permission
 
 user_router = APIRouter(prefix="/users", tags=["Users"], redirect_slashes=True)
 
-@user_router.post("/register", summary="Register a new user")
+@user_router.get("", summary="List and search users", response_model=UserListResponse,
+                 dependencies=[Depends(require_permission("users:read"))])
+async def list_users(filters: Annotated[UserListQuery, Query()], session = Depends(get_db)):
+    """
+    Endpoint to list users, newest first, with cursor pagination.
+    Pass the next_cursor of a response as cursor to fetch the following page.
+    Requires the users:read permission.
+
+    :param filters: Filters (is_active, role, email_verified, created_from, created_to),
+        search term with search_mode prefix or substring, limit and cursor.
+    :param session:
+    """
+    return await UserHandler(session=session).list_users(filters=filters)
+
+@user_router.post("/batch", summary="Look up many users", response_model=UserBatchResponse,
+                  dependencies=[Depends(require_permission("users:read"))])
+async def get_users_batch(batch: UserBatchRequest, session = Depends(get_db)):
+    """
+    Endpoint to fetch up to USER_BATCH_MAX_KEYS users by ids or by emails in one call, instead of one
+    call per user. The results come in the order of the request, with found false for unknown keys.
+    Requires the users:read permission.
+
+    :param batch: {"ids": [...]} or {"emails": [...]}
+    :param session:
+    """
+    return await UserHandler(session=session).get_users_batch(batch=batch)
+
+@user_router.post("/register", summary="Register a new user", response_model=MessageResponse)
 async def register_user(register_data: RegisterUser, session = Depends(get_db)):
     """
     Endpoint to register a new user.
@@ -14,15 +51,67 @@ async def register_user(register_data: RegisterUser, session = Depends(get_db)):
     """
     return await UserHandler(session=session).register_user(register_data=register_data)
 
-@user_router.post("/login", summary="User login")
-async def login_user(login_data:LoginUser,  response: Response, session = Depends(get_db)):
+@user_router.post("/import", summary="Bulk import users",
+                  dependencies=[Depends(require_permission("users:import"))])
+async def import_users(request: Request, file_format: str | None = None, session = Depends(get_db)):
+    """
+    Endpoint to bulk import users from a streamed CSV (with header row) or NDJSON request body.
+    Every row is validated like a registration and may assign an existing role id; the response
+    carries a per row error report and throughput statistics. Requires the users:import permission.
+
+    :param request: The request whose body is streamed.
+    :param file_format: csv or ndjson, derived from the Content-Type header when omitted.
+    :param session:
+    """
+    if not file_format:
+        content_type = request.headers.get("content-type", "")
+        file_format = "csv" if "csv" in content_type else "ndjson"
+    return await UserImportHandler(session=session).import_users(
+        lines=iter_lines(request.stream()), file_format=file_format.lower()
+    )
+
+@user_router.get("/export", summary="Export users",
+                 dependencies=[Depends(require_permission("users:export"))])
+async def export_users(file_format: str = "ndjson", gzip: bool = False):
+    """
+    Endpoint to stream every user with its metadata as NDJSON or CSV, optionally gzip compressed.
+    Users are read with keyset pagination and server side cursors, so memory use stays flat
+    regardless of the number of users. Requires the users:export permission.
+
+    :param file_format: ndjson or csv
+    :param gzip: Compress the export with gzip
+    """
+    handler = UserExportHandler(file_format=file_format.lower(), gzip=gzip)
+    return StreamingResponse(
+        handler.stream(),
+        media_type=handler.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{handler.filename}"'},
+    )
+
+@user_router.post("/login", summary="User login", response_model=LoginResponse)
+async def login_user(login_data:LoginUser,  response: Response, background_tasks: BackgroundTasks,
+                     session = Depends(get_db)):
     """
     Endpoint for user login.
     This endpoint will handle user authentication and return a token.
     """
-    return await UserHandler(session=session).login_user(response=response, login_data=login_data)
+    return await UserHandler(session=session).login_user(response=response, login_data=login_data,
+                                                         background_tasks=background_tasks)
 
-@user_router.post("/request-email-verify/{email}", summary="Request Email verify")
+@user_router.post("/refresh", summary="Refresh the access token", response_model=MessageResponse)
+async def refresh_session(response: Response, payload: RefreshTokenRequest | None = None,
+                          refresh_token: str | None = Cookie(None), session = Depends(get_db)):
+    """
+    Endpoint to get a new access token with the refresh token of the session, from the refresh_token
+    cookie or the request body. The refresh token is rotated: the response carries the new one and the
+    token sent can not be used again.
+    """
+    token = payload.refresh_token if payload is not None else refresh_token
+    if not token:
+        raise UnauthorizedException("Not authenticated.")
+    return await UserHandler(session=session).refresh_session(response=response, refresh_token=token)
+
+@user_router.post("/request-email-verify/{email}", summary="Request Email verify", response_model=MessageResponse)
 async def request_email_verify(email_payload:RequestEmailVerify, session = Depends(get_db)):
     """
     Endpoint for Sending an email to verify the user
@@ -32,7 +121,8 @@ async def request_email_verify(email_payload:RequestEmailVerify, session = Depen
     """
     return await UserHandler(session=session).request_email_verify(email=email_payload.email)
 
-@user_router.put("/verify-email/{verification_token}", summary="Verify user email")
+@user_router.put("/verify-email/{verification_token}", summary="Verify user email",
+                 response_model=MessageResponse)
 async def verify_email(verification_token: str, session = Depends(get_db)):
     """
     Endpoint to verify user email using a verification token.
@@ -45,7 +135,7 @@ async def verify_email(verification_token: str, session = Depends(get_db)):
     """
     return await UserHandler(session=session).verify_email(verification_token=verification_token)
 
-@user_router.post("/request-password-reset", summary="Request password reset")
+@user_router.post("/request-password-reset", summary="Request password reset", response_model=MessageResponse)
 async def request_password_reset(reset_password_payload:PasswordResetRequest, session = Depends(get_db)):
     """
     Endpoint to request a password reset.
@@ -55,19 +145,85 @@ async def request_password_reset(reset_password_payload:PasswordResetRequest, se
     """
     return await UserHandler(session=session).request_reset_password(reset_data=reset_password_payload.model_dump())
 
-@user_router.post("/verify-password-reset/{reset_token}", summary="Request password reset")
+@user_router.post("/verify-password-reset/{reset_token}", summary="Request password reset",
+                  response_model=MessageResponse)
 async def request_password_reset(reset_token:str, session = Depends(get_db)):
     """
-    Endpoint to request a password reset.
-    This endpoint will handle sending a password reset link to the user's email.
+    Endpoint to check whether a reset token is still usable, before the reset form is shown.
+    It does not consume the token; PUT /reset-password checks it again.
     """
     return await UserHandler(session=session).verify_reset_password(reset_token=reset_token)
 
-@user_router.put("/reset-password", summary="Reset user password")
+@user_router.put("/reset-password", summary="Reset user password", response_model=MessageResponse)
 async def reset_password(reset_password_payload:PasswordReset,   session = Depends(get_db)):
     """
-    Endpoint to reset user password.
-    This endpoint will handle the logic for resetting the user's password.
+    Endpoint to reset user password with the reset token of the emailed link.
+    The token works once; every session and access token of the user is revoked.
     """
     return await UserHandler(session=session).reset_password(reset_password_payload=reset_password_payload)
 
+@user_router.post("/logout", summary="User logout", response_model=MessageResponse)
+async def logout_user(response: Response, claims: dict = Depends(access_token_validator), session = Depends(get_db)):
+    """
+    Endpoint to log out, revoking the access token of the request.
+    """
+    return await UserHandler(session=session).logout_user(response=response, claims=claims)
+
+@user_router.get("/me", summary="Get the current user", response_model=UserResponse,
+                 responses={304: {"description": "Not modified"}})
+async def get_current_user(response: Response, claims: dict = Depends(access_token_validator),
+                           if_none_match: str | None = Header(None), if_modified_since: str | None = Header(None),
+                           session = Depends(get_db)):
+    """
+    Endpoint to fetch the user authenticated by the access token, with conditional request support
+    like the user endpoint.
+    """
+    return await UserHandler(session=session).get_user_by_id(user_id=claims["user_id"], response=response,
+                                                             if_none_match=if_none_match,
+                                                             if_modified_since=if_modified_since)
+
+@user_router.get("/{user_id}", summary="Get a user", response_model=UserResponse,
+                 responses={304: {"description": "Not modified"}},
+                 dependencies=[Depends(require_permission("users:read"))])
+async def get_user(user_id: uuid.UUID, response: Response, if_none_match: str | None = Header(None),
+                   if_modified_since: str | None = Header(None), session = Depends(get_db)):
+    """
+    Endpoint to fetch a user with its metadata.
+    Responses carry an ETag and Last-Modified; send them back as If-None-Match or If-Modified-Since
+    to get 304 Not Modified while the user is unchanged. Requires the users:read permission; the
+    authenticated user reads their own with /me.
+    Declared after the static paths of this router so that it never shadows them.
+
+    :param user_id: The id of the user.
+    :param response:
+    :param if_none_match: ETags of the cached copies of the client.
+    :param if_modified_since: Last-Modified of the cached copy of the client.
+    :param session:
+    """
+    return await UserHandler(session=session).get_user_by_id(user_id=user_id, response=response,
+                                                             if_none_match=if_none_match,
+                                                             if_modified_since=if_modified_since)
+
+@user_router.put("/{user_id}", summary="Update a user", response_model=MessageResponse,
+                 responses={403: {"description": "The update requires the users:write permission"},
+                            412: {"description": "The user was modified since the If-Match ETag was read"}})
+async def update_user(user_id: uuid.UUID, user_data: UpdateUserData, response: Response,
+                      if_match: str | None = Header(None), claims: dict = Depends(access_token_validator),
+                      session = Depends(get_db)):
+    """
+    Endpoint to update the fields sent of a user and its metadata.
+    Send the ETag the update is based on as If-Match to reject it with 412 when another request
+    modified the user in the meantime; the response carries the ETag of the new version.
+    Users update their own profile; role, is_active, locked_until and other users require the
+    users:write permission.
+
+    :param user_id: The id of the user.
+    :param user_data: The fields to update.
+    :param response:
+    :param if_match: The ETag of the version the update is based on.
+    :param claims: The claims of the access token.
+    :param session:
+    """
+    user_data.user_id = str(user_id)
+    return await UserHandler(session=session).update_user_data_by_id(user_data=user_data, response=response,
+                                                                     if_match=if_match, claims=claims)
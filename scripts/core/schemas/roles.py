@@ -0,0 +1,55 @@
+import datetime
+import uuid
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from scripts.core.schemas.users import MessageResponse
+
+# resource -> actions granted, "*" (or true) for every action; "*" as resource for every resource
+Permissions = dict[str, list[str] | Literal["*"] | bool]
+
+
+class CreateRole(BaseModel):
+    """
+    Schema for creating a role.
+    """
+    name: str = Field(min_length=1, max_length=100)
+    description: str | None = None
+    is_active: bool = True
+    permissions: Permissions = {}
+
+
+class UpdateRole(BaseModel):
+    """
+    Schema for updating a role; only the fields that are sent are updated.
+    """
+    name: str | None = Field(default=None, min_length=1, max_length=100)
+    description: str | None = None
+    is_active: bool | None = None
+    permissions: Permissions | None = None
+
+
+class RoleOut(BaseModel):
+    """
+    A role as returned by the API.
+    """
+    id: uuid.UUID
+    name: str
+    description: str | None = None
+    is_active: bool
+    permissions: dict | None = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+
+
+class RoleResponse(MessageResponse):
+    data: RoleOut
+
+
+class RoleListResponse(MessageResponse):
+    data: list[RoleOut]
+
+
+class PermissionListResponse(MessageResponse):
+    data: list[str]
@@ -1,7 +1,10 @@
 import datetime
-from typing import Optional
+import uuid
+from typing import Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+
+from scripts.config import ModuleConfig
 
 class RegisterUser(BaseModel):
     """
@@ -12,11 +15,18 @@ class RegisterUser(BaseModel):
     first_name: str
     last_name: str
     password: str
-    role: str | None = None
     phone_number: str | None = None
     address: str | None = None
 
 
+class ImportUser(RegisterUser):
+    """
+    Schema for a row of a bulk user import.
+    Imports require the users:import permission, so unlike a registration a row may assign a role.
+    """
+    role: str | None = None
+
+
 class LoginUser(BaseModel):
     """
     Schema for user login.
@@ -39,6 +49,13 @@ class UpdateUser(BaseModel):
     role: str | None = None
 
 
+class RefreshTokenRequest(BaseModel):
+    """
+    Schema for renewing the access token of clients that do not keep the refresh token cookie.
+    """
+    refresh_token: str
+
+
 class PasswordResetRequest(BaseModel):
     """
     Schema for requesting a password reset.
@@ -49,10 +66,11 @@ class PasswordResetRequest(BaseModel):
 class PasswordReset(BaseModel):
     """
     Schema for resetting a user's password.
-    This schema is used to validate the data when a user resets their password.
+    This schema is used to validate the data when a user resets their password with the token of the
+    reset link.
     """
+    reset_token: str
     password: str
-    email: str
 
 class UpdateUserMetaData(BaseModel):
     """
@@ -66,14 +84,15 @@ class UpdateUserMetaData(BaseModel):
 
 class UpdateUserData(BaseModel):
     """
-    Schema for updating the user data
+    Schema for updating the user data.
+    Only the fields that are sent are updated; user_id is taken from the path when omitted.
     """
-    user_id: str
+    user_id: Optional[str] = None
     first_name: Optional[str] = None
     last_name: Optional[str] = None
     is_active: Optional[bool] = None
     role: Optional[str] = None
-    user_metadata: UpdateUserMetaData
+    user_metadata: UpdateUserMetaData = UpdateUserMetaData()
 
 class RequestEmailVerify(BaseModel):
     """
@@ -83,4 +102,113 @@ class RequestEmailVerify(BaseModel):
     email: str
 
 
+class UserListQuery(BaseModel):
+    """
+    Query parameters for listing and searching users.
+    Pages are addressed by the opaque next_cursor of the previous page, never by offset.
+    """
+    limit: int = Field(default=ModuleConfig.USER_LIST_DEFAULT_LIMIT, ge=1, le=ModuleConfig.USER_LIST_MAX_LIMIT)
+    cursor: str | None = None
+    is_active: bool | None = None
+    role: uuid.UUID | None = None
+    email_verified: bool | None = None
+    created_from: datetime.datetime | None = None
+    created_to: datetime.datetime | None = None
+    search: str | None = Field(default=None, min_length=1, max_length=100)
+    search_mode: Literal["prefix", "substring"] = "prefix"
+
+
+class UserBatchRequest(BaseModel):
+    """
+    Schema for looking up many users at once, by ids or by emails.
+    """
+    ids: list[uuid.UUID] | None = Field(default=None, min_length=1, max_length=ModuleConfig.USER_BATCH_MAX_KEYS)
+    emails: list[str] | None = Field(default=None, min_length=1, max_length=ModuleConfig.USER_BATCH_MAX_KEYS)
+
+    @model_validator(mode="after")
+    def one_key_kind(self):
+        if (self.ids is None) == (self.emails is None):
+            raise ValueError("Send either ids or emails")
+        return self
+
+
+class MessageResponse(BaseModel):
+    """
+    Response carrying only a status and a message.
+    """
+    status: str
+    message: str
+
+
+class UserMetadataOut(BaseModel):
+    """
+    Public part of the user metadata.
+    """
+    email_verified: bool
+    phone_number: str | None = None
+    address: str | None = None
+    locked_until: datetime.datetime | None = None
+    profile_picture: str | None = None
+    updated_at: datetime.datetime | None = None
+
+
+class UserOut(BaseModel):
+    """
+    A user as returned by the API, without password or tokens.
+    """
+    id: uuid.UUID
+    email: str
+    first_name: str
+    last_name: str
+    is_active: bool
+    role: uuid.UUID | None = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    user_metadata: UserMetadataOut | None = None
+
+
+class UserSummary(BaseModel):
+    """
+    A row of the user listing, user and metadata columns flattened.
+    """
+    id: uuid.UUID
+    email: str
+    first_name: str
+    last_name: str
+    is_active: bool
+    role: uuid.UUID | None = None
+    created_at: datetime.datetime
+    updated_at: datetime.datetime
+    email_verified: bool | None = None
+    phone_number: str | None = None
+    address: str | None = None
+    locked_until: datetime.datetime | None = None
+    profile_picture: str | None = None
+
+
+class UserResponse(MessageResponse):
+    data: UserOut
+
+
+class UserListResponse(MessageResponse):
+    data: list[UserSummary]
+    next_cursor: str | None = None
+
+
+class UserBatchItem(BaseModel):
+    """
+    The result of one key of a batch lookup; user is null when no user has that id or email.
+    """
+    key: str
+    found: bool
+    user: UserOut | None = None
+
+
+class UserBatchResponse(MessageResponse):
+    data: list[UserBatchItem]
+    missing: list[str]
+
+
+class LoginResponse(MessageResponse):
+    user_id: uuid.UUID
 
@@ -1,9 +1,9 @@
 from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
 from abc import abstractmethod
 
-from jinja2 import Environment, BaseLoader
-
 from scripts.core.services.email.email import EmailUtil
+from scripts.core.services.email.templates import email_templates
 
 class EmailHandler:
     """
@@ -20,7 +20,7 @@ class EmailHandler:
 
         :param mime_message: The MIME message to be sent.
         """
-        self.email_util.send_email(mime_message)
+        await self.email_util.send_email_async(mime_message)
 
     @abstractmethod
     async def create_mime_message(self, *args, **kwargs)-> MIMEMultipart:
@@ -31,22 +31,21 @@ class EmailHandler:
         raise NotImplemented("create_mime_message method must be implemented in subclasses")
 
     @staticmethod
-    async def fetch_html_content(html_path:str="template.html"):
-        """
-        This func is used to load the HTML Content
-        :param html_path:
-        :return:
+    def render_message(template_name: str, payload: dict, locale: str | None = None) -> MIMEMultipart:
         """
-        with open(html_path, "r") as html_file:
-            html_content = html_file.read()
-        return html_content
+        Render the cached template into a multipart/alternative message with a plain text and an html part.
 
-    @staticmethod
-    async def replace_html_content(html_content, replace_payload):
-        env = Environment(loader=BaseLoader())
-        template = env.from_string(html_content)
-        rendered_html = template.render(replace_payload)
-        return rendered_html
+        :param template_name: The name of the template, i.e. the directory of the email handler.
+        :param payload: The template variables.
+        :param locale: Optional locale of the template.
+        :return: The MIME message without any headers set.
+        """
+        html_content, text_content = email_templates.render(template_name, payload, locale=locale)
+        message = MIMEMultipart("alternative")
+        if text_content is not None:
+            message.attach(MIMEText(text_content, "plain"))
+        message.attach(MIMEText(html_content, "html"))
+        return message
 
     async def __call__(self, *args, **kwargs):
         """
@@ -0,0 +1,216 @@
+"""
+Background delivery of the email outbox.
+
+Request handlers only insert into the email_outbox table, in the same transaction as the token
+they send. The dispatcher claims due rows in batches under a lease, renders them, delivers a batch
+over one pooled SMTP session and retries failures with exponential backoff.
+
+Run it inside the API process with EMAIL_DISPATCHER_ENABLED, on a schedule through the Lambda
+handler, or standalone:
+    python -m scripts.core.services.email.dispatcher [--once]
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+
+from sqlalchemy.exc import IntegrityError
+
+from scripts.config import EmailConfig
+from scripts.core.services.email.email import EmailUtil
+from scripts.core.services.email.reset_password import ResetPassword
+from scripts.core.services.email.verify_email import VerifyEmailHandler
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.queries import SQLQueries
+from scripts.db.pg.sessions import get_db
+from scripts.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class EmailOutboxDispatcher:
+    """
+    Drains the email outbox in batches.
+    """
+    templates = {
+        "reset_password": ResetPassword,
+        "verify_email": VerifyEmailHandler,
+    }
+
+    def __init__(self):
+        self.email_util = EmailUtil()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        metrics_registry.register_gauge("email_outbox", self.status)
+
+    @staticmethod
+    def backoff(attempts: int) -> datetime.timedelta:
+        """
+        Delay before the next delivery attempt.
+
+        :param attempts: The number of failed attempts so far.
+        :return: The exponential backoff, capped at EMAIL_OUTBOX_MAX_BACKOFF_SECONDS.
+        """
+        seconds = EmailConfig.EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0)
+        return datetime.timedelta(seconds=min(seconds, EmailConfig.EMAIL_OUTBOX_MAX_BACKOFF_SECONDS))
+
+    def _record_failure(self, email, error: Exception, now: datetime.datetime) -> bool:
+        """
+        Count a failed delivery attempt of a claimed email.
+
+        :return: True if the email is to be retried, False if it failed for good.
+        """
+        email.attempts += 1
+        email.last_error = str(error)[:1000]
+        if email.attempts >= EmailConfig.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            email.status = "failed"
+            # The payload carries the raw token of the link, nothing needs it anymore
+            email.payload = {}
+            self.failed += 1
+            logger.error("Giving up on %s email %s after %s attempts: %s",
+                         email.template, email.id, email.attempts, error)
+            return False
+        email.next_attempt_at = now + self.backoff(email.attempts)
+        self.retried += 1
+        return True
+
+    async def _release(self, sql_ops: SQLOps, retries: list):
+        """
+        Put the emails to retry back to pending. An email whose recipient got a newer email of the
+        same template, pending or in the same batch, is superseded instead, as only one of them may
+        be pending and the newer one carries the latest link.
+        """
+        pending = {row.dedup_key for row in await sql_ops.execute_query(
+            SQLQueries.get_pending_dedup_keys(sorted({email.dedup_key for email in retries})))}
+        for email in sorted(retries, key=lambda each: each.created_at, reverse=True):
+            if email.dedup_key in pending:
+                email.status = "superseded"
+                email.payload = {}
+            else:
+                email.status = "pending"
+                pending.add(email.dedup_key)
+        try:
+            await sql_ops.commit()
+        except IntegrityError as e:
+            # A newer email was enqueued since the check; the lease expires and the claim is retried
+            await sql_ops.rollback()
+            logger.warning("Releasing %s outbox emails for retry failed: %s", len(retries), e)
+
+    async def drain_batch(self, session) -> int:
+        """
+        Claim, render and deliver one batch of due emails.
+
+        The claim is committed before delivery, so no row stays locked during the SMTP round trips
+        and enqueue_email never waits for them. Outcomes are committed right after: delivered and
+        failed emails first, then the retries.
+
+        :param session: The database session to claim the batch with.
+        :return: The number of claimed emails.
+        """
+        sql_ops = SQLOps(session)
+        lease_until = (datetime.datetime.now(datetime.timezone.utc)
+                       + datetime.timedelta(seconds=EmailConfig.EMAIL_OUTBOX_LEASE_SECONDS))
+        rows = await sql_ops.execute_query(SQLQueries.claim_emails(EmailConfig.EMAIL_OUTBOX_BATCH_SIZE, lease_until))
+        await sql_ops.commit()
+        if not rows:
+            return 0
+        now = datetime.datetime.now(datetime.timezone.utc)
+        outbox, messages, retries = [], [], []
+        for (email,) in rows:
+            try:
+                handler = self.templates[email.template]()
+                messages.append(await handler.create_mime_message(to_email=email.to_email, **email.payload))
+                outbox.append(email)
+            except Exception as e:
+                if self._record_failure(email, e, now):
+                    retries.append(email)
+        if messages:
+            errors = await self.email_util.send_emails_async(messages)
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for email, error in zip(outbox, errors):
+                if error is None:
+                    email.status = "sent"
+                    email.sent_at = now
+                    email.payload = {}
+                    self.sent += 1
+                elif self._record_failure(email, error, now):
+                    retries.append(email)
+        # Retries are still sending here, so this commit can not conflict with a newer pending email
+        await sql_ops.commit()
+        if retries:
+            await self._release(sql_ops, retries)
+        return len(rows)
+
+    async def drain(self) -> int:
+        """
+        Deliver due emails until the outbox has no full batch left.
+
+        :return: The number of processed emails.
+        """
+        processed = 0
+        while True:
+            async for session in get_db():
+                claimed = await self.drain_batch(session)
+            processed += claimed
+            if claimed < EmailConfig.EMAIL_OUTBOX_BATCH_SIZE:
+                return processed
+
+    def notify(self):
+        """
+        Wake up the background loop, e.g. right after an email was enqueued.
+        """
+        self._wakeup.set()
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.exception("Email outbox dispatch failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=EmailConfig.EMAIL_DISPATCHER_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+email_dispatcher = EmailOutboxDispatcher()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver emails from the email outbox.")
+    parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.once:
+        print(f"Processed {asyncio.run(email_dispatcher.drain())} emails")
+    else:
+        asyncio.run(email_dispatcher.run_forever())
+
+
+if __name__ == "__main__":
+    main()
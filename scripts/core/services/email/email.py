@@ -1,6 +1,159 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
-from smtplib import SMTP_SSL, SMTP
+from smtplib import (SMTP_SSL, SMTP, SMTPDataError, SMTPException, SMTPRecipientsRefused, SMTPSenderRefused,
+                     SMTPServerDisconnected)
 from scripts.config import EmailConfig
+from scripts.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledConnection:
+    def __init__(self, client: SMTP):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.messages_sent = 0
+
+
+class SMTPConnectionPool:
+    """
+    Thread safe pool of authenticated SMTP sessions.
+
+    Connections idle for longer than SMTP_NOOP_AFTER_SECONDS are health checked with NOOP before
+    reuse, connections idle for longer than SMTP_MAX_IDLE_SECONDS or past
+    SMTP_MAX_MESSAGES_PER_CONNECTION are closed, and a send failing on a dropped connection is
+    retried once on a fresh one. For local testing point SMTP_SERVER/SMTP_PORT at
+    `python -m aiosmtpd -n -l localhost:8025` with ALLOW_SSL and SMTP_STARTTLS disabled.
+    """
+
+    def __init__(self, size: int = EmailConfig.SMTP_POOL_SIZE):
+        self.size = size
+        self._idle: queue.LifoQueue[_PooledConnection] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connects = 0
+        self.reconnects = 0
+        metrics_registry.register_gauge("smtp_pool", self.status)
+
+    def _open(self) -> _PooledConnection:
+        self.connects += 1
+        return _PooledConnection(EmailUtil.connect())
+
+    @staticmethod
+    def _close(connection: _PooledConnection):
+        try:
+            connection.client.quit()
+        except (SMTPException, OSError):
+            connection.client.close()
+
+    @staticmethod
+    def _is_alive(connection: _PooledConnection) -> bool:
+        try:
+            return connection.client.noop()[0] == 250
+        except (SMTPException, OSError):
+            return False
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            idle_for = time.monotonic() - connection.last_used
+            if idle_for > EmailConfig.SMTP_MAX_IDLE_SECONDS:
+                self._close(connection)
+                continue
+            if idle_for > EmailConfig.SMTP_NOOP_AFTER_SECONDS and not self._is_alive(connection):
+                connection.client.close()
+                continue
+            return connection
+
+    def _checkin(self, connection: _PooledConnection):
+        connection.last_used = time.monotonic()
+        if connection.messages_sent >= EmailConfig.SMTP_MAX_MESSAGES_PER_CONNECTION:
+            self._close(connection)
+        else:
+            self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection from the pool, blocking while all SMTP_POOL_SIZE connections are in use.
+        A connection raising an error is discarded instead of being returned to the pool.
+        """
+        if not self._slots.acquire(timeout=EmailConfig.SMTP_TIMEOUT):
+            raise TimeoutError("Timed out waiting for an SMTP connection")
+        connection = None
+        try:
+            connection = self._checkout()
+            yield connection
+            self._checkin(connection)
+        except BaseException:
+            if connection is not None:
+                connection.client.close()
+            raise
+        finally:
+            self._slots.release()
+
+    def send_messages(self, messages: list[MIMEMultipart]) -> list[Exception | None]:
+        """
+        Send the messages over a single authenticated SMTP session.
+        Errors concerning a single message (refused recipient or data) do not abort the batch,
+        connection level errors do: the messages sent before keep their outcome and the error is
+        reported for the failing message and every message after it, so only those are retried.
+
+        :param messages: The messages to send.
+        :return: The error of every message, None for the ones that were delivered.
+        """
+        errors = []
+        try:
+            with self.connection() as connection:
+                for message in messages:
+                    if connection.messages_sent >= EmailConfig.SMTP_MAX_MESSAGES_PER_CONNECTION:
+                        self._close(connection)
+                        connection.client, connection.messages_sent = EmailUtil.connect(), 0
+                        self.connects += 1
+                    try:
+                        try:
+                            connection.client.send_message(message)
+                        except SMTPServerDisconnected:
+                            logger.info("SMTP connection dropped, reconnecting")
+                            self.reconnects += 1
+                            connection.client.close()
+                            connection.client, connection.messages_sent = EmailUtil.connect(), 0
+                            connection.client.send_message(message)
+                    except (SMTPRecipientsRefused, SMTPSenderRefused, SMTPDataError) as e:
+                        connection.client.rset()
+                        errors.append(e)
+                    else:
+                        errors.append(None)
+                    connection.messages_sent += 1
+        except (SMTPException, OSError) as e:
+            logger.warning("SMTP batch aborted after %s of %s messages: %s", len(errors), len(messages), e)
+            errors.extend([e] * (len(messages) - len(errors)))
+        return errors
+
+    def close_all(self):
+        """
+        Close every idle connection, e.g. on shutdown.
+        """
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    def status(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+        }
 
 
 class EmailUtil:
@@ -15,26 +168,58 @@ class EmailUtil:
             smtp_client = SMTP_SSL(
                 host=EmailConfig.SMTP_SERVER,
                 port=EmailConfig.SMTP_PORT,
+                timeout=EmailConfig.SMTP_TIMEOUT,
             )
         else:
             smtp_client = SMTP(
                 host=EmailConfig.SMTP_SERVER,
                 port=EmailConfig.SMTP_PORT,
+                timeout=EmailConfig.SMTP_TIMEOUT,
             )
-            smtp_client.starttls()
-        smtp_client.login(EmailConfig.SMTP_USERNAME, EmailConfig.SMTP_PASSWORD)
+            if EmailConfig.SMTP_STARTTLS:
+                smtp_client.starttls()
+        if EmailConfig.SMTP_USERNAME:
+            smtp_client.login(EmailConfig.SMTP_USERNAME, EmailConfig.SMTP_PASSWORD)
         return smtp_client
 
     def send_email(self, message: MIMEMultipart, ssl: bool = False):
         """
-        Send an email message.
+        Send an email message over a pooled SMTP connection.
 
         Args:
             message (MIMEMultipart): The email message to send.
             ssl (bool): Whether to use SSL for the connection. Defaults to False.
         """
-        if not message["From"]:
-            message["From"] = EmailConfig.EMAIL_FROM
-        smtp_client = self.connect()
-        smtp_client.send_message(message)
-        smtp_client.quit()
+        error = self.send_emails([message])[0]
+        if error is not None:
+            raise error
+
+    @staticmethod
+    def send_emails(messages: list[MIMEMultipart]) -> list[Exception | None]:
+        """
+        Send several email messages over one pooled SMTP session.
+
+        Args:
+            messages (list[MIMEMultipart]): The email messages to send.
+        Returns:
+            list: The error of every message, None for the ones that were delivered.
+        """
+        for message in messages:
+            if not message["From"]:
+                message["From"] = EmailConfig.EMAIL_FROM
+        return smtp_pool.send_messages(messages)
+
+    async def send_email_async(self, message: MIMEMultipart):
+        """
+        Send an email message from a worker thread so the SMTP round trips never block the event loop.
+        """
+        await asyncio.to_thread(self.send_email, message)
+
+    async def send_emails_async(self, messages: list[MIMEMultipart]) -> list[Exception | None]:
+        """
+        Send several email messages over one pooled SMTP session from a worker thread.
+        """
+        return await asyncio.to_thread(self.send_emails, messages)
+
+
+smtp_pool = SMTPConnectionPool()
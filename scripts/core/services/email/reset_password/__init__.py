@@ -1,7 +1,6 @@
 from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 
-from scripts.config import ModuleConfig
+from scripts.config import JWTConfig, ModuleConfig
 from scripts.core.services.email import EmailHandler
 from scripts.exceptions import UserManagementException
 
@@ -22,19 +21,19 @@ class ResetPassword(EmailHandler):
 
         :return: MIMEMultipart object containing the email message.
         """
-        html_path = "/scripts/core/services/email/reset_password/template.html"
-        html_content = await self.fetch_html_content(html_path=html_path)
         reset_token = kwargs.get("reset_token")
         reset_url = ModuleConfig.DOMAIN_URL +f"/verify-password-reset/{reset_token}"
-        html_content = html_content.replace("{{reset_url}}", reset_url)
         to_email = kwargs.get("to_email")
         if not to_email:
             print("To Email not found for resetting password")
             raise UserManagementException("Failed to reset password. Please try again Later")
-        message = MIMEMultipart("alternative")
+        replace_payload = {
+            "reset_url": reset_url,
+            "expires_in": f"{kwargs.get('expires_in', JWTConfig.JWT_RESET_PASSWORD_TOKEN_EXPIRE_MINUTES)} minutes",
+        }
+        message = self.render_message("reset_password", replace_payload, locale=kwargs.get("locale"))
         message["To"] = to_email
         message["Subject"] = f"Re: Password Reset Request for {ModuleConfig.APP_NAME}"
-        message.attach(MIMEText(html_content, "html"))
         return message
 
 
@@ -0,0 +1,63 @@
+from jinja2 import Environment, PackageLoader, Template, select_autoescape
+
+from scripts.config import EmailConfig
+
+
+class EmailTemplates:
+    """
+    Compiled email templates, loaded once from this package and kept in memory.
+
+    Templates live next to their handler as `<name>/template.html` and `<name>/template.txt`,
+    with optional per locale variants such as `<name>/template.de.html`. With
+    EMAIL_TEMPLATE_AUTO_RELOAD (dev mode) every lookup goes through the Jinja environment,
+    which recompiles a template when its file changes.
+    """
+
+    def __init__(self, auto_reload: bool = EmailConfig.EMAIL_TEMPLATE_AUTO_RELOAD):
+        self.auto_reload = auto_reload
+        self.environment = Environment(
+            loader=PackageLoader("scripts.core.services.email", "."),
+            autoescape=select_autoescape(enabled_extensions=("html",), default_for_string=False),
+            auto_reload=auto_reload,
+        )
+        self._compiled: dict[tuple[str, str, str | None], Template | None] = {}
+
+    def get(self, name: str, kind: str = "html", locale: str | None = None) -> Template | None:
+        """
+        Get the compiled template.
+
+        :param name: The template name, i.e. the directory of the email handler.
+        :param kind: Either html or txt.
+        :param locale: Optional locale, falling back to the default template when no variant exists.
+        :return: The compiled template, or None if there is no template of this kind.
+        """
+        key = (name, kind, locale)
+        if not self.auto_reload and key in self._compiled:
+            return self._compiled[key]
+        candidates = [f"{name}/template.{kind}"]
+        if locale:
+            candidates.insert(0, f"{name}/template.{locale}.{kind}")
+        try:
+            template = self.environment.select_template(candidates)
+        except LookupError:
+            template = None
+        self._compiled[key] = template
+        return template
+
+    def render(self, name: str, payload: dict, locale: str | None = None) -> tuple[str, str | None]:
+        """
+        Render the html part and, if the template has one, the plain text part.
+
+        :param name: The template name.
+        :param payload: The template variables.
+        :param locale: Optional locale.
+        :return: The html and plain text content.
+        """
+        text_template = self.get(name, kind="txt", locale=locale)
+        return (
+            self.get(name, kind="html", locale=locale).render(payload),
+            text_template.render(payload) if text_template else None,
+        )
+
+
+email_templates = EmailTemplates()
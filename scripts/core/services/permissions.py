@@ -0,0 +1,236 @@
+"""
+Role permission resolution.
+
+Roles.permissions is a JSONB object mapping a resource to the actions granted on it:
+
+    {"users": ["read", "export"], "roles": "*"}     some actions on users, every action on roles
+    {"*": ["read"]}                                 read on every resource
+    {"*": "*"}                                      everything
+
+Every role is compiled once into a frozenset of "resource:action" strings, wildcards already expanded
+against the PERMISSIONS catalog, so checking a permission is a set membership test. The compiled
+roles of every process are synced by updated_at, from a background loop (API server) or when they
+got too old (Lambda); the role routes apply their writes to the process handling them at once.
+
+The role routes require roles:* permissions themselves; grant the first administrator with:
+    python -m scripts.core.services.permissions --email admin@example.com [--role admin]
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import time
+from typing import NamedTuple
+
+from scripts.config import PermissionConfig
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.queries import SQLQueries
+from scripts.db.pg.sessions import get_db
+from scripts.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = "*"
+
+# Every permission checked by the API, as resource -> actions
+PERMISSIONS: dict[str, tuple[str, ...]] = {
+    "users": ("read", "write", "delete", "import", "export"),
+    "roles": ("read", "write", "delete"),
+}
+ALL_PERMISSIONS = frozenset(f"{resource}:{action}" for resource, actions in PERMISSIONS.items() for action in actions)
+NO_PERMISSIONS: frozenset[str] = frozenset()
+# A role claim unknown to the engine, e.g. a role created by another process, syncs at most this often
+UNKNOWN_ROLE_SYNC_SECONDS = 1
+
+
+def compile_permissions(permissions: dict | None) -> frozenset[str]:
+    """
+    Compile the permissions JSON of a role into the set of permissions it grants.
+    Wildcard resources and actions are expanded to the catalog; grants outside the catalog are kept
+    as they are, so they can be checked once an endpoint requires them.
+
+    :param permissions: The permissions JSON of the role.
+    :return: The granted "resource:action" permissions.
+    """
+    granted = set()
+    for resource, actions in (permissions or {}).items():
+        if actions is True or actions == WILDCARD:
+            actions = [WILDCARD]
+        elif isinstance(actions, str):
+            actions = [actions]
+        elif not isinstance(actions, (list, tuple)):
+            continue
+        resources = PERMISSIONS if resource == WILDCARD else (resource,)
+        for each in resources:
+            for action in actions:
+                if action == WILDCARD:
+                    granted.update(f"{each}:{known}" for known in PERMISSIONS.get(each, ()))
+                elif resource != WILDCARD or action in PERMISSIONS[each]:
+                    granted.add(f"{each}:{action}")
+    return frozenset(granted)
+
+
+class CompiledRole(NamedTuple):
+    updated_at: datetime.datetime
+    permissions: frozenset[str]
+
+
+class PermissionEngine:
+    """
+    The compiled permission sets of the roles, by role id.
+    Inactive roles are not kept, so they grant nothing. generation counts the changes applied,
+    for the metrics and for anything deriving state from the compiled roles.
+    """
+
+    def __init__(self):
+        self.roles: dict[str, CompiledRole] = {}
+        self.generation = 0
+        self.synced_at: float | None = None
+        self.syncs = 0
+        self.sync_errors = 0
+        self.compilations = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        metrics_registry.register_gauge("permissions", self.status)
+
+    def permissions(self, role_id) -> frozenset[str]:
+        """
+        The permissions granted by a role.
+
+        :param role_id: The id of the role, e.g. the role claim of the access token.
+        :return: The granted permissions, empty for no role or an unknown or inactive role.
+        """
+        role = self.roles.get(str(role_id)) if role_id is not None else None
+        return role.permissions if role is not None else NO_PERMISSIONS
+
+    async def resolve(self, role_id) -> frozenset[str]:
+        """
+        The permissions granted by a role, syncing first when the roles are stale or the role is unknown.
+
+        :param role_id: The id of the role, e.g. the role claim of the access token.
+        :return: The granted permissions.
+        """
+        await self.ensure_fresh()
+        if role_id is not None and str(role_id) not in self.roles and not self._is_fresh(UNKNOWN_ROLE_SYNC_SECONDS):
+            await self.sync(max_age=UNKNOWN_ROLE_SYNC_SECONDS)
+        return self.permissions(role_id)
+
+    def apply(self, role_id, updated_at: datetime.datetime, is_active: bool, permissions: dict | None):
+        """
+        Compile a role into the engine, unless its updated_at is the one already compiled.
+        Used by the sync and by the role routes right after their write.
+        """
+        role_id = str(role_id)
+        current = self.roles.get(role_id)
+        if not is_active:
+            self.remove(role_id)
+        elif current is None or current.updated_at != updated_at:
+            self.roles[role_id] = CompiledRole(updated_at, compile_permissions(permissions))
+            self.compilations += 1
+            self.generation += 1
+
+    def remove(self, role_id):
+        if self.roles.pop(str(role_id), None) is not None:
+            self.generation += 1
+
+    def _is_fresh(self, max_age: float) -> bool:
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= max_age
+
+    async def sync(self, max_age: float | None = None):
+        """
+        Read the version (updated_at) of every active role and recompile only the roles whose version
+        changed; roles deleted or deactivated meanwhile are dropped.
+
+        :param max_age: Return without a query when a sync finished at most this many seconds ago by
+            the time the lock is acquired, e.g. the one a concurrent request was waiting for.
+        """
+        async with self._lock:
+            if max_age is not None and self._is_fresh(max_age):
+                return
+            async for session in get_db():
+                sql_ops = SQLOps(session)
+                versions = {str(row.id): row.updated_at
+                            for row in await sql_ops.execute_query(SQLQueries.get_role_versions())}
+                for role_id in set(self.roles) - set(versions):
+                    self.remove(role_id)
+                changed = [role_id for role_id, updated_at in versions.items()
+                           if role_id not in self.roles or self.roles[role_id].updated_at != updated_at]
+                if changed:
+                    for row in await sql_ops.execute_query(SQLQueries.get_role_permissions(changed)):
+                        self.apply(row.id, row.updated_at, row.is_active, row.permissions)
+                await sql_ops.commit()
+            self.synced_at = time.monotonic()
+            self.syncs += 1
+
+    async def ensure_fresh(self):
+        """
+        Sync before answering when the roles were never loaded or are older than
+        PERMISSION_MAX_STALENESS_SECONDS; a no-op while the background loop keeps them fresh.
+        """
+        if not self._is_fresh(PermissionConfig.PERMISSION_MAX_STALENESS_SECONDS):
+            await self.sync(max_age=PermissionConfig.PERMISSION_MAX_STALENESS_SECONDS)
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                self.sync_errors += 1
+                logger.exception("Role permission sync failed: %s", e)
+            await asyncio.sleep(PermissionConfig.PERMISSION_SYNC_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "roles": len(self.roles),
+            "generation": self.generation,
+            "compilations": self.compilations,
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "age_seconds": round(time.monotonic() - self.synced_at, 3) if self.synced_at is not None else None,
+        }
+
+
+permission_engine = PermissionEngine()
+
+
+async def grant_role(email: str, role_name: str, permissions: dict) -> bool:
+    """
+    Create the role, or replace its permissions, and assign it to the user with that email.
+
+    :return: True if the user exists.
+    """
+    from scripts.core.db.sql import SQLHandler
+
+    async for session in get_db():
+        sql_handler = SQLHandler(session=session)
+        role = await sql_handler.upsert_role(name=role_name, permissions=permissions,
+                                             description="Every permission")
+        return bool(await sql_handler.update_user({"role": role["id"]}, filter_condition={"email": email}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grant a user a role with every permission.")
+    parser.add_argument("--email", required=True, help="Email of the user.")
+    parser.add_argument("--role", default="admin", help="Name of the role, created when missing.")
+    args = parser.parse_args()
+    if not asyncio.run(grant_role(args.email, args.role, {WILDCARD: WILDCARD})):
+        raise SystemExit(f"No user with email {args.email}")
+    print(f"Granted {args.role} to {args.email}; it applies from the next login or token refresh")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+In-memory mirror of the revoked_tokens table.
+
+Every process loads the unexpired revocations once and then syncs the rows created since its
+watermark, from a background loop (API server) or when the mirror got too old (Lambda), so checking
+whether an access token is revoked is a dictionary lookup.
+"""
+import asyncio
+import datetime
+import logging
+import time
+
+from scripts.config import JWTConfig
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.queries import SQLQueries
+from scripts.db.pg.sessions import get_db
+from scripts.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """
+    Revoked token ids and per user revocation cut-offs, with their expiry.
+    """
+
+    def __init__(self):
+        self.tokens: dict[str, datetime.datetime] = {}
+        self.users: dict[str, tuple[datetime.datetime, datetime.datetime]] = {}
+        self.watermark: datetime.datetime | None = None
+        self.synced_at: float | None = None
+        self.syncs = 0
+        self.sync_errors = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        metrics_registry.register_gauge("token_revocations", self.status)
+
+    def is_revoked(self, claims: dict) -> bool:
+        """
+        Check the claims of an access token against the mirror.
+
+        :param claims: The decoded claims, with jti, user_id and iat.
+        :return: True if the token is revoked.
+        """
+        if claims["jti"] in self.tokens:
+            return True
+        user = self.users.get(claims["user_id"])
+        return user is not None and claims["iat"] <= user[0].timestamp()
+
+    def add(self, user_id, expires_at: datetime.datetime, jti: str = None,
+            revoked_before: datetime.datetime = None):
+        """
+        Apply a revocation to the mirror of this process, right after it was inserted or when it is synced.
+        """
+        if jti is not None:
+            self.tokens[jti] = expires_at
+            return
+        current = self.users.get(str(user_id))
+        if current is None or revoked_before > current[0]:
+            self.users[str(user_id)] = (revoked_before, expires_at)
+
+    def _prune(self) -> int:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        expired_tokens = [jti for jti, expires_at in self.tokens.items() if expires_at <= now]
+        expired_users = [user_id for user_id, (_, expires_at) in self.users.items() if expires_at <= now]
+        for jti in expired_tokens:
+            del self.tokens[jti]
+        for user_id in expired_users:
+            del self.users[user_id]
+        return len(expired_tokens) + len(expired_users)
+
+    def _is_fresh(self, max_age: float) -> bool:
+        return self.synced_at is not None and time.monotonic() - self.synced_at <= max_age
+
+    async def sync(self, max_age: float | None = None):
+        """
+        Load the revocations created since the watermark, less the overlap window, and drop expired ones.
+        Expired entries in memory mean expired rows in the table, which are purged in the same go.
+
+        :param max_age: Skip the sync if the mirror is at most this many seconds old once the lock is
+            acquired, so requests that queued up behind one sync do not each run their own.
+        """
+        async with self._lock:
+            if max_age is not None and self._is_fresh(max_age):
+                return
+            since = None
+            if self.watermark is not None:
+                since = self.watermark - datetime.timedelta(seconds=JWTConfig.JWT_REVOCATION_SYNC_OVERLAP_SECONDS)
+            async for session in get_db():
+                sql_ops = SQLOps(session)
+                rows = await sql_ops.execute_query(SQLQueries.get_revocations(since=since))
+                for row in rows:
+                    self.add(row.user_id, row.expires_at, jti=row.jti, revoked_before=row.revoked_before)
+                    if self.watermark is None or row.created_at > self.watermark:
+                        self.watermark = row.created_at
+                if self._prune():
+                    await sql_ops.execute_statement(SQLQueries.purge_revocations())
+                else:
+                    await sql_ops.commit()
+            if self.watermark is None:
+                # Nothing revoked yet; later syncs still only need the recent rows
+                self.watermark = datetime.datetime.now(datetime.timezone.utc)
+            self.synced_at = time.monotonic()
+            self.syncs += 1
+
+    async def ensure_fresh(self):
+        """
+        Sync before answering when the mirror was never loaded or is older than
+        JWT_REVOCATION_MAX_STALENESS_SECONDS; a no-op while the background loop keeps it fresh.
+        """
+        if not self._is_fresh(JWTConfig.JWT_REVOCATION_MAX_STALENESS_SECONDS):
+            await self.sync(max_age=JWTConfig.JWT_REVOCATION_MAX_STALENESS_SECONDS)
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                self.sync_errors += 1
+                logger.exception("Token revocation sync failed: %s", e)
+            await asyncio.sleep(JWTConfig.JWT_REVOCATION_SYNC_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "revoked_tokens": len(self.tokens),
+            "revoked_users": len(self.users),
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "age_seconds": round(time.monotonic() - self.synced_at, 3) if self.synced_at is not None else None,
+        }
+
+
+revocation_list = RevocationList()
@@ -0,0 +1,150 @@
+"""
+Batched last_seen_at writes of the login sessions.
+
+Authenticated requests only record the activity of their session in memory; the latest activity
+of every session seen since the last flush is written in one statement, from a background loop
+(API server) or after an invocation once the interval has passed (Lambda). A burst of requests of
+one session thus costs one row update per flush interval instead of one per request.
+"""
+import asyncio
+import datetime
+import logging
+import time
+import uuid
+
+from scripts.config import JWTConfig
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.queries import SQLQueries
+from scripts.db.pg.sessions import get_db
+from scripts.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Expired and revoked sessions are deleted by the flusher at most this often
+PURGE_INTERVAL_SECONDS = 3600
+
+
+class SessionActivity:
+    """
+    Pending last_seen_at of the sessions of this process, by session id.
+    """
+
+    def __init__(self):
+        self.pending: dict[str, float] = {}
+        self.flushed_at = time.monotonic()
+        self.purged_at: float | None = None
+        self.touches = 0
+        self.flushes = 0
+        self.flushed_sessions = 0
+        self.flush_errors = 0
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        metrics_registry.register_gauge("session_activity", self.status)
+
+    def touch(self, session_id: str):
+        """
+        Record the activity of a session, in memory only.
+
+        :param session_id: The sid claim of the access token.
+        """
+        self.pending[session_id] = time.time()
+        self.touches += 1
+        if len(self.pending) >= JWTConfig.SESSION_LAST_SEEN_MAX_PENDING:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        Write the pending activity in one statement. On failure the activity is put back, unless
+        newer activity of the same session was recorded meanwhile, and written with the next flush.
+
+        :return: The number of sessions written.
+        """
+        async with self._lock:
+            pending, self.pending = self.pending, {}
+            self.flushed_at = time.monotonic()
+            purge = self.purged_at is None or self.flushed_at - self.purged_at > PURGE_INTERVAL_SECONDS
+            if not pending and not purge:
+                return 0
+            last_seen = {
+                uuid.UUID(session_id): datetime.datetime.fromtimestamp(seen, tz=datetime.timezone.utc)
+                for session_id, seen in pending.items()
+            }
+            try:
+                async for session in get_db():
+                    sql_ops = SQLOps(session)
+                    if last_seen:
+                        await sql_ops.execute_statement(SQLQueries.touch_sessions(last_seen), commit=False)
+                    if purge:
+                        await sql_ops.execute_statement(SQLQueries.purge_sessions(), commit=False)
+                    await sql_ops.commit()
+            except Exception:
+                for session_id, seen in pending.items():
+                    if self.pending.get(session_id, 0) < seen:
+                        self.pending[session_id] = seen
+                raise
+            if purge:
+                self.purged_at = self.flushed_at
+            self.flushes += 1
+            self.flushed_sessions += len(last_seen)
+            return len(last_seen)
+
+    async def flush_if_due(self):
+        """
+        Flush once SESSION_LAST_SEEN_FLUSH_SECONDS have passed since the last flush, where no
+        background loop runs. Failures are logged, the activity stays pending.
+        """
+        if self.pending and time.monotonic() - self.flushed_at > JWTConfig.SESSION_LAST_SEEN_FLUSH_SECONDS:
+            try:
+                await self.flush()
+            except Exception as e:
+                self.flush_errors += 1
+                logger.warning("Session activity flush failed: %s", e)
+
+    async def run_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JWTConfig.SESSION_LAST_SEEN_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self.flush_errors += 1
+                logger.exception("Session activity flush failed: %s", e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self):
+        """
+        Stop the background loop and write the activity still pending.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                self.flush_errors += 1
+                logger.warning("Session activity flush on shutdown failed: %s", e)
+
+    def status(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "pending": len(self.pending),
+            "touches": self.touches,
+            "flushes": self.flushes,
+            "flushed_sessions": self.flushed_sessions,
+            "flush_errors": self.flush_errors,
+        }
+
+
+session_activity = SessionActivity()
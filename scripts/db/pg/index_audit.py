@@ -0,0 +1,103 @@
+"""
+Index usage and size report of the user management database.
+
+Usage:
+    python -m scripts.db.pg.index_audit [--schema public] [--json]
+
+Lists every index with its scan count (from pg_stat_user_indexes, since the last statistics
+reset) and size, flags the ones that are candidates for removal and prints the row writes of
+every table next to the number of indexes each write has to maintain.
+
+Flags:
+    unused          never scanned and not enforcing uniqueness
+    leads_with_pk   starts with the primary key, so the primary key already serves its lookups
+    prefix_of       its columns are a leading prefix of another index on the same table
+
+Scan counts are only meaningful after the database served representative traffic; check
+pg_stat_database.stats_reset before dropping anything.
+"""
+import argparse
+import asyncio
+import json
+
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.queries import SQLQueries
+from scripts.db.pg.sessions import get_db
+
+
+def audit_indexes(indexes: list[dict]) -> list[dict]:
+    """
+    Flag removal candidates among the indexes returned by SQLQueries.index_usage.
+
+    :param indexes: The index rows as dictionaries.
+    :return: The same rows, each with a list of flags.
+    """
+    primary_keys = {index["table_name"]: index["columns"] for index in indexes if index["is_primary"]}
+    for index in indexes:
+        flags = []
+        plain_btree = index["method"] == "btree" and not index["is_partial"]
+        if not index["is_unique"]:
+            if not index["scans"]:
+                flags.append("unused")
+            primary_key = primary_keys.get(index["table_name"])
+            if plain_btree and primary_key and index["columns"][:len(primary_key)] == primary_key:
+                flags.append("leads_with_pk")
+            for other in indexes:
+                if (
+                    plain_btree and other is not index and other["table_name"] == index["table_name"]
+                    and other["method"] == "btree" and not other["is_partial"]
+                    and other["columns"][:len(index["columns"])] == index["columns"]
+                    and (len(other["columns"]) > len(index["columns"]) or other["is_unique"])
+                ):
+                    flags.append(f"prefix_of:{other['index_name']}")
+        index["flags"] = flags
+    return indexes
+
+
+def _size(size_bytes: int) -> str:
+    for unit in ("B", "kB", "MB", "GB"):
+        if size_bytes < 1024 or unit == "GB":
+            return f"{size_bytes:.0f} {unit}" if unit == "B" else f"{size_bytes:.1f} {unit}"
+        size_bytes /= 1024
+
+
+def print_report(indexes: list[dict], tables: list[dict]):
+    print(f"{'table':<16} {'index':<44} {'scans':>10} {'size':>10}  flags")
+    for index in indexes:
+        print(f"{index['table_name']:<16} {index['index_name']:<44} {index['scans']:>10} "
+              f"{_size(index['size_bytes']):>10}  {', '.join(index['flags'])}")
+    print()
+    print(f"{'table':<16} {'inserts':>10} {'updates':>10} {'hot':>10} {'indexes':>8} {'table size':>11} {'index size':>11}")
+    for table in tables:
+        print(f"{table['table_name']:<16} {table['inserts']:>10} {table['updates']:>10} {table['hot_updates']:>10} "
+              f"{table['index_count']:>8} {_size(table['table_bytes']):>11} {_size(table['index_bytes']):>11}")
+    candidates = [index for index in indexes if index["flags"]]
+    if candidates:
+        print()
+        print("-- Removal candidates")
+        for index in candidates:
+            print(f"DROP INDEX CONCURRENTLY IF EXISTS {index['index_name']};  -- {', '.join(index['flags'])}")
+
+
+async def run(schema: str, as_json: bool):
+    async for session in get_db():
+        sql_ops = SQLOps(session)
+        indexes = [dict(row._mapping) for row in await sql_ops.execute_query(SQLQueries.index_usage(schema))]
+        tables = [dict(row._mapping) for row in await sql_ops.execute_query(SQLQueries.table_write_stats(schema))]
+    indexes = audit_indexes(indexes)
+    if as_json:
+        print(json.dumps({"indexes": indexes, "tables": tables}, indent=2))
+    else:
+        print_report(indexes, tables)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report index usage and size.")
+    parser.add_argument("--schema", default="public", help="Schema to audit.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+    asyncio.run(run(schema=args.schema, as_json=args.json))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+from scripts.db.pg.sql_schemas import Users, UserMetadata
+
+
+class RowMapper:
+    """
+    Explicit ORM row to dictionary conversions for API responses.
+    Only public columns are copied (never passwords or tokens), and values keep their native
+    types (UUID, datetime) for the response encoder, instead of walking the objects with jsonable_encoder.
+    """
+
+    @staticmethod
+    def user_metadata(metadata: UserMetadata | None) -> dict | None:
+        if metadata is None:
+            return None
+        return {
+            "email_verified": metadata.email_verified,
+            "phone_number": metadata.phone_number,
+            "address": metadata.address,
+            "locked_until": metadata.locked_until,
+            "profile_picture": metadata.profile_picture,
+            "updated_at": metadata.updated_at,
+        }
+
+    @staticmethod
+    def user(user: Users, with_metadata: bool = True) -> dict:
+        data = {
+            "id": user.id,
+            "email": user.email,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "is_active": user.is_active,
+            "role": user.role,
+            "created_at": user.created_at,
+            "updated_at": user.updated_at,
+        }
+        if with_metadata:
+            data["user_metadata"] = RowMapper.user_metadata(user.user_metadata)
+        return data
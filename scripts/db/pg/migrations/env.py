@@ -0,0 +1,61 @@
+"""
+Alembic environment of the user management database.
+
+Migrations run over the asyncpg driver against SQL_URL/SQL_DATABASE, the same database the
+service connects to.
+"""
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from scripts.config import SQLConfig
+from scripts.db.pg import sql_schemas  # noqa: F401 registers the models on Base.metadata
+from scripts.db.pg.sessions import Base, SessionUtil
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_url():
+    return SessionUtil.get_url(database=SQLConfig.SQL_DATABASE, drivername=SQLConfig.SQL_ASYNC_DRIVER)
+
+
+def run_migrations_offline() -> None:
+    """
+    Emit the migration SQL to stdout instead of running it, e.g. `alembic upgrade head --sql`.
+    """
+    context.configure(
+        url=get_url().render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online() -> None:
+    engine = create_async_engine(get_url(), poolclass=pool.NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
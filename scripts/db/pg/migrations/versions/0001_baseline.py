@@ -0,0 +1,137 @@
+"""baseline
+
+The schema as created by metadata.create_all before migrations were introduced.
+Databases created that way are brought under version control with `alembic stamp 0001`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _timestamp(name: str, nullable: bool = False) -> sa.Column:
+    return sa.Column(name, sa.TIMESTAMP(timezone=True), nullable=nullable)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'roles',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('permissions', postgresql.JSONB(), nullable=True),
+        _timestamp('created_at'),
+        _timestamp('updated_at'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_role_all', 'roles', ['id', 'name'])
+    op.create_index('ix_roles_name', 'roles', ['name'], unique=True)
+    op.create_index('ix_roles_is_active', 'roles', ['is_active'])
+    op.create_index('ix_roles_permissions', 'roles', ['permissions'])
+    op.create_index('ix_roles_created_at', 'roles', ['created_at'])
+    op.create_index('ix_roles_updated_at', 'roles', ['updated_at'])
+
+    op.create_table(
+        'users',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('first_name', sa.String(), nullable=False),
+        sa.Column('last_name', sa.String(), nullable=False),
+        sa.Column('password', sa.String(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('role', postgresql.UUID(as_uuid=True), nullable=True),
+        _timestamp('created_at'),
+        _timestamp('updated_at'),
+        sa.ForeignKeyConstraint(['role'], ['roles.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_user_all', 'users', ['id', 'email', 'first_name', 'last_name'])
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_first_name', 'users', ['first_name'])
+    op.create_index('ix_users_last_name', 'users', ['last_name'])
+    op.create_index('ix_users_is_active', 'users', ['is_active'])
+    op.create_index('ix_users_role', 'users', ['role'])
+    op.create_index('ix_users_created_at', 'users', ['created_at'])
+    op.create_index('ix_users_updated_at', 'users', ['updated_at'])
+
+    op.create_table(
+        'user_audit',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        _timestamp('timestamp'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_user_audit_all', 'user_audit', ['id', 'user_id', 'action'])
+    op.create_index('ix_user_audit_user_id', 'user_audit', ['user_id'])
+    op.create_index('ix_user_audit_action', 'user_audit', ['action'])
+    op.create_index('ix_user_audit_timestamp', 'user_audit', ['timestamp'])
+
+    op.create_table(
+        'user_metadata',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('email_verified', sa.Boolean(), nullable=False),
+        sa.Column('phone_number', sa.String(), nullable=True),
+        sa.Column('address', sa.String(), nullable=True),
+        _timestamp('locked_until', nullable=True),
+        sa.Column('profile_picture', sa.String(), nullable=True),
+        sa.Column('email_verification_token', sa.String(), nullable=True),
+        sa.Column('reset_password_token', sa.String(), nullable=True),
+        _timestamp('reset_password_expires_at', nullable=True),
+        _timestamp('created_at'),
+        _timestamp('updated_at'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_user_metadata_all', 'user_metadata', ['id', 'user_id'])
+    for column in ('user_id', 'email_verified', 'phone_number', 'address', 'locked_until', 'profile_picture',
+                   'email_verification_token', 'reset_password_token', 'reset_password_expires_at',
+                   'created_at', 'updated_at'):
+        op.create_index(f'ix_user_metadata_{column}', 'user_metadata', [column])
+
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('template', sa.String(), nullable=False),
+        sa.Column('to_email', sa.String(), nullable=False),
+        sa.Column('payload', postgresql.JSONB(), nullable=False),
+        sa.Column('dedup_key', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        _timestamp('next_attempt_at'),
+        sa.Column('last_error', sa.String(), nullable=True),
+        _timestamp('sent_at', nullable=True),
+        _timestamp('created_at'),
+        _timestamp('updated_at'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_email_outbox_pending', 'email_outbox', ['next_attempt_at'],
+                    postgresql_where=sa.text("status = 'pending'"))
+    op.create_index('uq_email_outbox_pending_dedup', 'email_outbox', ['dedup_key'], unique=True,
+                    postgresql_where=sa.text("status = 'pending'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('email_outbox')
+    op.drop_table('user_metadata')
+    op.drop_table('user_audit')
+    op.drop_table('users')
+    op.drop_table('roles')
@@ -0,0 +1,43 @@
+"""search indexes
+
+Keyset pagination index and pg_trgm GIN indexes of the user listing. Databases created by
+create_all after the listing was added already have them, hence IF NOT EXISTS.
+Indexes are built CONCURRENTLY so users stays writable during the migration.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGRAM_COLUMNS = ('first_name', 'last_name', 'email')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        op.create_index('idx_users_created_at_id', 'users', ['created_at', 'id'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        for column in TRIGRAM_COLUMNS:
+            op.create_index(f'idx_users_{column}_trgm', 'users', [column],
+                            postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for column in TRIGRAM_COLUMNS:
+            op.drop_index(f'idx_users_{column}_trgm', table_name='users', postgresql_concurrently=True)
+        op.drop_index('idx_users_created_at_id', table_name='users', postgresql_concurrently=True)
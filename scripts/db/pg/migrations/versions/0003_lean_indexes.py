@@ -0,0 +1,86 @@
+"""lean indexes
+
+Drop the indexes no query uses and the idx_*_all composites that lead with the primary key.
+Every remaining index serves a lookup, a foreign key or a sort:
+
+    users          pk, email (unique), role (fk), (created_at, id), trigram name/email search
+    user_metadata  pk, user_id (fk), partial indexes on the outstanding verification/reset tokens
+    roles          pk, name (unique), GIN on permissions
+    user_audit     pk, (user_id, timestamp)
+
+Replacements are built before the old indexes are dropped, all CONCURRENTLY.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name: (table, columns) of the indexes dropped by this revision
+DROPPED_INDEXES = {
+    'idx_role_all': ('roles', ['id', 'name']),
+    'ix_roles_is_active': ('roles', ['is_active']),
+    'ix_roles_permissions': ('roles', ['permissions']),
+    'ix_roles_created_at': ('roles', ['created_at']),
+    'ix_roles_updated_at': ('roles', ['updated_at']),
+    'idx_user_all': ('users', ['id', 'email', 'first_name', 'last_name']),
+    'ix_users_first_name': ('users', ['first_name']),
+    'ix_users_last_name': ('users', ['last_name']),
+    'ix_users_is_active': ('users', ['is_active']),
+    'ix_users_created_at': ('users', ['created_at']),
+    'ix_users_updated_at': ('users', ['updated_at']),
+    'idx_user_audit_all': ('user_audit', ['id', 'user_id', 'action']),
+    'ix_user_audit_user_id': ('user_audit', ['user_id']),
+    'ix_user_audit_action': ('user_audit', ['action']),
+    'ix_user_audit_timestamp': ('user_audit', ['timestamp']),
+    'idx_user_metadata_all': ('user_metadata', ['id', 'user_id']),
+    'ix_user_metadata_email_verified': ('user_metadata', ['email_verified']),
+    'ix_user_metadata_phone_number': ('user_metadata', ['phone_number']),
+    'ix_user_metadata_address': ('user_metadata', ['address']),
+    'ix_user_metadata_locked_until': ('user_metadata', ['locked_until']),
+    'ix_user_metadata_profile_picture': ('user_metadata', ['profile_picture']),
+    'ix_user_metadata_email_verification_token': ('user_metadata', ['email_verification_token']),
+    'ix_user_metadata_reset_password_token': ('user_metadata', ['reset_password_token']),
+    'ix_user_metadata_reset_password_expires_at': ('user_metadata', ['reset_password_expires_at']),
+    'ix_user_metadata_created_at': ('user_metadata', ['created_at']),
+    'ix_user_metadata_updated_at': ('user_metadata', ['updated_at']),
+}
+
+TOKEN_COLUMNS = ('email_verification_token', 'reset_password_token')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for column in TOKEN_COLUMNS:
+            op.create_index(f'idx_user_metadata_{column}', 'user_metadata', [column],
+                            postgresql_where=sa.text(f'{column} IS NOT NULL'),
+                            postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('idx_roles_permissions_gin', 'roles', ['permissions'], postgresql_using='gin',
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('idx_user_audit_user_id_timestamp', 'user_audit', ['user_id', 'timestamp'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        for name, (table, _) in DROPPED_INDEXES.items():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, (table, columns) in DROPPED_INDEXES.items():
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_user_audit_user_id_timestamp', table_name='user_audit', postgresql_concurrently=True)
+        op.drop_index('idx_roles_permissions_gin', table_name='roles', postgresql_concurrently=True)
+        for column in TOKEN_COLUMNS:
+            op.drop_index(f'idx_user_metadata_{column}', table_name='user_metadata', postgresql_concurrently=True)
@@ -0,0 +1,50 @@
+"""token hashes
+
+Verification and reset tokens are now checked as JWTs first and then matched by user_id against
+the SHA-256 of the token, so the columns hold hashes and their partial indexes are no longer used.
+Outstanding tokens are hashed in place, but the verification and reset links sent before this
+revision stop working all the same: their tokens carry no purpose claim and are rejected before the
+hash lookup. Users request a new link.
+The downgrade restores the indexes only; hashed tokens can not be turned back into tokens.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TOKEN_COLUMNS = ('email_verification_token', 'reset_password_token')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in TOKEN_COLUMNS:
+        # Skip values that already are hashes, in case the revision is re-applied
+        op.execute(
+            f"UPDATE user_metadata SET {column} = encode(sha256(convert_to({column}, 'UTF8')), 'hex') "
+            f"WHERE {column} IS NOT NULL AND {column} !~ '^[0-9a-f]{{64}}$'"
+        )
+    with op.get_context().autocommit_block():
+        for column in TOKEN_COLUMNS:
+            op.drop_index(f'idx_user_metadata_{column}', table_name='user_metadata',
+                          postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for column in TOKEN_COLUMNS:
+            op.create_index(f'idx_user_metadata_{column}', 'user_metadata', [column],
+                            postgresql_where=sa.text(f'{column} IS NOT NULL'),
+                            postgresql_concurrently=True, if_not_exists=True)
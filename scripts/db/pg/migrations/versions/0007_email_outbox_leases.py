@@ -0,0 +1,49 @@
+"""email outbox leases
+
+Dispatchers commit their claim before delivering: claimed emails turn to sending, with the end of
+the lease in next_attempt_at, and become due again once it expires. The due index covers both
+states.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index('idx_email_outbox_due', 'email_outbox', ['next_attempt_at'],
+                        postgresql_where=sa.text("status IN ('pending', 'sending')"),
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_email_outbox_pending', table_name='email_outbox', postgresql_concurrently=True,
+                      if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Claimed emails go back to pending, the newest one per recipient and only while none is pending
+    op.execute(
+        "UPDATE email_outbox SET status = 'pending' WHERE id IN ("
+        "SELECT DISTINCT ON (dedup_key) id FROM email_outbox AS claimed WHERE status = 'sending' AND NOT EXISTS "
+        "(SELECT 1 FROM email_outbox AS newer WHERE newer.status = 'pending' AND newer.dedup_key = claimed.dedup_key) "
+        "ORDER BY dedup_key, created_at DESC)"
+    )
+    op.execute("UPDATE email_outbox SET status = 'superseded', payload = '{}' WHERE status = 'sending'")
+    with op.get_context().autocommit_block():
+        op.create_index('idx_email_outbox_pending', 'email_outbox', ['next_attempt_at'],
+                        postgresql_where=sa.text("status = 'pending'"),
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_email_outbox_due', table_name='email_outbox', postgresql_concurrently=True)
@@ -1,4 +1,38 @@
+import csv
+import io
+import itertools
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable
+
 from fastapi.encoders import jsonable_encoder
+from sqlalchemy import UniqueConstraint, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from scripts.config import SQLConfig
+
+
+class BulkInsertReport:
+    """
+    Outcome of SQLOps.insert_many.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.seconds = 0.0
+        self.returned = []
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def to_dict(self) -> dict:
+        return {"rows": self.rows, "seconds": round(self.seconds, 3), "rows_per_sec": round(self.rows_per_sec, 1)}
+
 
 class SQLOps:
     """
@@ -9,45 +43,250 @@ class SQLOps:
         """
         Initialize the SQLOps class with a database session.
 
-        :param session: The database session to use for operations.
+        :param session: The database session to use for operations. Either an AsyncSession
+            or a synchronous Session, which is driven from the thread pool so the event loop is never blocked.
         """
         self.session = session
 
+    @property
+    def is_async(self) -> bool:
+        return isinstance(self.session, AsyncSession)
+
+    async def _execute(self, query):
+        if self.is_async:
+            return await self.session.execute(query)
+        return await run_in_threadpool(self.session.execute, query)
+
+    async def _commit(self):
+        if self.is_async:
+            await self.session.commit()
+        else:
+            await run_in_threadpool(self.session.commit)
+
+    async def _rollback(self):
+        if self.is_async:
+            await self.session.rollback()
+        else:
+            await run_in_threadpool(self.session.rollback)
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """
+        Group several writes into a single transaction.
+        Objects registered with add() are flushed together and committed once when the block exits;
+        any error rolls the whole unit back. Constraint violations surface as IntegrityError on exit.
+
+        Usage:
+            async with sql_ops.unit_of_work():
+                user = sql_ops.add(user_data, model=Users)
+                sql_ops.add({"user": user, **metadata}, model=UserMetadata)
+        """
+        try:
+            yield self
+            await self._commit()
+        except BaseException:
+            await self._rollback()
+            raise
+
+    def add(self, data: dict, model):
+        """
+        Register a new record with the session without flushing or committing it.
+
+        :param data: The data of the record. Related objects can be passed through relationship attributes.
+        :param model: The model class of the record.
+        :return: The pending model instance.
+        """
+        each = model(**data)
+        self.session.add(each)
+        return each
+
+    @staticmethod
+    def is_unique_violation(error: IntegrityError, model, column: str) -> bool:
+        """
+        Check whether the IntegrityError was raised by a unique index or constraint on the given column.
+
+        :param error: The IntegrityError raised by the database.
+        :param model: The model class owning the column.
+        :param column: The name of the column.
+        :return: True if the error is a duplicate value of the column.
+        """
+        # psycopg2 exposes the constraint through diag, asyncpg on the exception wrapped by the adapter
+        diag = getattr(error.orig, "diag", None)
+        constraint = getattr(diag, "constraint_name", None) or getattr(error.orig.__cause__, "constraint_name", None)
+        table = model.__table__
+        unique_names = {index.name for index in table.indexes if index.unique and column in index.columns}
+        unique_names.update(
+            constraint_.name for constraint_ in table.constraints
+            if isinstance(constraint_, UniqueConstraint) and column in constraint_.columns
+        )
+        return constraint in unique_names
+
+    @staticmethod
+    def _build_filter(model, filter_condition):
+        """
+        Build a where clause from either a SQLAlchemy expression or a dictionary of column/value pairs.
+
+        :param model: The model class to which the filter belongs.
+        :param filter_condition: A SQLAlchemy expression or a dictionary of column names and values.
+        :return: The where clause.
+        """
+        if isinstance(filter_condition, dict):
+            return and_(*(model.__table__.c[column] == value for column, value in filter_condition.items()))
+        return filter_condition
+
     async def execute_query(self, query, first_result=False, json_result=False):
         """
         Execute a SQL query.
 
         :param query: The SQL query to execute.
         :param first_result: If True, return only the first result; otherwise, return all results.
-        :param json_result: If True, return the result as JSON; otherwise, return as a list of tuples.
+        :param json_result: If True, return the rows as JSON compatible dictionaries; otherwise, as rows.
         :return: The result of the executed query.
         """
+        result = await self._execute(query)
         if first_result:
-            result = self.session.execute(query).first()
+            result = result.first()
         else:
-            result = self.session.execute(query).all()
+            result = result.all()
 
         if json_result:
-            result =jsonable_encoder(result.mapping().all()) if hasattr(result, 'mapping') else jsonable_encoder(result.all())
+            if first_result:
+                result = jsonable_encoder(dict(result._mapping)) if result is not None else None
+            else:
+                result = jsonable_encoder([dict(row._mapping) for row in result])
         return result
 
-    async def insert_many(self, data: list, model):
+    async def stream_query(self, query, yield_per: int = None) -> AsyncIterator[dict]:
+        """
+        Execute a SQL query through a server side cursor and yield the rows one by one.
+        At most yield_per rows are buffered, however large the result is.
+
+        :param query: The SQL query to execute.
+        :param yield_per: Rows fetched per round trip, defaults to SQL_STREAM_YIELD_PER.
+        :return: An async iterator of row dictionaries.
+        """
+        query = query.execution_options(yield_per=yield_per or SQLConfig.SQL_STREAM_YIELD_PER)
+        if self.is_async:
+            result = await self.session.stream(query)
+            async for row in result.mappings():
+                yield dict(row)
+            return
+        result = await run_in_threadpool(self.session.execute, query)
+        partitions = result.mappings().partitions()
+        while partition := await run_in_threadpool(next, partitions, None):
+            for row in partition:
+                yield dict(row)
+
+    async def insert_many(self, data: Iterable[dict], model, chunk_size: int = None, returning: list = None,
+                          mode: str = "values", on_conflict_do_nothing: bool = False,
+                          commit: bool = True) -> "BulkInsertReport":
         """
-        Execute an insert SQL query.
+        Bulk insert rows without building ORM instances.
+
+        In "values" mode every chunk is sent as multi-row INSERT ... VALUES statements, optionally with
+        RETURNING. In "copy" mode rows are streamed with COPY FROM STDIN, which is the fastest path for
+        very large batches but cannot return rows or skip conflicts. Python side column defaults
+        (ids, timestamps) are applied in both modes. Only one chunk is materialised at a time.
 
-        :param data: The data to insert into the database. It can be a dictionary or a list of dictionaries.
+        :param data: The rows to insert, as an iterable of dictionaries keyed by column name.
         :param model: The model class to which the query belongs.
-        :return: The result of the executed insert query.
+        :param chunk_size: Rows per statement, defaults to SQL_BULK_CHUNK_SIZE.
+        :param returning: Columns to return for the inserted rows (values mode only).
+        :param mode: Either "values" or "copy".
+        :param on_conflict_do_nothing: Skip rows violating a unique constraint (values mode only).
+        :param commit: If False, leave the transaction open so further statements commit atomically with it.
+        :return: A BulkInsertReport with the row count, the throughput and the returned rows.
         """
-        final_result = []
-        for each in data:
-            each = model(**each)
-            final_result.append(each)
-            self.session.add(each)
-        self.session.commit()
-        return final_result
+        if mode not in ("values", "copy"):
+            raise ValueError("mode must be either 'values' or 'copy'")
+        if mode == "copy" and (returning or on_conflict_do_nothing):
+            raise ValueError("COPY does not support returning or on_conflict_do_nothing")
+        chunk_size = chunk_size or SQLConfig.SQL_BULK_CHUNK_SIZE
+        table = model.__table__
+        report = BulkInsertReport()
+        start = time.perf_counter()
+        rows = iter(data)
+        while chunk := list(itertools.islice(rows, chunk_size)):
+            if mode == "copy":
+                await self._copy_chunk(table, chunk)
+                report.rows += len(chunk)
+                continue
+            query = insert(table)
+            if on_conflict_do_nothing:
+                query = query.on_conflict_do_nothing()
+            if returning:
+                query = query.returning(*(table.c[column] for column in returning))
+            query = query.execution_options(insertmanyvalues_page_size=chunk_size)
+            if self.is_async:
+                result = await self.session.execute(query, chunk)
+            else:
+                result = await run_in_threadpool(self.session.execute, query, chunk)
+            if returning:
+                inserted = result.mappings().all()
+                report.returned.extend(inserted)
+                report.rows += len(inserted)
+            else:
+                report.rows += len(chunk) if result.rowcount is None or result.rowcount < 0 else result.rowcount
+        if commit:
+            await self._commit()
+        report.seconds = time.perf_counter() - start
+        return report
 
-    def insert_one(self, data: dict, model):
+    @staticmethod
+    def _with_defaults(table, chunk: list[dict]) -> tuple[list[str], list[tuple]]:
+        """
+        Turn a chunk of dictionaries into COPY records, filling python side column defaults.
+        """
+        columns = [
+            column.key for column in table.columns
+            if column.key in chunk[0] or (column.default is not None and not column.default.is_sequence)
+        ]
+        defaults = {
+            column.key: column.default for column in table.columns
+            if column.key in columns and column.default is not None
+        }
+        records = []
+        for row in chunk:
+            record = []
+            for column in columns:
+                if column in row:
+                    record.append(row[column])
+                elif defaults.get(column) is None:
+                    record.append(None)
+                elif defaults[column].is_callable:
+                    record.append(defaults[column].arg(None))
+                else:
+                    record.append(defaults[column].arg)
+            records.append(tuple(
+                json.dumps(value) if isinstance(value, (dict, list)) else value for value in record
+            ))
+        return columns, records
+
+    async def _copy_chunk(self, table, chunk: list[dict]):
+        columns, records = self._with_defaults(table, chunk)
+        connection = await self.session.connection() if self.is_async else self.session.connection()
+        if self.is_async:
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                table.name, records=records, columns=columns, schema_name=table.schema
+            )
+        else:
+            raw_connection = connection.connection.dbapi_connection
+            await run_in_threadpool(self._psycopg2_copy, raw_connection, table, columns, records)
+
+    @staticmethod
+    def _psycopg2_copy(raw_connection, table, columns: list[str], records: list[tuple]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record in records:
+            writer.writerow([r"\N" if value is None else value for value in record])
+        buffer.seek(0)
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table.fullname} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+            )
+
+    async def insert_one(self, data: dict, model):
         """
         Execute an insert SQL query for a single record.
 
@@ -57,24 +296,56 @@ class SQLOps:
         """
         each = model(**data)
         self.session.add(each)
-        self.session.commit()
+        await self._commit()
         return each
 
-    def update_query(self, data: dict, model, filter_condition):
+    async def update_query(self, data: dict, model, filter_condition, commit: bool = True, returning=None):
         """
         Execute an update SQL query.
 
         :param data: The data to update in the database.
         :param model: The model class to which the query belongs.
         :param filter_condition: The condition to filter the records to be updated.
-        :return: The result of the executed update query.
+        :param commit: If False, leave the transaction open so further statements commit atomically with it.
+        :param returning: Columns to return of every updated row.
+        :return: The result of the executed update query, the returned rows if returning is given.
+        """
+        query = model.__table__.update().where(self._build_filter(model, filter_condition)).values(data)
+        if returning is not None:
+            query = query.returning(*returning)
+        result = await self._execute(query)
+        if returning is not None:
+            result = result.all()
+        if commit:
+            await self._commit()
+        return result
+
+    async def execute_statement(self, query, commit: bool = True):
         """
-        query = model.__table__.update().where(filter_condition).values(data)
-        result = self.session.execute(query)
-        self.session.commit()
+        Execute a data modifying statement such as an upsert.
+
+        :param query: The statement to execute.
+        :param commit: If False, leave the transaction open so further statements commit atomically with it.
+        :return: The result of the executed statement.
+        """
+        result = await self._execute(query)
+        if commit:
+            await self._commit()
         return result
 
-    def delete_query(self, model, filter_condition):
+    async def commit(self):
+        """
+        Commit the current transaction.
+        """
+        await self._commit()
+
+    async def rollback(self):
+        """
+        Roll the current transaction back.
+        """
+        await self._rollback()
+
+    async def delete_query(self, model, filter_condition):
         """
         Execute a delete SQL query.
 
@@ -82,10 +353,7 @@ class SQLOps:
         :param filter_condition: The condition to filter the records to be deleted.
         :return: The result of the executed delete query.
         """
-        query = model.__table__.delete().where(filter_condition)
-        result = self.session.execute(query)
-        self.session.commit()
+        query = model.__table__.delete().where(self._build_filter(model, filter_condition))
+        result = await self._execute(query)
+        await self._commit()
         return result
-
-
-
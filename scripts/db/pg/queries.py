@@ -1,9 +1,43 @@
 import datetime
 
-from sqlalchemy import select
+from sqlalchemy import TIMESTAMP, String, any_, bindparam, column, delete, func, or_, select, text, tuple_, update, values
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
 from sqlalchemy.orm import joinedload
 
-from scripts.db.pg.sql_schemas import Users, UserMetadata
+from scripts.db.pg.sql_schemas import Roles, Users, UserMetadata, EmailOutbox, RevokedTokens, UserSessions
+
+
+# Columns of a user that may leave the service: no password hash and no verification/reset tokens
+USER_EXPORT_COLUMNS = (
+    Users.id,
+    Users.email,
+    Users.first_name,
+    Users.last_name,
+    Users.is_active,
+    Users.role,
+    Users.created_at,
+    Users.updated_at,
+    UserMetadata.email_verified,
+    UserMetadata.phone_number,
+    UserMetadata.address,
+    UserMetadata.locked_until,
+    UserMetadata.profile_picture,
+)
+
+ROLE_COLUMNS = (
+    Roles.id,
+    Roles.name,
+    Roles.description,
+    Roles.is_active,
+    Roles.permissions,
+    Roles.created_at,
+    Roles.updated_at,
+)
+
+
+def _like_pattern(term: str, mode: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if mode == "prefix" else f"%{escaped}%"
 
 
 class SQLQueries:
@@ -25,11 +59,6 @@ class SQLQueries:
         query = select(Users).options(joinedload(Users.user_metadata)).join(UserMetadata, UserMetadata.user_id==Users.id).filter((Users.email == email))
         return query
 
-    @staticmethod
-    def get_user_metadata_by_reset_token(reset_token:str):
-        now = datetime.datetime.now(datetime.timezone.utc)
-        return select(UserMetadata).options(joinedload(UserMetadata.user)).join(Users, Users.id == UserMetadata.user_id).filter(UserMetadata.reset_password_token == reset_token, UserMetadata.reset_password_expires_at<now)
-
     @staticmethod
     def get_user_by_id(user_id):
         query = select(Users).options(joinedload(
@@ -38,13 +67,543 @@ class SQLQueries:
         return query
 
     @staticmethod
-    def get_user_metadata_by_verification_token(verification_token: str):
+    def get_users_by_ids(user_ids: list):
+        """
+        SQL query to get many users with their metadata by id.
+        The ids are bound as one array parameter (id = ANY(:user_ids)), so the statement is the same
+        whatever the number of ids.
+
+        :arg.
+            user_ids (list): The ids of the users.
+        :return:
+            select: SQLAlchemy select query of the users.
+        """
+        ids = bindparam("user_ids", user_ids, type_=ARRAY(UUID(as_uuid=True)))
+        return select(Users).options(joinedload(Users.user_metadata)).where(Users.id == any_(ids))
+
+    @staticmethod
+    def get_users_by_emails(emails: list[str]):
+        """
+        SQL query to get many users with their metadata by email, as email = ANY(:emails).
+
+        :arg.
+            emails (list): The emails of the users.
+        :return:
+            select: SQLAlchemy select query of the users.
+        """
+        bound = bindparam("emails", emails, type_=ARRAY(String))
+        return select(Users).options(joinedload(Users.user_metadata)).where(Users.email == any_(bound))
+
+    @staticmethod
+    def get_user_version(user_id):
+        """
+        SQL query to get only the updated_at of a user and of its metadata, for conditional requests.
+
+        :arg.
+            user_id: The id of the user.
+        :return:
+            select: SQLAlchemy select query of (id, updated_at, metadata_updated_at).
+        """
+        return (
+            select(Users.id, Users.updated_at, UserMetadata.updated_at.label("metadata_updated_at"))
+            .outerjoin(UserMetadata, UserMetadata.user_id == Users.id)
+            .where(Users.id == user_id)
+        )
+
+    @staticmethod
+    def get_user_tokens(user_id):
+        """
+        SQL query to get the stored token hashes of a user by primary key, for checking the
+        verification and reset tokens.
+
+        :arg.
+            user_id: The id of the user, taken from the claims of the token.
+        :return:
+            select: SQLAlchemy select query of the token hash columns.
+        """
+        return select(
+            UserMetadata.user_id,
+            UserMetadata.email_verification_token,
+            UserMetadata.reset_password_token,
+            UserMetadata.reset_password_expires_at,
+        ).where(UserMetadata.user_id == user_id)
+
+    @staticmethod
+    def consume_reset_token(user_id, token_hash: str):
+        """
+        SQL statement to consume the reset token of a user: the stored hash and expiry are cleared, but
+        only while they still match the presented token and it has not expired, so a token resets the
+        password at most once.
+
+        :arg.
+            user_id: The id of the user from the claims of the token.
+            token_hash (str): The SHA-256 of the presented token.
+        :return:
+            update: SQLAlchemy update statement returning the user_id, no row if the token is not valid.
+        """
+        return (
+            update(UserMetadata)
+            .where(
+                UserMetadata.user_id == user_id,
+                UserMetadata.reset_password_token == token_hash,
+                UserMetadata.reset_password_expires_at > func.now(),
+            )
+            .values(reset_password_token=None, reset_password_expires_at=None)
+            .returning(UserMetadata.user_id)
+        )
+
+    @staticmethod
+    def enqueue_email(template: str, to_email: str, payload: dict):
+        """
+        SQL statement to add an email to the outbox.
+        A pending email for the same template and recipient is replaced instead of duplicated,
+        so the recipient only receives the latest link.
+
+        :arg.
+            template (str): The name of the email handler rendering the message.
+            to_email (str): The recipient.
+            payload (dict): The arguments for rendering the message.
+        :return:
+            insert: SQLAlchemy upsert statement.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        query = insert(EmailOutbox).values(
+            template=template,
+            to_email=to_email,
+            payload=payload,
+            dedup_key=f"{template}:{to_email.lower()}",
+            next_attempt_at=now,
+        )
+        return query.on_conflict_do_update(
+            index_elements=[EmailOutbox.dedup_key],
+            index_where=text("status = 'pending'"),
+            set_={
+                "payload": query.excluded.payload,
+                "attempts": 0,
+                "next_attempt_at": now,
+                "last_error": None,
+                "updated_at": now,
+            },
+        )
+
+    @staticmethod
+    def revoke_tokens(user_id, expires_at: datetime.datetime, jti: str = None,
+                      revoked_before: datetime.datetime = None):
+        """
+        SQL statement to revoke one access token (jti) or every access token of a user issued up to revoked_before.
+
+        :arg.
+            user_id: The id of the user owning the tokens.
+            expires_at (datetime): When every revoked token has expired and the row can be purged.
+            jti (str): The id of the single token to revoke.
+            revoked_before (datetime): Revoke the tokens of the user issued up to this time.
+        :return:
+            insert: SQLAlchemy insert statement.
+        """
+        return insert(RevokedTokens).values(user_id=user_id, jti=jti, revoked_before=revoked_before,
+                                            expires_at=expires_at)
+
+    @staticmethod
+    def get_revocations(since: datetime.datetime | None):
+        """
+        SQL query to get the unexpired revocations created after a watermark.
+
+        :arg.
+            since (datetime): The watermark, None for a full load.
+        :return:
+            select: SQLAlchemy select query of the revocations.
+        """
+        query = select(
+            RevokedTokens.jti, RevokedTokens.user_id, RevokedTokens.revoked_before,
+            RevokedTokens.expires_at, RevokedTokens.created_at,
+        ).where(RevokedTokens.expires_at > func.now())
+        if since is not None:
+            query = query.where(RevokedTokens.created_at > since)
+        return query
+
+    @staticmethod
+    def purge_revocations():
+        """
+        SQL statement to delete the revocations whose tokens have all expired.
+        """
+        return delete(RevokedTokens).where(RevokedTokens.expires_at <= func.now())
+
+    @staticmethod
+    def create_session(session_id, user_id, token_hash: str, expires_at: datetime.datetime):
+        """
+        SQL statement to open a login session with the hash of its first refresh token.
+
+        :arg.
+            session_id: The id of the session, part of its refresh tokens.
+            user_id: The id of the user.
+            token_hash (str): The SHA-256 of the refresh token.
+            expires_at (datetime): When the session ends.
+        :return:
+            insert: SQLAlchemy insert statement.
+        """
+        return insert(UserSessions).values(id=session_id, user_id=user_id, token_hash=token_hash,
+                                           generation=0, expires_at=expires_at)
+
+    @staticmethod
+    def rotate_session(session_id, generation: int, token_hash: str, new_token_hash: str):
+        """
+        SQL statement to rotate the refresh token of a session as a compare-and-set: only a live session
+        of an active user, still at the generation and token hash presented, is moved to the next one.
+        The user's email and role for the new access token come back with the same statement.
+
+        :arg.
+            session_id: The id of the session.
+            generation (int): The generation of the presented refresh token.
+            token_hash (str): The SHA-256 of the presented refresh token.
+            new_token_hash (str): The SHA-256 of the refresh token replacing it.
+        :return:
+            update: SQLAlchemy update statement returning user_id, email, role and expires_at.
+        """
+        return (
+            update(UserSessions)
+            .where(
+                UserSessions.id == session_id,
+                UserSessions.generation == generation,
+                UserSessions.token_hash == token_hash,
+                UserSessions.revoked_at.is_(None),
+                UserSessions.expires_at > func.now(),
+                Users.id == UserSessions.user_id,
+                Users.is_active.is_(True),
+            )
+            .values(token_hash=new_token_hash, generation=generation + 1, last_seen_at=func.now())
+            .returning(UserSessions.user_id, Users.email, Users.role, UserSessions.expires_at)
+        )
+
+    @staticmethod
+    def get_session(session_id):
+        """
+        SQL query to get the state of a session, to tell why a refresh was refused.
+
+        :arg.
+            session_id: The id of the session.
+        :return:
+            select: SQLAlchemy select query of user_id, generation, revoked_at and expires_at.
+        """
+        return select(
+            UserSessions.user_id, UserSessions.generation, UserSessions.revoked_at, UserSessions.expires_at,
+        ).where(UserSessions.id == session_id)
+
+    @staticmethod
+    def revoke_sessions(user_id=None, session_id=None):
+        """
+        SQL statement to revoke one session, or every live session of a user.
+
+        :arg.
+            user_id: The id of the user whose sessions to revoke.
+            session_id: The id of the single session to revoke.
+        :return:
+            update: SQLAlchemy update statement returning the ids of the revoked sessions.
+        """
+        query = update(UserSessions).where(UserSessions.revoked_at.is_(None))
+        if session_id is not None:
+            query = query.where(UserSessions.id == session_id)
+        if user_id is not None:
+            query = query.where(UserSessions.user_id == user_id)
+        return query.values(revoked_at=func.now()).returning(UserSessions.id)
+
+    @staticmethod
+    def touch_sessions(last_seen: dict):
+        """
+        SQL statement to write the last_seen_at of many sessions at once, as a single UPDATE joined
+        to a VALUES list. A last_seen_at is never moved backwards.
+
+        :arg.
+            last_seen (dict): The last activity of every session, by session id.
+        :return:
+            update: SQLAlchemy update statement.
+        """
+        seen = values(
+            column("id", UUID(as_uuid=True)), column("last_seen_at", TIMESTAMP(timezone=True)), name="seen",
+        ).data(list(last_seen.items()))
+        return (
+            update(UserSessions)
+            .where(UserSessions.id == seen.c.id, UserSessions.last_seen_at < seen.c.last_seen_at)
+            .values(last_seen_at=seen.c.last_seen_at)
+        )
+
+    @staticmethod
+    def purge_sessions():
+        """
+        SQL statement to delete the expired and the revoked sessions.
+        """
+        return delete(UserSessions).where(or_(UserSessions.expires_at <= func.now(),
+                                              UserSessions.revoked_at.is_not(None)))
+
+    @staticmethod
+    def get_role_versions():
+        """
+        SQL query to get the version (updated_at) of every active role, for syncing the compiled permissions.
+
+        :return:
+            select: SQLAlchemy select query of (id, updated_at).
+        """
+        return select(Roles.id, Roles.updated_at).where(Roles.is_active.is_(True))
+
+    @staticmethod
+    def get_role_permissions(role_ids: list):
+        """
+        SQL query to get the permissions of the roles to compile.
+
+        :arg.
+            role_ids (list): The ids of the roles.
+        :return:
+            select: SQLAlchemy select query of (id, updated_at, is_active, permissions).
+        """
+        return select(Roles.id, Roles.updated_at, Roles.is_active, Roles.permissions).where(Roles.id.in_(role_ids))
+
+    @staticmethod
+    def list_roles():
+        """
+        SQL query to get every role by name.
+        """
+        return select(*ROLE_COLUMNS).order_by(Roles.name)
+
+    @staticmethod
+    def get_existing_roles(role_ids: list):
+        """
+        SQL query to find which of the given role ids exist.
+
+        :arg.
+            role_ids (list): The role ids to check.
+        :return:
+            select: SQLAlchemy select query of the existing role ids.
+        """
+        return select(Roles.id).where(Roles.id.in_(role_ids))
+
+    @staticmethod
+    def get_role(role_id):
+        """
+        SQL query to get a role by id.
+
+        :arg.
+            role_id: The id of the role.
+        :return:
+            select: SQLAlchemy select query of the role columns.
+        """
+        return select(*ROLE_COLUMNS).where(Roles.id == role_id)
+
+    @staticmethod
+    def create_role(role_data: dict):
+        """
+        SQL statement to insert a role, returning it. A duplicate name raises IntegrityError.
+
+        :arg.
+            role_data (dict): The name, description, is_active and permissions of the role.
+        :return:
+            insert: SQLAlchemy insert statement returning the role columns.
+        """
+        return insert(Roles).values(**role_data).returning(*ROLE_COLUMNS)
+
+    @staticmethod
+    def update_role(role_id, role_data: dict):
+        """
+        SQL statement to update the fields given of a role, returning it. updated_at always changes,
+        which is what invalidates the compiled permissions of the role in every process.
+
+        :arg.
+            role_id: The id of the role.
+            role_data (dict): The fields to update.
+        :return:
+            update: SQLAlchemy update statement returning the role columns.
+        """
+        return (
+            update(Roles)
+            .where(Roles.id == role_id)
+            .values(**role_data, updated_at=func.now())
+            .returning(*ROLE_COLUMNS)
+        )
+
+    @staticmethod
+    def upsert_role(name: str, permissions: dict, description: str = None):
+        """
+        SQL statement to create a role or replace the permissions of the role with the same name.
+
+        :arg.
+            name (str): The name of the role.
+            permissions (dict): The permissions JSON of the role.
+            description (str): The description of a created role.
+        :return:
+            insert: SQLAlchemy upsert statement returning the role columns.
+        """
+        query = insert(Roles).values(name=name, description=description, permissions=permissions, is_active=True)
+        return query.on_conflict_do_update(
+            index_elements=[Roles.name],
+            set_={"permissions": query.excluded.permissions, "is_active": True, "updated_at": func.now()},
+        ).returning(*ROLE_COLUMNS)
+
+    @staticmethod
+    def delete_role(role_id):
+        """
+        SQL statement to delete a role; the users of the role are left without a role.
+
+        :arg.
+            role_id: The id of the role.
+        :return:
+            delete: SQLAlchemy delete statement returning the id of the deleted role.
+        """
+        return delete(Roles).where(Roles.id == role_id).returning(Roles.id)
+
+    @staticmethod
+    def claim_emails(batch_size: int, lease_until: datetime.datetime):
+        """
+        SQL statement to claim a batch of due outbox emails.
+        The claimed rows turn to sending with next_attempt_at holding the end of their lease, so the
+        claim can be committed before delivery; a sending row whose lease expired, e.g. because its
+        dispatcher died, is due again. Rows locked by another dispatcher are skipped so several
+        dispatchers can drain concurrently.
+
+        :arg.
+            batch_size (int): The maximum number of emails to claim.
+            lease_until (datetime): Until when the claim holds.
+        :return:
+            update: SQLAlchemy update statement returning the claimed emails.
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        due = (
+            select(EmailOutbox.id)
+            .filter(EmailOutbox.status.in_(("pending", "sending")), EmailOutbox.next_attempt_at <= now)
+            .order_by(EmailOutbox.next_attempt_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        return (
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(due.scalar_subquery()))
+            .values(status="sending", next_attempt_at=lease_until, updated_at=now)
+            .returning(EmailOutbox)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def get_pending_dedup_keys(dedup_keys: list[str]):
+        """
+        SQL query to find which of the given template/recipient keys have a pending email.
+
+        :arg.
+            dedup_keys (list): The dedup keys to check.
+        :return:
+            select: SQLAlchemy select query of the pending dedup keys.
+        """
+        return select(EmailOutbox.dedup_key).filter(EmailOutbox.status == "pending",
+                                                    EmailOutbox.dedup_key.in_(dedup_keys))
+
+
+    @staticmethod
+    def export_users(after: tuple | None, limit: int):
+        """
+        SQL query for one keyset page of the user export, ordered by (created_at, id).
+
+        :arg.
+            after (tuple): The (created_at, id) of the last exported user, None for the first page.
+            limit (int): The page size.
+        :return:
+            select: SQLAlchemy select query of the export columns.
+        """
+        query = select(
+            *(column.label(column.key) for column in USER_EXPORT_COLUMNS)
+        ).outerjoin(UserMetadata, UserMetadata.user_id == Users.id)
+        if after is not None:
+            query = query.filter(tuple_(Users.created_at, Users.id) > tuple_(*after))
+        return query.order_by(Users.created_at, Users.id).limit(limit)
+
+    @staticmethod
+    def list_users(filters, after: tuple | None, limit: int):
+        """
+        SQL query for one keyset page of users, newest first, ordered by (created_at, id).
+        Name and email search uses ILIKE, served by the pg_trgm GIN indexes for both prefix
+        and substring patterns.
+
+        :arg.
+            filters (UserListQuery): The filters and search term.
+            after (tuple): The (created_at, id) of the last user of the previous page, None for the first page.
+            limit (int): The number of users to return.
+        :return:
+            select: SQLAlchemy select query of the export columns.
+        """
+        query = select(
+            *(column.label(column.key) for column in USER_EXPORT_COLUMNS)
+        ).outerjoin(UserMetadata, UserMetadata.user_id == Users.id)
+        if filters.is_active is not None:
+            query = query.filter(Users.is_active == filters.is_active)
+        if filters.role is not None:
+            query = query.filter(Users.role == filters.role)
+        if filters.email_verified is not None:
+            query = query.filter(UserMetadata.email_verified == filters.email_verified)
+        if filters.created_from is not None:
+            query = query.filter(Users.created_at >= filters.created_from)
+        if filters.created_to is not None:
+            query = query.filter(Users.created_at < filters.created_to)
+        if filters.search:
+            pattern = _like_pattern(filters.search, filters.search_mode)
+            query = query.filter(or_(
+                Users.first_name.ilike(pattern, escape="\\"),
+                Users.last_name.ilike(pattern, escape="\\"),
+                Users.email.ilike(pattern, escape="\\"),
+            ))
+        if after is not None:
+            query = query.filter(tuple_(Users.created_at, Users.id) < tuple_(*after))
+        return query.order_by(Users.created_at.desc(), Users.id.desc()).limit(limit)
+
+    @staticmethod
+    def index_usage(schema: str = "public"):
+        """
+        SQL query reporting scans, size and definition of every index of the schema,
+        from pg_stat_user_indexes (counters since the last statistics reset).
+
+        :arg.
+            schema (str): The schema to audit.
+        :return:
+            text: SQLAlchemy text query.
+        """
+        return text("""
+            SELECT s.relname AS table_name,
+                   s.indexrelname AS index_name,
+                   s.idx_scan AS scans,
+                   s.idx_tup_read AS tuples_read,
+                   pg_relation_size(s.indexrelid) AS size_bytes,
+                   i.indisunique AS is_unique,
+                   i.indisprimary AS is_primary,
+                   am.amname AS method,
+                   i.indpred IS NOT NULL AS is_partial,
+                   ARRAY(
+                       SELECT a.attname FROM unnest(i.indkey) WITH ORDINALITY AS k(attnum, position)
+                       JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                       ORDER BY k.position
+                   ) AS columns,
+                   pg_get_indexdef(s.indexrelid) AS definition
+            FROM pg_stat_user_indexes s
+            JOIN pg_index i ON i.indexrelid = s.indexrelid
+            JOIN pg_class c ON c.oid = s.indexrelid
+            JOIN pg_am am ON am.oid = c.relam
+            WHERE s.schemaname = :schema
+            ORDER BY s.relname, s.indexrelname
+        """).bindparams(schema=schema)
+
+    @staticmethod
+    def table_write_stats(schema: str = "public"):
         """
-        SQL query to get user metadata by verification token.
+        SQL query reporting the row writes and index count of every table of the schema.
 
         :arg.
-            verification_token (str): The verification token to filter user metadata.
+            schema (str): The schema to audit.
         :return:
-            select: SQLAlchemy select query to get user metadata.
+            text: SQLAlchemy text query.
         """
-        return select(UserMetadata).options(joinedload(UserMetadata.user)).filter(UserMetadata.email_verification_token == verification_token)
+        return text("""
+            SELECT t.relname AS table_name,
+                   t.n_tup_ins AS inserts,
+                   t.n_tup_upd AS updates,
+                   t.n_tup_hot_upd AS hot_updates,
+                   t.n_tup_del AS deletes,
+                   pg_relation_size(t.relid) AS table_bytes,
+                   pg_indexes_size(t.relid) AS index_bytes,
+                   (SELECT count(*) FROM pg_index i WHERE i.indrelid = t.relid) AS index_count
+            FROM pg_stat_user_tables t
+            WHERE t.schemaname = :schema
+            ORDER BY t.relname
+        """).bindparams(schema=schema)
@@ -1,11 +1,23 @@
+import ast
 import datetime
-from typing import Generator
+import logging
+import time
+from pathlib import Path
+from typing import AsyncGenerator, Generator
 
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker, Session
-from sqlalchemy import TIMESTAMP, MetaData, create_engine
-from sqlalchemy_utils import create_database, database_exists
+from sqlalchemy import TIMESTAMP, create_engine, text
+from sqlalchemy.exc import ProgrammingError
+from starlette.concurrency import run_in_threadpool
 
 from scripts.config import SQLConfig
+from scripts.utils.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
 
 
 class Base(DeclarativeBase):
@@ -20,21 +32,85 @@ class SessionUtil:
     def __init__(self):
         self.user_engines = {}
         self.sessionmakers = {}
+        self.async_engines = {}
+        self.async_sessionmakers = {}
+        self.checkout_wait = metrics_registry.latency("sql_pool_checkout_wait")
+        metrics_registry.register_gauge("sql_pool", self.pool_status)
 
-    def get_session(self, database: str = SQLConfig.SQL_DATABASE, metadata: MetaData = None) -> Generator[Session, None, None]:
-        self._get_engine(database=database, metadata=metadata)
+    def get_session(self, database: str = SQLConfig.SQL_DATABASE) -> Generator[Session, None, None]:
+        self._get_engine(database=database)
         sessionmaker_ = self.sessionmakers[database]
         with sessionmaker_() as session:
+            start = time.perf_counter()
+            session.connection()
+            self._record_checkout(self.user_engines[database], time.perf_counter() - start)
+            yield session
+
+    async def get_async_session(self, database: str = SQLConfig.SQL_DATABASE) -> AsyncGenerator[AsyncSession, None]:
+        self._get_async_engine(database=database)
+        sessionmaker_ = self.async_sessionmakers[database]
+        async with sessionmaker_() as session:
+            start = time.perf_counter()
+            await session.connection()
+            self._record_checkout(self.async_engines[database], time.perf_counter() - start)
             yield session
 
-    def _get_engine(self, database: str = SQLConfig.SQL_DATABASE, metadata: MetaData = None):
+    def _record_checkout(self, engine, waited: float):
+        """
+        Record how long a session waited to check a connection out of the pool.
+        Checkouts slower than SQL_SLOW_CHECKOUT_MS are logged together with the pool status.
+        """
+        self.checkout_wait.observe(waited)
+        if waited * 1000 >= SQLConfig.SQL_SLOW_CHECKOUT_MS:
+            logger.warning("Slow SQL pool checkout: %.1f ms (%s)", waited * 1000, engine.pool.status())
+
+    def pool_status(self) -> dict:
+        """
+        Current checked out, idle and overflow connection counts for every engine.
+
+        :return: A dictionary keyed by engine kind and database name.
+        """
+        status = {}
+        for kind, engines in (("sync", self.user_engines), ("async", self.async_engines)):
+            for database, engine in engines.items():
+                pool = engine.pool
+                status[f"{kind}:{database}"] = {
+                    "size": pool.size(),
+                    "checked_out": pool.checkedout(),
+                    "idle": pool.checkedin(),
+                    "overflow": max(pool.overflow(), 0),
+                    "max_overflow": SQLConfig.SQL_MAX_OVERFLOW,
+                }
+        return status
+
+    @staticmethod
+    def _pool_options() -> dict:
+        return {
+            "pool_size": SQLConfig.SQL_POOL_SIZE,
+            "max_overflow": SQLConfig.SQL_MAX_OVERFLOW,
+            "pool_recycle": SQLConfig.SQL_POOL_RECYCLE,
+            "pool_pre_ping": SQLConfig.SQL_POOL_PRE_PING,
+            "pool_timeout": SQLConfig.SQL_POOL_TIMEOUT,
+        }
+
+    @staticmethod
+    def get_url(database: str, drivername: str = None):
+        url = make_url(f"{SQLConfig.SQL_URL}/{database}")
+        if drivername:
+            url = url.set(drivername=drivername)
+        return url
+
+    def _get_engine(self, database: str = SQLConfig.SQL_DATABASE):
+        """
+        Build the engine of the database on first use. The schema is managed by the Alembic
+        migrations, so no DDL or catalog introspection happens here.
+        """
         if database not in self.user_engines:
             engine = create_engine(
-                f"{SQLConfig.SQL_URL}/{SQLConfig.SQL_DATABASE}",
-                connect_args={"connect_timeout": 10000},
-                pool_size=1,
-                pool_pre_ping=True,
+                self.get_url(database=database),
+                connect_args={"connect_timeout": SQLConfig.SQL_CONNECT_TIMEOUT},
                 future=True,
+                **self._pool_options(),
             )
             self.user_engines[database] = engine
 
@@ -44,23 +120,133 @@ class SessionUtil:
                 autocommit=False,
                 autoflush=False,
             )
+        return self.user_engines[database]
 
-            self.create_default_dependencies(
-                _engine=self.user_engines[database],
-                metadata=metadata or Base.metadata
+    def _get_async_engine(self, database: str = SQLConfig.SQL_DATABASE) -> AsyncEngine:
+        if database not in self.async_engines:
+            engine = create_async_engine(
+                self.get_url(database=database, drivername=SQLConfig.SQL_ASYNC_DRIVER),
+                connect_args={"timeout": SQLConfig.SQL_CONNECT_TIMEOUT},
+                **self._pool_options(),
             )
-        return self.user_engines[database]
+            self.async_engines[database] = engine
 
-    @staticmethod
-    def create_default_dependencies(_engine, metadata: MetaData):
-        # if not database_exists(str(_engine.url)):
-        #     create_database(str(_engine.url))
+            self.async_sessionmakers[database] = async_sessionmaker(
+                bind=engine,
+                expire_on_commit=False,
+                autoflush=False,
+            )
+        return self.async_engines[database]
+
+    def reset_after_fork(self):
+        """
+        Drop the engines inherited from the parent process, so a forked worker never shares
+        pooled connections with its parent or siblings. Engines are rebuilt on first use.
+        """
+        for engine in self.user_engines.values():
+            engine.dispose(close=False)
+        self.user_engines.clear()
+        self.sessionmakers.clear()
+        self.async_engines.clear()
+        self.async_sessionmakers.clear()
+
+    async def check_schema_version(self, database: str = SQLConfig.SQL_DATABASE) -> bool:
+        """
+        Compare the migration revision of the database with the head revision shipped with the code.
+        A single primary key lookup on alembic_version, meant to run once at startup.
+        Depending on SQL_SCHEMA_CHECK a mismatch is logged (warn) or raised (fail).
+
+        :param database: The database to check.
+        :return: True if the database is at the head revision.
+        """
+        if SQLConfig.SQL_SCHEMA_CHECK == "off":
+            return True
+        heads = migration_heads()
+        query = text("SELECT version_num FROM alembic_version")
+        try:
+            if SQLConfig.SQL_ASYNC_ENABLED:
+                async with self._get_async_engine(database=database).connect() as connection:
+                    current = set((await connection.execute(query)).scalars())
+            else:
+                current = await run_in_threadpool(self._read_schema_version, database, query)
+        except ProgrammingError:
+            current = set()
+        if current == heads:
+            return True
+        message = (f"Database {database} is at schema revision {', '.join(sorted(current)) or 'none'}, "
+                   f"expected {', '.join(sorted(heads))}. Run `alembic upgrade head`.")
+        if SQLConfig.SQL_SCHEMA_CHECK == "fail":
+            raise RuntimeError(message)
+        logger.warning(message)
+        return False
+
+    async def warm_up(self, database: str = SQLConfig.SQL_DATABASE):
+        """
+        Build the engine and open one pooled connection ahead of the first request,
+        e.g. during the Lambda init phase.
+
+        :param database: The database to connect to.
+        """
+        query = text("SELECT 1")
+        if SQLConfig.SQL_ASYNC_ENABLED:
+            async with self._get_async_engine(database=database).connect() as connection:
+                await connection.execute(query)
+        else:
+            await run_in_threadpool(self._ping, database, query)
+
+    def _read_schema_version(self, database: str, query) -> set[str]:
+        with self._get_engine(database=database).connect() as connection:
+            return set(connection.execute(query).scalars())
+
+    def _ping(self, database: str, query):
+        with self._get_engine(database=database).connect() as connection:
+            connection.execute(query)
+
+
+def migration_heads() -> set[str]:
+    """
+    Head revisions of the Alembic migrations, read from the revision files with ast so the
+    service does not import Alembic at runtime.
 
-        metadata.create_all(_engine, checkfirst=True)
+    :return: The revisions no other revision builds on.
+    """
+    revisions, parents = set(), set()
+    for path in (MIGRATIONS_DIR / "versions").glob("*.py"):
+        for node in ast.parse(path.read_text()).body:
+            if isinstance(node, ast.AnnAssign):
+                target = node.target
+            elif isinstance(node, ast.Assign):
+                target = node.targets[0]
+            else:
+                continue
+            if not isinstance(target, ast.Name) or node.value is None:
+                continue
+            if target.id == "revision":
+                revisions.add(ast.literal_eval(node.value))
+            elif target.id == "down_revision":
+                down_revision = ast.literal_eval(node.value)
+                parents.update(down_revision if isinstance(down_revision, (tuple, list)) else [down_revision])
+    return revisions - parents
 
 
 session_util = SessionUtil()
 
 # Dependency for FastAPI
-def get_db() -> Generator[Session, None, None]:
-    yield from session_util.get_session()
+async def get_db() -> AsyncGenerator[AsyncSession | Session, None]:
+    """
+    Yield a database session for the request.
+
+    An asyncpg backed AsyncSession is used by default so that database I/O does not block the event loop.
+    Setting SQL_ASYNC_ENABLED to false falls back to the synchronous psycopg2 session, whose engine
+    setup, connection checkout and close run in the thread pool like its queries.
+    """
+    if SQLConfig.SQL_ASYNC_ENABLED:
+        async for session in session_util.get_async_session():
+            yield session
+    else:
+        sessions = session_util.get_session()
+        session = await run_in_threadpool(next, sessions)
+        try:
+            yield session
+        finally:
+            await run_in_threadpool(sessions.close)
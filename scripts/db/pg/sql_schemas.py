@@ -1,10 +1,14 @@
 import datetime
 import uuid
-from sqlalchemy import ForeignKey, Index
+from sqlalchemy import DDL, ForeignKey, Index, event, func
 from sqlalchemy.orm import Mapped, MappedColumn, relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from scripts.db.pg.sessions import Base
 
+# The trigram GIN indexes on users need pg_trgm (a trusted extension since PostgreSQL 13).
+# Deployed databases get it from the migrations, this covers metadata.create_all on scratch databases.
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 
 class Roles(Base):
     __tablename__ = "roles"
@@ -14,24 +18,19 @@ class Roles(Base):
     )
     name: Mapped[str] = MappedColumn(nullable=False, unique=True, index=True)
     description: Mapped[str] = MappedColumn(nullable=True)
-    is_active: Mapped[bool] = MappedColumn(default=True, nullable=False, index=True)
+    is_active: Mapped[bool] = MappedColumn(default=True, nullable=False)
     permissions: Mapped[JSONB] = MappedColumn(
-        JSONB, nullable=True, default=dict, index=True
+        JSONB, nullable=True, default=dict
     )
-    created_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False, index=True)
+    created_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False)
     updated_at: Mapped[datetime.datetime] = MappedColumn(
         default=datetime.datetime.utcnow,
         onupdate=datetime.datetime.utcnow,
         nullable=False,
-        index=True,
     )
     users = relationship("Users", back_populates="role_obj")
-    idx_all = Index(
-        "idx_role_all",
-        id,
-        name,
-        postgresql_using="btree",
-    )
+    # Containment and key existence lookups on permissions
+    idx_permissions = Index("idx_roles_permissions_gin", permissions, postgresql_using="gin")
 
 
 class Users(Base):
@@ -41,22 +40,21 @@ class Users(Base):
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False
     )
     email: Mapped[str] = MappedColumn(nullable=False, unique=True, index=True)
-    first_name: Mapped[str] = MappedColumn(nullable=False, index=True)
-    last_name: Mapped[str] = MappedColumn(nullable=False, index=True)
+    first_name: Mapped[str] = MappedColumn(nullable=False)
+    last_name: Mapped[str] = MappedColumn(nullable=False)
     password: Mapped[str] = MappedColumn(nullable=False)  # Removed index
-    is_active: Mapped[bool] = MappedColumn(default=True, nullable=False, index=True)
+    is_active: Mapped[bool] = MappedColumn(default=True, nullable=False)
     role: Mapped[uuid.UUID] = MappedColumn(
         UUID(as_uuid=True),
         ForeignKey("roles.id", ondelete="SET NULL"),
         nullable=True,
         index=True,
     )
-    created_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False, index=True
+    created_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False
     )
     updated_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow,
         onupdate=datetime.datetime.utcnow,
         nullable=False,
-        index=True,
     )
     role_obj = relationship("Roles", back_populates="users")
     user_metadata = relationship(
@@ -65,13 +63,20 @@ class Users(Base):
     user_audit = relationship(
         "UserAudit", back_populates="user", cascade="all, delete-orphan"
     )
-    idx_all = Index(
-        "idx_user_all",
-        id,
-        email,
-        first_name,
-        last_name,
-        postgresql_using="btree",
+    # Keyset pagination of the user listing and export
+    idx_created_id = Index("idx_users_created_at_id", created_at, id)
+    # Prefix and substring ILIKE search
+    idx_first_name_trgm = Index(
+        "idx_users_first_name_trgm", first_name,
+        postgresql_using="gin", postgresql_ops={"first_name": "gin_trgm_ops"},
+    )
+    idx_last_name_trgm = Index(
+        "idx_users_last_name_trgm", last_name,
+        postgresql_using="gin", postgresql_ops={"last_name": "gin_trgm_ops"},
+    )
+    idx_email_trgm = Index(
+        "idx_users_email_trgm", email,
+        postgresql_using="gin", postgresql_ops={"email": "gin_trgm_ops"},
     )
 
 class UserAudit(Base):
@@ -84,20 +89,14 @@ class UserAudit(Base):
         UUID(as_uuid=True),
         ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
-    action: Mapped[str] = MappedColumn(nullable=False, index=True)
-    timestamp: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False, index=True
+    action: Mapped[str] = MappedColumn(nullable=False)
+    timestamp: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False
     )
     user = relationship("Users", back_populates="user_audit")
 
-    idx_all = Index(
-        "idx_user_audit_all",
-        id,
-        user_id,
-        action,
-        postgresql_using="btree",
-    )
+    # Audit trail of a user in time order, also serves the foreign key
+    idx_user_timestamp = Index("idx_user_audit_user_id_timestamp", user_id, timestamp)
 
 class UserMetadata(Base):
     __tablename__ = "user_metadata"
@@ -112,36 +111,112 @@ class UserMetadata(Base):
         index=True,
     )
     email_verified: Mapped[bool] = MappedColumn(
-        default=False, nullable=False, index=True
+        default=False, nullable=False
     )
-    phone_number: Mapped[str] = MappedColumn(nullable=True, index=True)
-    address: Mapped[str] = MappedColumn(nullable=True, index=True)
-    locked_until: Mapped[datetime.datetime] = MappedColumn(nullable=True, index=True
+    phone_number: Mapped[str] = MappedColumn(nullable=True)
+    address: Mapped[str] = MappedColumn(nullable=True)
+    locked_until: Mapped[datetime.datetime] = MappedColumn(nullable=True
     )
     profile_picture: Mapped[str] = MappedColumn(
-        nullable=True, index=True
+        nullable=True
     )  # URL or path to profile picture
     email_verification_token: Mapped[str] = MappedColumn(
-        nullable=True, index=True
-    )  # Token for email verification
+        nullable=True
+    )  # SHA-256 of the token for email verification, looked up by user_id
     reset_password_token: Mapped[str] = MappedColumn(
-        nullable=True, index=True
-    )  # Token for password reset
-    reset_password_expires_at: Mapped[datetime.datetime] = MappedColumn(nullable=True, index=True
+        nullable=True
+    )  # SHA-256 of the token for password reset, looked up by user_id
+    reset_password_expires_at: Mapped[datetime.datetime] = MappedColumn(nullable=True
     )  # Expiration time for password reset token
-    created_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False, index=True
+    created_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False
     )
     updated_at: Mapped[datetime.datetime] = MappedColumn(
         default=datetime.datetime.utcnow,
         onupdate=datetime.datetime.utcnow,
         nullable=False,
-        index=True,
     )
     user = relationship("Users", back_populates="user_metadata")
 
-    idx_all = Index(
-        "idx_user_metadata_all",
-        id,
-        user_id,
-        postgresql_using="btree",
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id: Mapped[uuid.UUID] = MappedColumn(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False
+    )
+    template: Mapped[str] = MappedColumn(nullable=False)  # Name of the email handler, e.g. reset_password
+    to_email: Mapped[str] = MappedColumn(nullable=False)
+    payload: Mapped[JSONB] = MappedColumn(JSONB, nullable=False, default=dict)
+    dedup_key: Mapped[str] = MappedColumn(nullable=False)  # template:to_email, one pending email per recipient
+    # pending, sending (claimed by a dispatcher), sent, failed or superseded (by a newer pending email)
+    status: Mapped[str] = MappedColumn(nullable=False, default="pending")
+    attempts: Mapped[int] = MappedColumn(nullable=False, default=0)
+    # Due time of a pending email, end of the lease of a sending one
+    next_attempt_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False)
+    last_error: Mapped[str] = MappedColumn(nullable=True)
+    sent_at: Mapped[datetime.datetime] = MappedColumn(nullable=True)
+    created_at: Mapped[datetime.datetime] = MappedColumn(default=datetime.datetime.utcnow, nullable=False)
+    updated_at: Mapped[datetime.datetime] = MappedColumn(
+        default=datetime.datetime.utcnow,
+        onupdate=datetime.datetime.utcnow,
+        nullable=False,
+    )
+
+    idx_due = Index(
+        "idx_email_outbox_due",
+        next_attempt_at,
+        postgresql_where=status.in_(("pending", "sending")),
+    )
+    idx_pending_dedup = Index(
+        "uq_email_outbox_pending_dedup",
+        dedup_key,
+        unique=True,
+        postgresql_where=(status == "pending"),
+    )
+
+
+class RevokedTokens(Base):
+    """
+    Revoked access tokens, mirrored in memory by every process.
+    A row with a jti revokes that token; a row without revokes every token of the user issued
+    up to revoked_before, e.g. after a password reset.
+    """
+    __tablename__ = "revoked_tokens"
+
+    id: Mapped[uuid.UUID] = MappedColumn(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False
+    )
+    jti: Mapped[str] = MappedColumn(nullable=True)
+    user_id: Mapped[uuid.UUID] = MappedColumn(UUID(as_uuid=True), nullable=False)
+    revoked_before: Mapped[datetime.datetime] = MappedColumn(nullable=True)
+    expires_at: Mapped[datetime.datetime] = MappedColumn(nullable=False)  # Once every revoked token has expired
+    # Database clock, the watermark of the incremental sync
+    created_at: Mapped[datetime.datetime] = MappedColumn(server_default=func.now(), nullable=False)
+
+    idx_created_at = Index("idx_revoked_tokens_created_at", created_at)
+
+
+class UserSessions(Base):
+    """
+    Login sessions, each holding the one valid refresh token of the session.
+    The refresh token is <id>.<generation>.<secret>; only the SHA-256 of the current token is stored,
+    and every refresh rotates it and bumps generation. A token of an older generation is a reused,
+    i.e. leaked, token and revokes the session.
+    """
+    __tablename__ = "user_sessions"
+
+    id: Mapped[uuid.UUID] = MappedColumn(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, nullable=False
+    )
+    user_id: Mapped[uuid.UUID] = MappedColumn(
+        UUID(as_uuid=True),
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
     )
+    token_hash: Mapped[str] = MappedColumn(nullable=False)
+    generation: Mapped[int] = MappedColumn(nullable=False, default=0)
+    expires_at: Mapped[datetime.datetime] = MappedColumn(nullable=False)
+    revoked_at: Mapped[datetime.datetime] = MappedColumn(nullable=True)
+    last_seen_at: Mapped[datetime.datetime] = MappedColumn(server_default=func.now(), nullable=False)
+    created_at: Mapped[datetime.datetime] = MappedColumn(server_default=func.now(), nullable=False)
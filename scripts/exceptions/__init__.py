@@ -1,4 +1,32 @@
 
 class UserManagementException(Exception):
     """Base class for user management exceptions."""
-    pass
\ No newline at end of file
+    status_code = 400
+    headers = None
+
+
+class ServiceUnavailableException(UserManagementException):
+    """Raised when a bounded resource is saturated and the request should be retried later."""
+    status_code = 503
+    headers = {"Retry-After": "1"}
+
+
+class NotFoundException(UserManagementException):
+    """Raised when the requested resource does not exist."""
+    status_code = 404
+
+
+class PreconditionFailedException(UserManagementException):
+    """Raised when the If-Match precondition of a conditional update does not hold."""
+    status_code = 412
+
+
+class UnauthorizedException(UserManagementException):
+    """Raised when a request carries no valid access token."""
+    status_code = 401
+    headers = {"WWW-Authenticate": "Bearer"}
+
+
+class ForbiddenException(UserManagementException):
+    """Raised when the role of an authenticated user lacks a required permission."""
+    status_code = 403
@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStats:
+    """
+    Counters of a cache, exposed as a gauge on the metrics endpoint.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+class LRUCache:
+    """
+    In-process LRU cache with a time to live per entry.
+    Entries are only touched from the event loop, so no locking is needed; expired entries are
+    dropped when they are read or reach the least recently used end.
+    """
+
+    def __init__(self, max_entries: int, stats: CacheStats):
+        self.max_entries = max_entries
+        self.stats = stats
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            _, (expires_at, _) = self._entries.popitem(last=False)
+            if expires_at <= time.monotonic():
+                self.stats.expirations += 1
+            else:
+                self.stats.evictions += 1
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MemoryCacheBackend:
+    """
+    Cache backend keeping the entries in an LRUCache of this process.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, stats: CacheStats):
+        self.stats = stats
+        self._entries = LRUCache(max_entries=max_entries, stats=stats)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._entries.get(key)
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        return [self._entries.get(key) for key in keys]
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._entries.set(key, value, ttl)
+
+    async def delete(self, *keys: str):
+        self._entries.delete(*keys)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Cache shared by every process and instance through Redis, so writes handled by one worker
+    invalidate the entries read by all of them. Expiry and eviction are left to Redis
+    (configure maxmemory-policy allkeys-lru), hence no eviction counts here.
+    The redis package is only required, and imported, when this backend is selected.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, stats: CacheStats):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("USER_CACHE_BACKEND=redis requires the redis package") from e
+        self.stats = stats
+        self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(key)
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        return await self.client.mget(keys) if keys else []
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, px=int(ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+    def size(self) -> int | None:
+        return None
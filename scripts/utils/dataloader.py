@@ -0,0 +1,83 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, Iterable
+
+
+class DataLoader:
+    """
+    Coalesces the lookups of one event loop tick into one batched call.
+
+    load() only queues the key; the keys queued by every coroutine running in the same tick, or
+    started in it, are handed to batch_load together right after, e.g. as one WHERE id = ANY(...)
+    query instead of one query per key. Results are memoized per key for the lifetime of the loader,
+    so create one per request: it then also deduplicates repeated keys and never serves data of an
+    earlier request.
+
+    Batches are run one after the other, as they usually share the database session of the request.
+
+    Usage:
+        loader = DataLoader(sql_handler.get_users_by_ids)
+        first, second = await asyncio.gather(loader.load(first_id), loader.load(second_id))
+    """
+
+    def __init__(self, batch_load: Callable[[list], Awaitable[dict]], max_batch_size: int | None = None):
+        """
+        :param batch_load: Coroutine function loading a list of keys, returning a dictionary of the
+            values found by key; keys it does not return resolve to None.
+        :param max_batch_size: Split larger batches into calls of at most this many keys.
+        """
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self._futures: dict[Hashable, asyncio.Future] = {}
+        self._queue: list = []
+        self._lock = asyncio.Lock()
+
+    def load(self, key: Hashable) -> asyncio.Future:
+        """
+        Queue a key for the batch of the current tick.
+
+        :param key: The key to load.
+        :return: A future resolving to the value, None if it was not found.
+        """
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            if not self._queue:
+                # Two hops, so that tasks started in this tick (e.g. by gather) queue their keys first
+                loop.call_soon(loop.call_soon, self._schedule_dispatch, loop)
+            self._queue.append(key)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> list:
+        """
+        Load several keys in one batch.
+
+        :param keys: The keys to load.
+        :return: The values in the order of the keys, None for every key not found.
+        """
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _schedule_dispatch(self, loop: asyncio.AbstractEventLoop):
+        keys, self._queue = self._queue, []
+        loop.create_task(self._dispatch(keys))
+
+    async def _dispatch(self, keys: list):
+        size = self.max_batch_size or len(keys)
+        async with self._lock:
+            for start in range(0, len(keys), size):
+                chunk = keys[start:start + size]
+                try:
+                    values = await self.batch_load(chunk)
+                except Exception as e:
+                    # Failures are not memoized, a later load retries the key
+                    for key in chunk:
+                        future = self._futures.pop(key)
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                for key in chunk:
+                    future = self._futures[key]
+                    if not future.done():
+                        future.set_result(values.get(key))
@@ -0,0 +1,77 @@
+import datetime
+import email.utils
+import hashlib
+
+
+class ETagUtil:
+    """
+    Validators of conditional requests on user resources.
+    A user's version is the pair of its users and user_metadata updated_at, so the strong ETag
+    changes whenever either row is written and can be computed without loading the profile.
+    """
+
+    @staticmethod
+    def etag(version: dict) -> str:
+        """
+        Build the strong ETag of a user version.
+
+        :param version: The id, updated_at and metadata_updated_at (None without metadata) of the user.
+        :return: The quoted ETag.
+        """
+        metadata_updated_at = version["metadata_updated_at"].isoformat() if version["metadata_updated_at"] else ""
+        raw = f"{version['id']}:{version['updated_at'].isoformat()}:{metadata_updated_at}"
+        return f'"{hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()}"'
+
+    @staticmethod
+    def last_modified(version: dict) -> datetime.datetime:
+        """
+        The latest updated_at of a user version, as an aware UTC datetime. Stored timestamps are naive UTC.
+
+        :param version: The id, updated_at and metadata_updated_at of the user.
+        :return: The Last-Modified of the user.
+        """
+        latest = max(filter(None, (version["updated_at"], version["metadata_updated_at"])))
+        return latest.replace(tzinfo=datetime.timezone.utc) if latest.tzinfo is None else latest
+
+    @staticmethod
+    def http_date(value: datetime.datetime) -> str:
+        return email.utils.format_datetime(value.astimezone(datetime.timezone.utc), usegmt=True)
+
+    @staticmethod
+    def matches(header: str, etag: str, weak: bool) -> bool:
+        """
+        Check an If-None-Match (weak comparison) or If-Match (strong comparison) header against an ETag.
+
+        :param header: The header value, * or a comma separated list of ETags.
+        :param etag: The current strong ETag.
+        :param weak: Whether W/ prefixed ETags of the header count as matches.
+        :return: True if the header matches the ETag.
+        """
+        for candidate in header.split(","):
+            candidate = candidate.strip()
+            if candidate == "*":
+                return True
+            if candidate.startswith("W/"):
+                if not weak:
+                    continue
+                candidate = candidate[2:]
+            if candidate == etag:
+                return True
+        return False
+
+    @staticmethod
+    def modified_since(header: str, last_modified: datetime.datetime) -> bool:
+        """
+        Check an If-Modified-Since header. HTTP dates have a one second resolution.
+
+        :param header: The header value.
+        :param last_modified: The aware Last-Modified of the resource.
+        :return: False if the resource was not modified since the header date; True otherwise or if unparsable.
+        """
+        try:
+            since = email.utils.parsedate_to_datetime(header)
+        except (TypeError, ValueError):
+            return True
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=datetime.timezone.utc)
+        return last_modified.replace(microsecond=0) > since
@@ -1,39 +1,122 @@
+import hashlib
+import secrets
+import time
+import uuid
+
 from scripts.config import JWTConfig
+from scripts.exceptions import UnauthorizedException, UserManagementException
+from scripts.utils.jwt_keys import JWTKeyRing
 from datetime import datetime, timedelta
 import jwt
 
+# Loaded once per process; every token is signed with the active key and carries its kid
+key_ring = JWTKeyRing(
+    algorithm=JWTConfig.JWT_ALGORITHM,
+    secret_key=JWTConfig.JWT_SECRET_KEY,
+    keys_dir=JWTConfig.JWT_KEYS_DIR,
+    active_kid=JWTConfig.JWT_ACTIVE_KID,
+)
+
+ACCESS_PURPOSE = "access"
+RESET_PASSWORD_PURPOSE = "reset_password"
+VERIFY_EMAIL_PURPOSE = "verify_email"
+
 
 class JWTUtil:
 
     @staticmethod
-    def create_access_token(data: dict) -> str:
+    def create_access_token(data: dict, expire_minutes: int = None) -> str:
         """
         Create a JWT access token with the given data and expiration time.
 
         Args:
             data (dict): The data to include in the token.
+            expire_minutes (int): The lifetime of the token, JWT_ACCESS_TOKEN_EXPIRE_MINUTES by default.
 
         Returns:
             str: The generated JWT access token.
         """
         to_encode = data.copy()
-        expire = datetime.utcnow() + timedelta(minutes=JWTConfig.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.utcnow() + timedelta(minutes=expire_minutes or JWTConfig.JWT_ACCESS_TOKEN_EXPIRE_MINUTES)
         to_encode.update({"exp": expire})
-        return jwt.encode(to_encode, JWTConfig.JWT_SECRET_KEY, algorithm=JWTConfig.JWT_ALGORITHM)
+        return key_ring.encode(to_encode)
+
+    @staticmethod
+    def issue_access_token(user_id, email: str, session_id=None, role=None) -> str:
+        """
+        Issue the access token of a login or refresh, with the token id (jti) and issue time (iat) that
+        revocations refer to.
+
+        Args:
+            user_id: The id of the user.
+            email (str): The email of the user.
+            session_id: The id of the login session (sid) the token was issued for.
+            role: The id of the role of the user, whose permissions the token grants.
+
+        Returns:
+            str: The generated JWT access token.
+        """
+        claims = {
+            "user_id": str(user_id),
+            "email": email,
+            "purpose": ACCESS_PURPOSE,
+            "jti": uuid.uuid4().hex,
+            # Millisecond precision, so a token issued right after a revocation is not caught by it
+            "iat": round(time.time(), 3),
+        }
+        if session_id is not None:
+            claims["sid"] = str(session_id)
+        if role is not None:
+            claims["role"] = str(role)
+        return JWTUtil.create_access_token(claims)
+
+    @staticmethod
+    def new_refresh_token(session_id, generation: int) -> str:
+        """
+        Generate the refresh token of a session generation: <session id>.<generation>.<random secret>.
+        Refresh tokens are opaque, checked by the hash stored with the session, not signed.
+
+        Args:
+            session_id: The id of the session.
+            generation (int): The generation of the session the token is valid for.
+
+        Returns:
+            str: The refresh token.
+        """
+        return f"{uuid.UUID(str(session_id)).hex}.{generation}.{secrets.token_urlsafe(32)}"
+
+    @staticmethod
+    def parse_refresh_token(token: str) -> tuple[uuid.UUID, int]:
+        """
+        Split a refresh token into its session id and generation, without touching the database.
+
+        Args:
+            token (str): The refresh token received from the client.
+
+        Returns:
+            tuple: The session id and the generation.
+        """
+        try:
+            session_id, generation, secret = token.split(".")
+            if not secret:
+                raise ValueError(token)
+            return uuid.UUID(hex=session_id), int(generation)
+        except (AttributeError, ValueError):
+            raise UnauthorizedException("Invalid refresh token.")
 
     @staticmethod
-    def generate_email_verification_token(email: str) -> str:
+    def generate_email_verification_token(data: dict) -> str:
         """
         Generate a JWT token for email verification.
 
         Args:
-            email (str): The email address to include in the token.
+            data: dict: The data to include in the token, the user_id and email of the user.
 
         Returns:
             str: The generated JWT token for email verification.
         """
-        data = {"email": email}
-        return JWTUtil.create_access_token(data)
+        return JWTUtil.create_access_token({**data, "purpose": VERIFY_EMAIL_PURPOSE},
+                                           expire_minutes=JWTConfig.JWT_VERIFY_EMAIL_TOKEN_EXPIRE_MINUTES)
 
     @staticmethod
     def request_reset_password_token(data:dict) -> str:
@@ -41,9 +124,49 @@ class JWTUtil:
         Generate a JWT token for password reset request.
 
         Args:
-            data: dict: The data to include in the token, typically containing the user's email.
+            data: dict: The data to include in the token, the user_id and email of the user.
 
         Returns:
             str: The generated JWT token for password reset.
         """
-        return JWTUtil.create_access_token(data)
\ No newline at end of file
+        return JWTUtil.create_access_token({**data, "purpose": RESET_PASSWORD_PURPOSE},
+                                           expire_minutes=JWTConfig.JWT_RESET_PASSWORD_TOKEN_EXPIRE_MINUTES)
+
+    @staticmethod
+    def decode_purpose_token(token: str, purpose: str) -> dict:
+        """
+        Check the signature, expiry and purpose of a verification or reset token, in memory.
+        Garbage, expired and tampered tokens, and tokens minted for another purpose, are rejected
+        before the database is queried.
+
+        Args:
+            token (str): The token received from the client.
+            purpose (str): The purpose the token must have been minted for.
+
+        Returns:
+            dict: The claims of the token, with the user_id as UUID.
+        """
+        try:
+            claims = key_ring.decode(token, options={"require": ["exp"]})
+        except jwt.InvalidTokenError:
+            raise UserManagementException("Invalid or expired token.")
+        try:
+            if claims.get("purpose") != purpose:
+                raise ValueError(purpose)
+            claims["user_id"] = uuid.UUID(claims["user_id"])
+        except (KeyError, TypeError, ValueError):
+            raise UserManagementException("Invalid or expired token.")
+        return claims
+
+    @staticmethod
+    def token_hash(token: str) -> str:
+        """
+        Hash of a verification, reset or refresh token, stored in place of the token itself.
+
+        Args:
+            token (str): The token.
+
+        Returns:
+            str: The hex encoded SHA-256 of the token.
+        """
+        return hashlib.sha256(token.encode()).hexdigest()
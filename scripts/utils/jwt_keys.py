@@ -0,0 +1,135 @@
+"""
+Signing and verification keys of the JWTs issued by this service.
+
+With an HMAC JWT_ALGORITHM (HS256, the default) JWT_SECRET_KEY signs and verifies everything.
+With an asymmetric one (RS256, ES256, EdDSA) the keys are read once per process from JWT_KEYS_DIR:
+
+    <kid>.pem       private key, signs when it is JWT_ACTIVE_KID and verifies
+    <kid>.pub.pem   public key of a retired key, only verifies the tokens it signed until they expire
+
+Every token carries the kid of its key in the header, and the public keys are published as a JWKS
+so other services verify tokens locally. To rotate: add the new key, let consumers pick up the
+JWKS, switch JWT_ACTIVE_KID, and replace the old private key by its public key until the last
+token it signed has expired.
+
+Generate a key with:
+    python -m scripts.utils.jwt_keys --kid 2026-10 [--algorithm EdDSA]
+"""
+import argparse
+import json
+from pathlib import Path
+
+import jwt
+
+from scripts.config import JWTConfig
+
+HMAC_ALGORITHMS = ("HS256", "HS384", "HS512")
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "EdDSA")
+HMAC_KID = "hmac"
+
+
+class JWTKeyRing:
+    """
+    The key material of one algorithm: the active signing key and every key that still verifies, by kid.
+    """
+
+    def __init__(self, algorithm: str, secret_key: str = None, keys_dir: str = None, active_kid: str = None):
+        self.algorithm = algorithm
+        self._algorithm = jwt.get_algorithm_by_name(algorithm)
+        self.verification_keys = {}
+        if algorithm in HMAC_ALGORITHMS:
+            self.active_kid = HMAC_KID
+            self.signing_key = self._algorithm.prepare_key(secret_key)
+            self.verification_keys[HMAC_KID] = self.signing_key
+        else:
+            from cryptography.hazmat.primitives import serialization
+
+            private_keys = {}
+            for path in sorted(Path(keys_dir).glob("*.pem")):
+                if path.name.endswith(".pub.pem"):
+                    kid = path.name[:-len(".pub.pem")]
+                    self.verification_keys[kid] = serialization.load_pem_public_key(path.read_bytes())
+                else:
+                    private_keys[path.stem] = serialization.load_pem_private_key(path.read_bytes(), password=None)
+                    self.verification_keys[path.stem] = private_keys[path.stem].public_key()
+            if not private_keys:
+                raise ValueError(f"No private key (<kid>.pem) found in {keys_dir}")
+            # Without JWT_ACTIVE_KID the last kid in name order signs, e.g. the newest of date named keys
+            self.active_kid = active_kid or sorted(private_keys)[-1]
+            if self.active_kid not in private_keys:
+                raise ValueError(f"No private key for JWT_ACTIVE_KID {self.active_kid} in {keys_dir}")
+            self.signing_key = private_keys[self.active_kid]
+        self.jwks_json = json.dumps(self.jwks(), separators=(",", ":")).encode()
+
+    def verification_key(self, token: str):
+        """
+        The key verifying a token, chosen by the kid of its header.
+        Tokens without a kid were issued before kids were introduced and are checked with the active key.
+
+        :param token: The encoded token.
+        :return: The key object.
+        """
+        kid = jwt.get_unverified_header(token).get("kid", self.active_kid)
+        try:
+            return self.verification_keys[kid]
+        except KeyError:
+            raise jwt.InvalidTokenError(f"Unknown key id {kid}")
+
+    def encode(self, payload: dict) -> str:
+        return jwt.encode(payload, self.signing_key, algorithm=self.algorithm, headers={"kid": self.active_kid})
+
+    def decode(self, token: str, **kwargs) -> dict:
+        return jwt.decode(token, self.verification_key(token), algorithms=[self.algorithm], **kwargs)
+
+    def jwks(self) -> dict:
+        """
+        The public keys as a JSON Web Key Set; empty for HMAC, whose key is secret.
+        """
+        if self.algorithm in HMAC_ALGORITHMS:
+            return {"keys": []}
+        keys = []
+        for kid, key in self.verification_keys.items():
+            jwk = self._algorithm.to_jwk(key, as_dict=True)
+            keys.append({**jwk, "kid": kid, "alg": self.algorithm, "use": "sig"})
+        return {"keys": keys}
+
+
+def generate_private_key(algorithm: str):
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+    if algorithm.startswith("RS"):
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    if algorithm == "ES384":
+        return ec.generate_private_key(ec.SECP384R1())
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Unsupported algorithm {algorithm}")
+
+
+def private_key_pem(key) -> bytes:
+    from cryptography.hazmat.primitives import serialization
+
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                             serialization.NoEncryption())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a JWT signing key in JWT_KEYS_DIR.")
+    parser.add_argument("--kid", required=True, help="Key id, also the file name.")
+    parser.add_argument("--algorithm", choices=ASYMMETRIC_ALGORITHMS,
+                        default=JWTConfig.JWT_ALGORITHM if JWTConfig.JWT_ALGORITHM in ASYMMETRIC_ALGORITHMS else "EdDSA")
+    parser.add_argument("--keys-dir", default=JWTConfig.JWT_KEYS_DIR)
+    args = parser.parse_args()
+    path = Path(args.keys_dir) / f"{args.kid}.pem"
+    if path.exists():
+        raise SystemExit(f"{path} already exists")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(private_key_pem(generate_private_key(args.algorithm)))
+    path.chmod(0o600)
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import time
+from collections import deque
+from typing import Callable
+
+
+class LatencyStats:
+    """
+    In-process latency recorder.
+    Keeps running totals plus a bounded window of recent samples for percentiles.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        """
+        Record a single observation.
+
+        :param seconds: The observed duration in seconds.
+        """
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def time(self):
+        """
+        Context manager recording the duration of the wrapped block.
+        """
+        return _Timer(self)
+
+    def _percentile(self, ordered: list, percentile: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(percentile * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "p50_ms": round(self._percentile(ordered, 0.50) * 1000, 3),
+            "p95_ms": round(self._percentile(ordered, 0.95) * 1000, 3),
+            "p99_ms": round(self._percentile(ordered, 0.99) * 1000, 3),
+        }
+
+
+class _Timer:
+    def __init__(self, stats: LatencyStats):
+        self.stats = stats
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stats.observe(time.perf_counter() - self.start)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Registry of the process level metrics exposed on the metrics endpoint.
+    Latencies are recorded by the owning component, gauges are evaluated lazily on snapshot.
+    """
+
+    def __init__(self):
+        self.latencies: dict[str, LatencyStats] = {}
+        self.gauges: dict[str, Callable[[], dict]] = {}
+
+    def latency(self, name: str) -> LatencyStats:
+        """
+        Get or create the latency recorder registered under the given name.
+
+        :param name: The metric name.
+        :return: The LatencyStats instance.
+        """
+        if name not in self.latencies:
+            self.latencies[name] = LatencyStats()
+        return self.latencies[name]
+
+    def register_gauge(self, name: str, callback: Callable[[], dict]):
+        """
+        Register a callback returning the current value of a gauge.
+
+        :param name: The metric name.
+        :param callback: A callable returning a JSON serialisable dictionary.
+        """
+        self.gauges[name] = callback
+
+    def snapshot(self) -> dict:
+        return {
+            "latencies": {name: stats.snapshot() for name, stats in self.latencies.items()},
+            "gauges": {name: callback() for name, callback in self.gauges.items()},
+        }
+
+
+metrics_registry = MetricsRegistry()
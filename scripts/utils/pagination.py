@@ -0,0 +1,42 @@
+import base64
+import binascii
+import datetime
+import json
+import uuid
+
+from scripts.exceptions import UserManagementException
+
+
+class CursorUtil:
+    """
+    Opaque keyset pagination cursors.
+    A cursor carries the sort key (created_at, id) of the last row of a page, so the next page
+    is an index range scan starting right after it instead of an OFFSET scan.
+    """
+
+    @staticmethod
+    def encode(created_at: datetime.datetime, row_id: uuid.UUID) -> str:
+        """
+        Encode the sort key of the last row of a page.
+
+        :param created_at: The created_at of the row.
+        :param row_id: The id of the row.
+        :return: The url safe cursor.
+        """
+        raw = json.dumps([created_at.isoformat(), str(row_id)], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    @staticmethod
+    def decode(cursor: str) -> tuple[datetime.datetime, uuid.UUID]:
+        """
+        Decode a cursor produced by encode.
+
+        :param cursor: The cursor received from the client.
+        :return: The (created_at, id) sort key.
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            created_at, row_id = json.loads(raw)
+            return datetime.datetime.fromisoformat(created_at), uuid.UUID(row_id)
+        except (binascii.Error, ValueError, TypeError):
+            raise UserManagementException("Invalid pagination cursor.")
@@ -1,6 +1,124 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from scripts.config import PasswordConfig
+from scripts.exceptions import ServiceUnavailableException
+from scripts.utils.metrics import metrics_registry
+
+
+def build_crypt_context(schemes: list[str], bcrypt_rounds: int, argon2_memory_cost: int,
+                        argon2_time_cost: int, argon2_parallelism: int) -> CryptContext:
+    """
+    Build the passlib context for the given schemes and cost parameters.
+
+    The first scheme is used for new hashes and every other scheme is deprecated. The bcrypt
+    cost is pinned with min/max rounds so that needs_update() flags hashes made with any other
+    work factor, in either direction.
+    """
+    return CryptContext(
+        schemes=schemes,
+        default=schemes[0],
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__time_cost=argon2_time_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
+
+pwd_context = build_crypt_context(
+    schemes=PasswordConfig.PASSWORD_SCHEMES,
+    bcrypt_rounds=PasswordConfig.PASSWORD_BCRYPT_ROUNDS,
+    argon2_memory_cost=PasswordConfig.PASSWORD_ARGON2_MEMORY_COST,
+    argon2_time_cost=PasswordConfig.PASSWORD_ARGON2_TIME_COST,
+    argon2_parallelism=PasswordConfig.PASSWORD_ARGON2_PARALLELISM,
+)
+
+
+def _timed_call(func, *args):
+    """
+    Run func inside the worker and report when it started and finished.
+    time.monotonic is system wide, so the timestamps are comparable across worker processes.
+    """
+    started = time.monotonic()
+    result = func(*args)
+    return started, time.monotonic(), result
+
+
+class PasswordHashingPool:
+    """
+    Bounded worker pool running password hashing off the event loop.
+    Work beyond PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE outstanding calls is rejected
+    with a 503 instead of letting the queue, and the latency, grow without limit.
+    """
+
+    def __init__(self):
+        self.executor: Executor | None = None
+        self.pending = 0
+        self.rejected = 0
+        self.queue_wait = metrics_registry.latency("password_hash_queue_wait")
+        self.run_time = metrics_registry.latency("password_hash_run")
+        metrics_registry.register_gauge("password_hash_pool", self.status)
+
+    @property
+    def capacity(self) -> int:
+        return PasswordConfig.PASSWORD_HASH_WORKERS + PasswordConfig.PASSWORD_HASH_MAX_QUEUE
+
+    def _get_executor(self) -> Executor:
+        if self.executor is None:
+            if PasswordConfig.PASSWORD_HASH_EXECUTOR == "process":
+                self.executor = ProcessPoolExecutor(max_workers=PasswordConfig.PASSWORD_HASH_WORKERS)
+            else:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=PasswordConfig.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+                )
+        return self.executor
+
+    async def submit(self, func, *args):
+        """
+        Run func(*args) on the pool.
+
+        :param func: A module level (picklable) callable.
+        :return: The result of the call.
+        :raises ServiceUnavailableException: If the pool queue is full.
+        """
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise ServiceUnavailableException("Too many password operations in progress. Please retry shortly.")
+        self.pending += 1
+        submitted = time.monotonic()
+        try:
+            started, finished, result = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _timed_call, func, *args
+            )
+        finally:
+            self.pending -= 1
+        self.queue_wait.observe(max(started - submitted, 0.0))
+        self.run_time.observe(finished - started)
+        return result
+
+    def status(self) -> dict:
+        return {
+            "executor": PasswordConfig.PASSWORD_HASH_EXECUTOR,
+            "workers": PasswordConfig.PASSWORD_HASH_WORKERS,
+            "pending": self.pending,
+            "capacity": self.capacity,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+password_pool = PasswordHashingPool()
+
 
 class PasswordHashingUtil:
     @staticmethod
@@ -10,3 +128,25 @@ class PasswordHashingUtil:
     @staticmethod
     def verify_password(stored_password: str, provided_password: str) -> bool:
         return pwd_context.verify(provided_password, stored_password)
+
+    @staticmethod
+    def needs_update(stored_password: str) -> bool:
+        """
+        Check whether the stored hash uses a deprecated scheme or outdated cost parameters.
+        This only parses the hash, no hashing work is done.
+        """
+        return pwd_context.needs_update(stored_password)
+
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """
+        Hash the password on the password hashing pool.
+        """
+        return await password_pool.submit(PasswordHashingUtil.hash_password, password)
+
+    @staticmethod
+    async def verify_password_async(stored_password: str, provided_password: str) -> bool:
+        """
+        Verify the password on the password hashing pool.
+        """
+        return await password_pool.submit(PasswordHashingUtil.verify_password, stored_password, provided_password)
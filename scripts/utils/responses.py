@@ -0,0 +1,27 @@
+import uuid
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def orjson_default(value):
+    """
+    Fallback of orjson for the types it does not serialize natively.
+    orjson only recognizes uuid.UUID itself, asyncpg returns its own UUID subclass.
+
+    :param value: The value orjson could not serialize.
+    :return: A serializable representation of the value.
+    """
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson, which serializes UUIDs and datetimes natively and is
+    several times faster than the standard library encoder. Used as the default response class.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,83 @@
+"""
+Long running server for container and VM deployments (Lambda uses app.handler).
+
+Usage:
+    python server.py
+
+Runs gunicorn with SERVER_WORKERS uvicorn workers (default: one per available core) on uvloop
+and httptools. The app is imported once in the master before forking, so workers start fast
+and share the imported code pages; database engines and worker pools are created per worker.
+On SIGTERM gunicorn stops accepting connections and gives in-flight requests
+SERVER_GRACEFUL_TIMEOUT_SECONDS to finish before the app shuts down.
+
+Every worker has its own SQL pool, so the database sees up to
+workers * (SQL_POOL_SIZE + SQL_MAX_OVERFLOW) connections.
+
+With RELOAD_ASGI enabled a single auto-reloading uvicorn process is started instead, for development.
+"""
+import os
+
+from gunicorn.app.base import BaseApplication
+from uvicorn_worker import UvicornWorker
+
+from scripts.config import ModuleConfig
+
+
+class ServerWorker(UvicornWorker):
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "timeout_graceful_shutdown": ModuleConfig.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+    }
+
+
+def worker_count() -> int:
+    if ModuleConfig.SERVER_WORKERS > 0:
+        return ModuleConfig.SERVER_WORKERS
+    # Respects CPU affinity and container cpusets, unlike os.cpu_count()
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+def post_fork(server, worker):
+    from scripts.db.pg.sessions import session_util
+    session_util.reset_after_fork()
+
+
+class Server(BaseApplication):
+
+    def __init__(self, app_uri: str = "main:app"):
+        self.app_uri = app_uri
+        super().__init__()
+
+    def load_config(self):
+        options = {
+            "bind": f"{ModuleConfig.HOST}:{ModuleConfig.PORT}",
+            "workers": worker_count(),
+            "worker_class": ServerWorker,
+            "preload_app": True,
+            "keepalive": ModuleConfig.SERVER_KEEP_ALIVE_SECONDS,
+            "backlog": ModuleConfig.SERVER_BACKLOG,
+            "timeout": ModuleConfig.SERVER_TIMEOUT_SECONDS,
+            "graceful_timeout": ModuleConfig.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+            "max_requests": ModuleConfig.SERVER_MAX_REQUESTS,
+            "max_requests_jitter": ModuleConfig.SERVER_MAX_REQUESTS // 10,
+            "post_fork": post_fork,
+        }
+        for key, value in options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from gunicorn.util import import_app
+        return import_app(self.app_uri)
+
+
+def main():
+    if ModuleConfig.RELOAD_ASGI:
+        import uvicorn
+        uvicorn.run("main:app", host=ModuleConfig.HOST, port=ModuleConfig.PORT, reload=True)
+    else:
+        Server().run()
+
+
+if __name__ == "__main__":
+    main()
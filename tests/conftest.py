@@ -0,0 +1,63 @@
+import os
+
+# Settings for a local test database; the environment overrides every one of them
+os.environ.setdefault("SQL_URL", "postgresql://postgres@localhost:5432")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+os.environ.setdefault("SMTP_SERVER", "localhost")
+os.environ.setdefault("SMTP_USERNAME", "test")
+os.environ.setdefault("SMTP_PASSWORD", "test")
+os.environ.setdefault("EMAIL_FROM", "noreply@example.com")
+os.environ.setdefault("DOMAIN_URL", "http://localhost:8000")
+# Emails stay in the outbox, where the tests read the tokens they carry
+os.environ["EMAIL_DISPATCHER_ENABLED"] = "false"
+
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+
+@pytest.fixture(scope="session")
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+async def client():
+    """
+    A client of the API running against the migrated database of SQL_URL, shared by the tests like the
+    engine and the background workers of the app; the tests using it are skipped when that database
+    cannot be reached.
+    """
+    from main import app
+
+    try:
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+    except (OSError, InterfaceError, OperationalError) as e:
+        pytest.skip(f"Database not available: {e}")
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            yield c
+    finally:
+        await lifespan.__aexit__(None, None, None)
+
+
+@pytest.fixture
+async def user(client):
+    """
+    Register and log in a new user.
+
+    :return: The email, password, access token and refresh token of the user.
+    """
+    email = f"test-{uuid.uuid4().hex[:12]}@example.com"
+    password = "Passw0rd!"
+    r = await client.post("/user_mngmt/users/register",
+                          json={"email": email, "first_name": "Test", "last_name": "User", "password": password})
+    assert r.status_code == 200, r.text
+    r = await client.post("/user_mngmt/users/login", json={"email": email, "password": password})
+    assert r.status_code == 200, r.text
+    client.cookies.clear()
+    return {"email": email, "password": password, "access_token": r.cookies["access_token"],
+            "refresh_token": r.cookies["refresh_token"]}
@@ -0,0 +1,30 @@
+import datetime
+import uuid
+
+from scripts.core.services.revocations import RevocationList
+
+
+def _claims(user_id: str, issued_at: datetime.datetime) -> dict:
+    return {"jti": uuid.uuid4().hex, "user_id": user_id, "iat": int(issued_at.timestamp())}
+
+
+def test_is_revoked_by_revoked_before():
+    revocations = RevocationList()
+    user_id = str(uuid.uuid4())
+    now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    revocations.add(user_id, expires_at=now + datetime.timedelta(minutes=30), revoked_before=now)
+
+    assert revocations.is_revoked(_claims(user_id, now - datetime.timedelta(seconds=1)))
+    assert revocations.is_revoked(_claims(user_id, now))
+    assert not revocations.is_revoked(_claims(user_id, now + datetime.timedelta(seconds=1)))
+    assert not revocations.is_revoked(_claims(str(uuid.uuid4()), now - datetime.timedelta(seconds=1)))
+
+
+def test_is_revoked_by_jti():
+    revocations = RevocationList()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    claims = _claims(str(uuid.uuid4()), now)
+    revocations.add(claims["user_id"], expires_at=now + datetime.timedelta(minutes=30), jti=claims["jti"])
+
+    assert revocations.is_revoked(claims)
+    assert not revocations.is_revoked({**claims, "jti": uuid.uuid4().hex})
@@ -0,0 +1,30 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_refresh_token_works_once(client, user):
+    r = await client.post("/user_mngmt/users/refresh", json={"refresh_token": user["refresh_token"]})
+    assert r.status_code == 200
+    rotated = r.cookies["refresh_token"]
+    client.cookies.clear()
+    assert rotated != user["refresh_token"]
+
+    r = await client.post("/user_mngmt/users/refresh", json={"refresh_token": rotated})
+    assert r.status_code == 200
+
+
+async def test_replayed_refresh_token_revokes_session_and_tokens(client, user):
+    r = await client.post("/user_mngmt/users/refresh", json={"refresh_token": user["refresh_token"]})
+    assert r.status_code == 200
+    rotated, access_token = r.cookies["refresh_token"], r.cookies["access_token"]
+    client.cookies.clear()
+
+    r = await client.post("/user_mngmt/users/refresh", json={"refresh_token": user["refresh_token"]})
+    assert r.status_code == 401
+    # The whole session ends, the current refresh token included, and so do the access tokens of the user
+    r = await client.post("/user_mngmt/users/refresh", json={"refresh_token": rotated})
+    assert r.status_code == 401
+    for token in (user["access_token"], access_token):
+        r = await client.get("/user_mngmt/users/me", headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 401
@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import select
+
+from scripts.db.pg.ops import SQLOps
+from scripts.db.pg.sessions import get_db
+from scripts.db.pg.sql_schemas import EmailOutbox
+from scripts.utils.jwt import JWTUtil
+
+pytestmark = pytest.mark.anyio
+
+
+def _auth(user: dict) -> dict:
+    return {"Authorization": f"Bearer {user['access_token']}"}
+
+
+async def _user_id(client, user: dict) -> str:
+    r = await client.get("/user_mngmt/users/me", headers=_auth(user))
+    assert r.status_code == 200
+    return r.json()["data"]["id"]
+
+
+async def _reset_token(email: str) -> str:
+    async for session in get_db():
+        row = await SQLOps(session).execute_query(
+            query=select(EmailOutbox.payload)
+            .where(EmailOutbox.to_email == email, EmailOutbox.template == "reset_password")
+            .order_by(EmailOutbox.created_at.desc()), first_result=True)
+        return row.payload["reset_token"]
+
+
+async def test_require_permission_forbids_role_without_permission(client, user):
+    r = await client.get("/user_mngmt/roles", headers=_auth(user))
+    assert r.status_code == 403
+    r = await client.get("/user_mngmt/roles")
+    assert r.status_code == 401
+
+
+async def test_update_with_stale_if_match_fails(client, user):
+    url = f"/user_mngmt/users/{await _user_id(client, user)}"
+    r = await client.put(url, json={"first_name": "First"}, headers=_auth(user))
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+
+    r = await client.put(url, json={"first_name": "Second"}, headers={**_auth(user), "If-Match": etag})
+    assert r.status_code == 200
+    r = await client.put(url, json={"last_name": "Lost"}, headers={**_auth(user), "If-Match": etag})
+    assert r.status_code == 412
+
+
+async def test_reset_password_consumes_token_and_revokes_sessions(client, user):
+    r = await client.post("/user_mngmt/users/request-password-reset", json={"email": user["email"]})
+    assert r.status_code == 200
+    reset_token = await _reset_token(user["email"])
+
+    r = await client.put("/user_mngmt/users/reset-password", json={"reset_token": reset_token, "password": "N3wPassw0rd!"})
+    assert r.status_code == 200
+    r = await client.put("/user_mngmt/users/reset-password", json={"reset_token": reset_token, "password": "Other0ne!"})
+    assert r.status_code == 400
+
+    r = await client.post("/user_mngmt/users/refresh", json={"refresh_token": user["refresh_token"]})
+    assert r.status_code == 401
+    r = await client.get("/user_mngmt/users/me", headers=_auth(user))
+    assert r.status_code == 401
+    r = await client.post("/user_mngmt/users/login", json={"email": user["email"], "password": "N3wPassw0rd!"})
+    assert r.status_code == 200
+
+
+async def test_reset_password_with_unknown_token_revokes_nothing(client, user):
+    # Correctly signed, but never issued to the user
+    reset_token = JWTUtil.request_reset_password_token({"user_id": await _user_id(client, user),
+                                                        "email": user["email"]})
+    r = await client.put("/user_mngmt/users/reset-password", json={"reset_token": reset_token, "password": "N3wPassw0rd!"})
+    assert r.status_code == 400
+
+    r = await client.get("/user_mngmt/users/me", headers=_auth(user))
+    assert r.status_code == 200
+    r = await client.post("/user_mngmt/users/refresh", json={"refresh_token": user["refresh_token"]})
+    assert r.status_code == 200
+    r = await client.post("/user_mngmt/users/login", json={"email": user["email"], "password": user["password"]})
+    assert r.status_code == 200